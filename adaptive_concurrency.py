@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Answers that mean the server is overloaded rather than that the request was wrong
+OVERLOAD_STATUSES = (429, 503)
+
+def is_overload(error: BaseException) -> bool:
+    """Checks whether a failed request is a sign of overload: 429, 503 or a timeout."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in OVERLOAD_STATUSES
+    return isinstance(error, asyncio.TimeoutError)
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for the requests sent to one server.
+    The limit starts at `initial` and grows by one per healthy response (doubling per round trip)
+    until the first sign of overload, then by one per round trip. A 429, 503, timeout or a latency
+    above latency_factor times the best seen multiplies it by `decrease`, at most once per round
+    trip, and never takes it outside [minimum, maximum]. pause() holds every request back, e.g.
+    for the Retry-After of a 429.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 64, decrease: float = 0.5,
+                 latency_factor: float = 3.0, latency_slack: float = 0.05):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.latency_slack = latency_slack
+        self.slow_start_until = float(maximum)
+        self.min_latency: Optional[float] = None
+        self.in_flight = 0
+        self.last_cut = 0.0
+        self.resume_at = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.stats = {"requests": 0, "overloaded": 0, "slow": 0, "cuts": 0, "pauses": 0, "peak": int(self.limit)}
+
+    def pause(self, seconds: float):
+        """Stop starting requests for a while; requests already sent are not affected."""
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+        self.stats["pauses"] += 1
+
+    async def acquire(self) -> float:
+        """Waits for a free slot and returns the time the request starts."""
+        while True:
+            delay = self.resume_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                self.stats["requests"] += 1
+                return time.monotonic()
+            # Every slot is taken, so a release will wake us; then check the pause and limit again
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif not waiter.cancelled():
+                    # We were woken but give the slot up, so pass the wake-up on
+                    self._wake()
+                raise
+
+    def release(self, started: float, overloaded: bool = False, latency: Optional[float] = None):
+        """Frees the slot and adjusts the limit from the outcome: overloaded, or healthy with a latency."""
+        self.in_flight -= 1
+        if overloaded:
+            self.stats["overloaded"] += 1
+            self._cut(started)
+        elif latency is not None:
+            if self.min_latency is None or latency < self.min_latency:
+                self.min_latency = latency
+            if latency > max(self.min_latency * self.latency_factor, self.min_latency + self.latency_slack):
+                self.stats["slow"] += 1
+                self._cut(started)
+            else:
+                # Additive increase: +1 per response in slow start, +1 per round trip afterwards
+                step = 1.0 if self.limit < self.slow_start_until else 1.0 / self.limit
+                self.limit = min(float(self.maximum), self.limit + step)
+                self.stats["peak"] = max(self.stats["peak"], int(self.limit))
+        self._wake()
+
+    def _cut(self, started: float):
+        # Requests sent before the last cut were already accounted for by it
+        if started < self.last_cut:
+            return
+        self.limit = max(float(self.minimum), self.limit * self.decrease)
+        self.slow_start_until = self.limit
+        self.last_cut = time.monotonic()
+        self.stats["cuts"] += 1
+        logger.debug(f"Overload, concurrency cut to {int(self.limit)}")
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """Holds a slot for one request; an exception leaving the block is classified with is_overload."""
+        started = await self.acquire()
+        try:
+            yield
+        except BaseException as e:
+            self.release(started, overloaded=is_overload(e))
+            raise
+        else:
+            self.release(started, latency=time.monotonic() - started)
+
+    def summary(self) -> str:
+        return (
+            f"concurrency settled at {int(self.limit)} (peak {self.stats['peak']}, {self.stats['cuts']} cut-backs, "
+            f"{self.stats['overloaded']} overloaded and {self.stats['slow']} slow responses, "
+            f"{self.stats['pauses']} Retry-After pauses)"
+        )
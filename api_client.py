@@ -0,0 +1,140 @@
+"""A rate-limited asyncio client for JSON APIs, shared by the OpenAlex client and the NCBI ID converter."""
+import asyncio
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+import serialization
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header given either in seconds or as an HTTP date. Returns seconds or None.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RequestError(Exception):
+    """
+    Raised when an API request fails for good, as opposed to the resource not existing.
+    """
+
+class TokenBucket:
+    """
+    Token bucket allowing `rate` requests per second on average, with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """
+        Stop handing out tokens for a while, e.g. after the server answered 429.
+        """
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.resume_at:
+                    await asyncio.sleep(self.resume_at - now)
+                    self.updated = time.monotonic()
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AsyncJSONClient:
+    """
+    Asyncio client of a JSON API with a requests-per-second token bucket, a concurrency limit,
+    pooled connections and retries that respect Retry-After on 429 and 5xx answers.
+    Requests are recorded in the run metrics under `source` and sent with `headers`.
+    """
+
+    def __init__(self, base_url: str, requests_per_second: float = 10, concurrency: int = 10,
+                 max_retries: int = 5, backoff: float = 1.0, timeout: float = 30, source: str = "api",
+                 headers: Optional[Dict[str, str]] = None):
+        self.base_url = base_url.rstrip("/")
+        self.source = source
+        self.headers = headers or {}
+        self.bucket = TokenBucket(requests_per_second)
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "failed": 0}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(
+            connector=connector, headers=self.headers, timeout=self.timeout, trace_configs=[metrics.trace_config(self.source)],
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    async def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        """
+        GET a path of the API and return the decoded JSON, or None on 404.
+        Raises RequestError on other client errors or once retries are exhausted.
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            retry_after = None
+            async with self.semaphore:
+                self.stats["requests"] += 1
+                try:
+                    async with self.session.get(url, params=params) as response:
+                        if response.status == 200:
+                            return serialization.loads(await response.read())
+                        if response.status == 404:
+                            return None
+                        if response.status != 429 and response.status < 500:
+                            self.stats["failed"] += 1
+                            raise RequestError(f"Received status code {response.status} for {url}")
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        reason = f"status {response.status}"
+                        if response.status == 429:
+                            self.stats["rate_limited"] += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    reason = str(e) or type(e).__name__
+
+            if attempt == self.max_retries:
+                break
+            delay = retry_after if retry_after is not None else self.backoff * 2 ** attempt
+            if reason == "status 429":
+                # Everyone waits, not just this request, so we stop hammering the API
+                self.bucket.pause(delay)
+            self.stats["retries"] += 1
+            logger.warning(f"{reason} for {url}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        self.stats["failed"] += 1
+        raise RequestError(f"Giving up on {url} after {self.max_retries + 1} attempts")
@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import aiohttp
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = ("get_posts", "export", "load_and_extract", "openalex")
+
+# Compared against the baseline: +1 when higher is better, -1 when lower is better
+COMPARED = {"posts_per_second": 1, "requests_per_second": 1, "seconds": -1, "peak_rss_mb": -1}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class MockServer:
+    """Runs mock_servers.py in its own process, so serving does not count towards the measured one."""
+
+    def __init__(self, kind: str, *options: str):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.command = [sys.executable, os.path.join(HERE, "mock_servers.py"), kind, "--port", str(self.port), *options]
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                self.stats()
+                return self
+            except OSError:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    self.process.kill()
+                    raise RuntimeError(f"Mock server did not start: {' '.join(self.command)}")
+                time.sleep(0.05)
+
+    def __exit__(self, exc_type, exc, tb):
+        self.process.terminate()
+        self.process.wait()
+
+    def stats(self) -> dict:
+        with urllib.request.urlopen(f"{self.url}/stats", timeout=1) as response:
+            return json.load(response)
+
+def make_posts(count: int, body_size: int) -> List[dict]:
+    """Raw WordPress posts as the mock server sends them, newest first."""
+    from mock_servers import make_wordpress_post
+    return [make_wordpress_post(post_id, body_size) for post_id in range(count, 0, -1)]
+
+def write_posts_json(posts: List[dict], file_path: str):
+    """Writes posts in the posts.json shape load_and_extract reads (title.text, content.html, links.external)."""
+    from html_extract import extract_post_html
+    from json_stream import RecordWriter
+    with RecordWriter(file_path) as writer:
+        for post in posts:
+            html = post["content"]["rendered"]
+            writer.write({
+                "link": post["link"],
+                "date_gmt": post["date_gmt"],
+                "modified_gmt": post["modified_gmt"],
+                "title": {"text": post["title"]["rendered"]},
+                "content": {"html": html},
+                "links": {"external": [{"href": href} for href in extract_post_html(html, post["link"]).links]},
+            })
+
+def bench_get_posts(config: dict, directory: str) -> dict:
+    import wordpress_site_scraper as scraper
+    options = ["--posts", str(config["posts"]), "--latency", str(config["latency"]), "--body-size", str(config["body_size"])]
+    if config["rate_limit"]:
+        options += ["--rate-limit", str(config["rate_limit"])]
+    with MockServer("wordpress", *options) as server:
+        async def crawl():
+            async with aiohttp.ClientSession() as session:
+                return await scraper.get_posts(session, server.url, start=0, num=config["posts"], concurrency=config["concurrency"])
+
+        start = time.perf_counter()
+        posts, _ = asyncio.run(crawl())
+        seconds = time.perf_counter() - start
+        requests = server.stats()["requests"]
+    return {"posts": len(posts), "requests": requests, "seconds": seconds}
+
+def bench_export(config: dict, directory: str) -> dict:
+    import wordpress_site_scraper as scraper
+    posts = make_posts(config["posts"], config["body_size"])
+
+    async def export():
+        await scraper.save_posts_to_json(posts, os.path.join(directory, "wordpress_posts.json"))
+        await scraper.save_posts_to_csv(posts, os.path.join(directory, "wordpress_posts.csv"))
+
+    start = time.perf_counter()
+    asyncio.run(export())
+    return {"posts": len(posts), "requests": 0, "seconds": time.perf_counter() - start}
+
+def bench_load_and_extract(config: dict, directory: str) -> dict:
+    from filter_posts import load_and_extract
+    posts_path = os.path.join(directory, "posts.json")
+    write_posts_json(make_posts(config["posts"], config["body_size"]), posts_path)
+
+    start = time.perf_counter()
+    records = load_and_extract(posts_path)
+    return {"posts": len(records), "requests": 0, "seconds": time.perf_counter() - start}
+
+def bench_openalex(config: dict, directory: str) -> dict:
+    from filter_posts import iter_extracted
+    from json_stream import RecordWriter
+    from query_doi import run_openalex_process
+    from utils_httpx import tag_entry
+
+    # The input of the enrichment step: extracted posts with their links tagged
+    posts_path = os.path.join(directory, "posts.json")
+    articles_path = os.path.join(directory, "articles.json")
+    write_posts_json(make_posts(config["posts"], 0), posts_path)
+    with RecordWriter(articles_path) as writer:
+        for record in iter_extracted(posts_path):
+            writer.write(tag_entry(record))
+
+    options = ["--latency", str(config["latency"])]
+    if config["openalex_rate_limit"]:
+        options += ["--rate-limit", str(config["openalex_rate_limit"])]
+    with MockServer("openalex", *options) as server, MockServer("idconv", *options) as idconv:
+        start = time.perf_counter()
+        run_openalex_process(
+            requests_per_second=config["openalex_rps"], concurrency=config["concurrency"],
+            store_path=os.path.join(directory, "openalex_metadata.db"), articleinfos_path=articles_path,
+            output_path=os.path.join(directory, "papers.json"), key="external_links", subkey="href",
+            doi_key="doi", doi_subkey="doi", num_articles="all",
+            no_match_path=os.path.join(directory, "no_match_articles.json"), base_url=server.url, idconv_url=idconv.url,
+        )
+        seconds = time.perf_counter() - start
+        requests = server.stats()["requests"] + idconv.stats()["requests"]
+    return {"posts": config["posts"], "requests": requests, "seconds": seconds}
+
+async def check_openalex_retries():
+    """Enriches articles against a mock OpenAlex answering 429s; every request must be retried until it succeeds."""
+    from mock_servers import MockOpenAlex, server_url, start_server
+    from openalex_client import AsyncOpenAlexClient
+    from query_doi import process_articles_async
+
+    articles = [{"index": i, "external_links": [{"href": f"https://doi.org/10.1000/{i}", "doi": f"10.1000/{i}"}]}
+                for i in range(200)]
+    server = MockOpenAlex(rate_limit=2, retry_after=0.2)
+    runner = await start_server(server.app)
+    try:
+        async with AsyncOpenAlexClient(base_url=server_url(runner), requests_per_second=50, backoff=0.1) as client:
+            processed_papers, no_match = {}, []
+            await process_articles_async(client, articles, processed_papers, no_match, "external_links", "href", "doi", "doi")
+    finally:
+        await runner.cleanup()
+    assert client.stats["rate_limited"] > 0, client.stats
+    assert not no_match and len(processed_papers) == len(articles), (len(processed_papers), no_match[:3])
+
+async def check_pubmed_resolver(directory: str):
+    """
+    Converts PMIDs and PMCIDs against a mock ID converter: one request per 200 ids of one idtype,
+    and none at all once the id map holds them.
+    """
+    from mock_servers import MockIdConverter, server_url, start_server
+    from pmid_resolver import IDCONV_BATCH_SIZE, AsyncIdConverter, IdMapStore, PubMedResolver
+
+    pmids = [str(n) for n in range(1, 451)]
+    pmcids = [f"PMC{n}" for n in range(1, 151)]
+    server = MockIdConverter()
+    runner = await start_server(server.app)
+    try:
+        with IdMapStore(os.path.join(directory, "pubmed_dois.db")) as store:
+            async with AsyncIdConverter(base_url=server_url(runner), requests_per_second=50) as converter:
+                resolver = PubMedResolver(converter, store)
+                dois = await resolver.resolve(pmids + pmcids)
+                expected = -(-len(pmids) // IDCONV_BATCH_SIZE) + -(-len(pmcids) // IDCONV_BATCH_SIZE)
+                assert server.stats["requests"] == expected and server.stats["mixed_idtypes"] == 0, server.stats
+                assert all(dois.values()), [value for value, doi in dois.items() if not doi][:3]
+
+                again = await resolver.resolve(pmids + pmcids)
+                assert server.stats["requests"] == expected, server.stats
+                assert again == dois and store.stats["hits"] == len(dois), store.stats
+    finally:
+        await runner.cleanup()
+
+BENCHMARKS = {
+    "get_posts": bench_get_posts,
+    "export": bench_export,
+    "load_and_extract": bench_load_and_extract,
+    "openalex": bench_openalex,
+}
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+def run_child(name: str, config: dict) -> dict:
+    """Runs one scenario in this process and adds the rates and peak memory."""
+    with tempfile.TemporaryDirectory() as directory:
+        result = BENCHMARKS[name](config, directory)
+    result["posts_per_second"] = result["posts"] / result["seconds"]
+    result["requests_per_second"] = result["requests"] / result["seconds"]
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def measure(name: str, config: dict, repeat: int) -> dict:
+    """Runs a scenario repeat times, each in a fresh interpreter, and keeps the fastest run."""
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(repeat):
+            # The child runs in a scratch directory, so the caches and outputs a scenario writes do not carry over to the next run
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", name, "--config", json.dumps(config)],
+                check=True, capture_output=True, text=True, cwd=directory,
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+    return min(runs, key=lambda run: run["seconds"])
+
+def print_results(results: Dict[str, dict], baseline: Dict[str, dict]):
+    print(f"{'scenario':>17} {'posts/s':>10} {'requests/s':>11} {'wall s':>8} {'peak RSS MB':>12}")
+    for name, result in results.items():
+        print(f"{name:>17} {result['posts_per_second']:10,.0f} {result['requests_per_second']:11,.1f} "
+              f"{result['seconds']:8.2f} {result['peak_rss_mb']:12,.1f}")
+        if name in baseline:
+            changes = []
+            for metric in COMPARED:
+                before = baseline[name].get(metric)
+                if before:
+                    changes.append(f"{metric} {(result[metric] - before) / before:+.1%}")
+            print(f"{'vs baseline':>17} {', '.join(changes)}")
+
+def regressions(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Names the metrics that got worse than the baseline by more than tolerance (a fraction)."""
+    found = []
+    for name, result in results.items():
+        for metric, direction in COMPARED.items():
+            before = baseline.get(name, {}).get(metric)
+            if before and direction * (result[metric] - before) / before < -tolerance:
+                found.append(f"{name} {metric}: {before:,.2f} -> {result[metric]:,.2f}")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark crawling, exporting, extraction and OpenAlex enrichment against local mock servers."
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--posts", type=int, default=5000, help="Posts served, exported and extracted.")
+    parser.add_argument("--body-size", type=int, default=4000, help="Approximate bytes of HTML content per post.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the mock servers take per response.")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second the mock WordPress serves before answering 429.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight for get_posts and the OpenAlex client.")
+    parser.add_argument("--openalex-rps", type=float, default=50, help="Requests per second allowed to the OpenAlex client.")
+    parser.add_argument("--openalex-rate-limit", type=float, default=None,
+                        help="Requests per second the mock OpenAlex and ID converter serve before answering 429.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario; the fastest is reported.")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare against the results saved in this file.")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Save these results as a baseline for later runs.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Worsening beyond this fraction counts as a regression.")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        logging.basicConfig(level=logging.ERROR)
+        logging.getLogger().setLevel(logging.ERROR)  # query_doi configures INFO when imported
+        print(json.dumps(run_child(args.child, json.loads(args.config))))
+        return
+
+    # The scenarios only mean something if the clients handle the mock servers' answers correctly
+    asyncio.run(check_openalex_retries())
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(check_pubmed_resolver(directory))
+
+    config = {
+        "posts": args.posts, "body_size": args.body_size, "latency": args.latency, "rate_limit": args.rate_limit,
+        "concurrency": args.concurrency, "openalex_rps": args.openalex_rps, "openalex_rate_limit": args.openalex_rate_limit,
+    }
+    baseline_config, baseline = {}, {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            saved = json.load(file)
+        baseline_config, baseline = saved["config"], saved["results"]
+        if baseline_config != config:
+            print(f"Warning: the baseline was recorded with {baseline_config}, this run uses {config}")
+
+    results = {name: measure(name, config, max(1, args.repeat)) for name in args.scenarios}
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump({
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "config": config,
+                "results": results,
+            }, file, indent=4)
+        print(f"Saved the baseline to {args.save_baseline}")
+
+    if baseline:
+        worse = regressions(results, baseline, args.tolerance)
+        if worse:
+            print(f"Regressions beyond {args.tolerance:.0%}:")
+            for line in worse:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+import wordpress_site_scraper as scraper
+from adaptive_concurrency import AdaptiveLimiter
+from mock_servers import MockWordPress, server_url, start_server
+
+async def crawl(server: MockWordPress, limiter, concurrency: int, per_page: int, change_capacity=None):
+    """Crawls the mock site once; change_capacity=(seconds, capacity) resizes the server mid-crawl."""
+    runner = await start_server(server.app)
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+            if change_capacity is not None:
+                delay, capacity = change_capacity
+
+                async def resize():
+                    await asyncio.sleep(delay)
+                    server.capacity = capacity
+
+                resizer = asyncio.create_task(resize())
+            start = time.perf_counter()
+            result = await scraper.crawl_all_pages(
+                session, server_url(runner), "wp/v2/posts", per_page=per_page, concurrency=concurrency,
+                display_progress=False, keep_entries=False, limiter=limiter,
+            )
+            elapsed = time.perf_counter() - start
+            if change_capacity is not None:
+                resizer.cancel()
+    finally:
+        await runner.cleanup()
+    return result, elapsed
+
+async def compare(label: str, make_server, per_page: int, change_capacity=None):
+    print(label)
+    for name in ("fixed 5", "fixed 32", "adaptive"):
+        server = make_server()
+        limiter = AdaptiveLimiter(initial=4, maximum=64) if name == "adaptive" else None
+        concurrency = 32 if name == "fixed 32" else 5
+        result, elapsed = await crawl(server, limiter, concurrency, per_page, change_capacity)
+        settled = f", {limiter.summary()}" if limiter else ""
+        print(f"  {name:>9}: {elapsed:6.2f}s, {result.total_pages - len(result.failed_pages)}/{result.total_pages} pages, "
+              f"{server.stats['overloaded']} overloaded answers{settled}")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare fixed and adaptive crawl concurrency against a mock WordPress site.")
+    parser.add_argument("--posts", type=int, default=4000)
+    parser.add_argument("--per-page", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    def site(capacity, **kwargs):
+        return lambda: MockWordPress(posts=args.posts, capacity=capacity, latency=args.latency, **kwargs)
+
+    await compare("Fast site (capacity 48):", site(48), args.per_page)
+    await compare("Small shared host (capacity 3, 503s):", site(3), args.per_page)
+    await compare("Small shared host (capacity 3, 429s with Retry-After: 1):", site(3, overload_status=429, retry_after=1), args.per_page)
+    await compare("Capacity drops from 48 to 6 after 0.3 seconds:", site(48), args.per_page, change_capacity=(0.3, 6))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from corpus_store import CorpusStore
+from identifiers import extract_identifiers
+
+# Words the post texts are drawn from; the last ones are rare, the first ones appear in most posts
+WORDS = [f"word{i}" for i in range(5000)] + ["microbiome", "exoplanet", "tardigrade"]
+
+def make_corpus(posts: int, papers: int, seed: int = 0):
+    """Builds pipeline-shaped post records with text citing a pool of papers, and OpenAlex-shaped paper records."""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    dois = [f"10.{rng.randint(1000, 9999)}/paper.{i}" for i in range(papers)]
+    records = []
+    for index in range(1, posts + 1):
+        cited = rng.sample(dois, rng.randint(1, 4))
+        links = [{"href": f"https://doi.org/{doi}"} for doi in cited]
+        links.append({"href": f"https://www.nature.com/articles/s41586-{index}"})
+        records.append({
+            "index": index,
+            "id": index,
+            "title": f"Post {index}",
+            "content": " ".join(rng.choices(WORDS, weights, k=150)),
+            "date_gmt": f"20{rng.randint(10, 24)}-05-01T12:00:00",
+            "modified_gmt": "not modified",
+            "url": f"https://example.com/{index}/",
+            "publication_line": "published in a journal",
+            "publication_url": links[0]["href"],
+            "external_links": links,
+        })
+    paper_records = [
+        {"doi": doi, "openalex_id": f"W{i}", "title": f"Paper {i}", "first_author": "A. Author",
+         "authors": "A. Author, B. Author", "year": rng.randint(2000, 2024), "journal": "Journal",
+         "referenced_works_count": 0, "referenced_works": [], "queried_indexes": []}
+        for i, doi in enumerate(dois)
+    ]
+    return records, paper_records, dois
+
+def check_mixed_sources(path: str):
+    """Stores a post from the scraper and from the pipeline, in both orders; neither may erase what the other stored."""
+    url = "https://example.com/tardigrades/"
+    scraped = {"index": 1, "id": 1, "title": "Tardigrades", "url": url, "date_gmt": None,
+               "content": "Tardigrades survive in space", "links": None}
+    extracted = {"index": 1, "id": 1, "title": "Tardigrades", "date_gmt": "2024-05-01T12:00:00", "url": url,
+                 "publication_line": "published in Nature", "publication_url": "https://doi.org/10.1000/tardigrade",
+                 "external_links": [{"href": "https://doi.org/10.1000/tardigrade"}]}
+    for order in ((scraped, extracted), (extracted, scraped)):
+        with CorpusStore(path) as store:
+            for record in order:
+                store.add_posts([record])
+            found = store.search("tardigrades space")
+            assert [post["url"] for post in found] == [url], found
+            assert store.conn.execute("SELECT publication_line FROM posts WHERE url = ?", (url,)).fetchone()[0] == "published in Nature"
+            assert [post["url"] for post in store.posts_citing("10.1000/tardigrade")] == [url]
+        os.remove(path)
+
+def timed(label: str, function, repeat: int = 1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label:>48}: {elapsed * 1000:10.2f} ms  ({len(result)} results)")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare indexed corpus lookups with scanning the JSON exports.")
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--papers", type=int, default=50_000)
+    args = parser.parse_args()
+
+    records, papers, dois = make_corpus(args.posts, args.papers)
+    with tempfile.TemporaryDirectory() as directory:
+        check_mixed_sources(os.path.join(directory, "check.db"))
+        posts_path = os.path.join(directory, "urls_with_info.json")
+        papers_path = os.path.join(directory, "papers.json")
+        with open(posts_path, "w", encoding="utf-8") as file:
+            json.dump(records, file, indent=4)
+        with open(papers_path, "w", encoding="utf-8") as file:
+            json.dump(papers, file, indent=4)
+
+        start = time.perf_counter()
+        with CorpusStore(os.path.join(directory, "corpus.db")) as store:
+            for i in range(0, len(records), 1000):
+                store.add_posts(records[i:i + 1000])
+            store.add_papers(papers)
+            print(f"Stored {args.posts:,} posts and {args.papers:,} papers in {time.perf_counter() - start:.1f}s: {store.counts()}")
+
+            doi = dois[len(dois) // 2]
+
+            def scan_citing():
+                with open(posts_path, encoding="utf-8") as file:
+                    return [post for post in json.load(file)
+                            if any(extract_identifiers(link["href"]).get("doi") == doi for link in post["external_links"])]
+
+            def scan_year():
+                with open(papers_path, encoding="utf-8") as file:
+                    return [paper for paper in json.load(file) if paper["year"] == 2021]
+
+            expected = timed("posts citing a DOI, JSON scan", scan_citing)
+            found = timed("posts citing a DOI, corpus store", lambda: store.posts_citing(doi), repeat=100)
+            assert sorted(post["url"] for post in expected) == sorted(post["url"] for post in found)
+            expected = timed("papers from 2021, JSON scan", scan_year)
+            found = timed("papers from 2021, corpus store", lambda: store.papers_from_year(2021), repeat=10)
+            assert len(expected) == len(found)
+
+            def scan_text(word):
+                with open(posts_path, encoding="utf-8") as file:
+                    return [post for post in json.load(file) if word in post["content"].split()]
+
+            store.optimize_index()
+            for word in ("tardigrade", "word100"):
+                expected = timed(f"posts mentioning {word}, JSON scan", lambda: scan_text(word))
+                found = timed(f"posts mentioning {word}, full-text search", lambda: store.search(word, limit=None), repeat=10)
+                assert len(expected) == len(found)
+                timed(f"top 20 posts mentioning {word}, search", lambda: store.search(word), repeat=10)
+
+if __name__ == "__main__":
+    main()
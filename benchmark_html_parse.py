@@ -0,0 +1,54 @@
+import argparse
+import random
+import time
+
+from html_extract import available_backends, extract_post_html
+
+def make_post_html(paragraphs: int, seed: int = 0) -> str:
+    """Builds a WordPress-like post body with ads, scripts, styles and a trailing reference link."""
+    rng = random.Random(seed)
+    words = ["cell", "study", "protein", "results", "researchers", "data", "brain", "model", "effect", "sample"]
+    parts = ["<p>Introduction</p><style>.wp-block-quote { margin: 0 }</style>"]
+    for i in range(paragraphs):
+        sentence = " ".join(rng.choice(words) for _ in range(40))
+        parts.append(f"<p>{sentence} <a href=\"https://example.org/ref/{i}\">ref</a></p>")
+        if i % 5 == 0:
+            parts.append("<div class=\"ad-slot--container\"><script>loadAd();</script>advert</div>")
+    parts.append("<p>The study was published in Nature. <a href=\"https://doi.org/10.1038/s41586-020-0000-0\">Link</a></p>")
+    return "\n".join(parts)
+
+def check_backends_agree(html_content: str):
+    """Exits with an error unless every installed backend extracts the same text and links."""
+    extractions = {backend: extract_post_html(html_content, "https://blog.example.com", backend=backend)
+                   for backend in available_backends()}
+    reference_backend, reference = next(iter(extractions.items()))
+    for backend, extraction in extractions.items():
+        if extraction != reference:
+            raise SystemExit(f"{backend} extracts something else than {reference_backend}:\n{extraction}\n{reference}")
+
+def benchmark(backend: str, html_content: str, seconds: float) -> float:
+    """Returns how many times per second the backend can extract the given HTML."""
+    parses = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        extract_post_html(html_content, "https://blog.example.com", backend=backend)
+        parses += 1
+    return parses / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTML parser backends for post extraction.")
+    parser.add_argument("--paragraphs", type=int, default=30, help="Paragraphs per synthetic post.")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Time spent on each backend.")
+    args = parser.parse_args()
+
+    html_content = make_post_html(args.paragraphs)
+    print(f"Post size: {len(html_content)} bytes")
+    check_backends_agree(html_content)
+    baseline = None
+    for backend in reversed(available_backends()):
+        rate = benchmark(backend, html_content, args.seconds)
+        baseline = baseline or rate
+        print(f"{backend:>12}: {rate:10.1f} parses/s  ({rate / baseline:.1f}x html.parser)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import random
+import re
+import time
+
+from identifiers import extract_identifiers_batch
+
+LINK_TEMPLATES = [
+    "https://doi.org/10.{a}/j.cell.{y}.{b}",
+    "https://onlinelibrary.wiley.com/doi/full/10.{a}/anie.{y}{b}/abstract",
+    "https://academic.oup.com/brain/article/10.{a}/brain/awz{b}?utm_source=feed",
+    "https://pubmed.ncbi.nlm.nih.gov/{b}{a}/",
+    "https://www.ncbi.nlm.nih.gov/pmc/articles/PMC{b}{a}/",
+    "https://europepmc.org/abstract/MED/?pmid={b}{a}",
+    "https://arxiv.org/abs/{y2}{m}.{b}v2",
+    "https://www.nature.com/articles/s41586-{y}-{b}-7",
+    "https://www.sciencedaily.com/releases/{y}/{m}/{b}.htm",
+    "https://twitter.com/someone/status/{b}{a}",
+]
+
+def make_links(count: int, seed: int = 0):
+    """Builds synthetic external links in the proportions of a typical link dump."""
+    rng = random.Random(seed)
+    links = []
+    for _ in range(count):
+        template = rng.choice(LINK_TEMPLATES)
+        links.append(template.format(
+            a=rng.randint(1000, 9999), b=rng.randint(10000, 99999), y=rng.randint(2000, 2024),
+            y2=rng.randint(10, 24), m=f"{rng.randint(1, 12):02d}",
+        ))
+    return links
+
+# The previous approach: three uncompiled searches per href, then the same regexes again
+LEGACY_DOI = r"10\.\d{4,9}/[^/]+"
+LEGACY_PMID = r"pmid=(\d+)"
+LEGACY_PUBMED = r"pubmed\.ncbi\.nlm\.nih\.gov/(\d+)/"
+
+def legacy_extract(links):
+    results = []
+    for url in links:
+        doi_match = re.search(LEGACY_DOI, url, re.IGNORECASE)
+        pmid_match = re.search(LEGACY_PMID, url, re.IGNORECASE)
+        pubmed_match = re.search(LEGACY_PUBMED, url, re.IGNORECASE)
+        re.search(LEGACY_DOI, url, re.IGNORECASE)
+        re.search(LEGACY_PMID, url, re.IGNORECASE)
+        if doi_match:
+            results.append({"doi": doi_match.group()})
+        elif pmid_match:
+            results.append({"pubmedID": pmid_match.group(1)})
+        elif pubmed_match:
+            results.append({"pubmedID": pubmed_match.group(1)})
+        else:
+            results.append(None)
+    return results
+
+def timed(label, function, links):
+    start = time.perf_counter()
+    results = function(links)
+    elapsed = time.perf_counter() - start
+    found = sum(1 for result in results if result)
+    print(f"{label:>12}: {elapsed:6.2f}s  {len(links) / elapsed:12,.0f} links/s  {found:,} links with an identifier")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare identifier extraction over synthetic links.")
+    parser.add_argument("--links", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    links = make_links(args.links)
+    timed("legacy", legacy_extract, links)
+    timed("single-pass", extract_identifiers_batch, links)
+
+if __name__ == "__main__":
+    main()
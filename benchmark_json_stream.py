@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+from json_stream import RecordWriter, iter_records
+from utils_httpx import tag_entry
+
+LINK_TEMPLATES = [
+    "https://doi.org/10.{a}/j.cell.{b}",
+    "https://pubmed.ncbi.nlm.nih.gov/{b}{a}/",
+    "https://www.nature.com/articles/s41586-{a}-{b}-7",
+    "https://twitter.com/someone/status/{b}{a}",
+]
+
+def make_entry(index: int, rng: random.Random) -> dict:
+    """Builds one entry shaped like the urls_with_info.json records the tagging stage reads."""
+    links = [
+        {"href": rng.choice(LINK_TEMPLATES).format(a=rng.randint(1000, 9999), b=rng.randint(10000, 99999)), "text": "source"}
+        for _ in range(rng.randint(2, 12))
+    ]
+    return {
+        "index": index,
+        "title": f"Post number {index} about a new study",
+        "date_gmt": "2024-05-01T12:00:00",
+        "modified_gmt": "not modified",
+        "url": f"https://example.com/{index}/",
+        "publication_line": "published in a journal " * rng.randint(1, 20),
+        "publication_url": links[-1]["href"],
+        "external_links": links,
+    }
+
+def generate(file_path: str, size_mb: int):
+    """Writes entries until the file reaches size_mb megabytes."""
+    rng = random.Random(0)
+    target = size_mb * 1024 * 1024
+    with RecordWriter(file_path) as writer:
+        index = 1
+        while writer.file.tell() < target:
+            for _ in range(1000):
+                writer.write(make_entry(index, rng))
+                index += 1
+    print(f"Generated {index - 1:,} entries in {os.path.getsize(file_path) / 1024 ** 2:,.0f} MB at {file_path}")
+
+def run_load(input_path: str, output_path: str) -> int:
+    # The previous approach: the whole file in memory, tagged, then dumped in one go
+    with open(input_path, "r", encoding="utf-8") as file:
+        data = json.load(file)
+    for entry in data:
+        tag_entry(entry)
+    with open(output_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=4)
+    return len(data)
+
+def run_stream(input_path: str, output_path: str) -> int:
+    with RecordWriter(output_path) as writer:
+        for entry in iter_records(input_path):
+            writer.write(tag_entry(entry))
+    return writer.records_written
+
+def measure(mode: str, input_path: str, output_path: str):
+    """Runs one mode in a fresh interpreter so its peak resident memory is measured on its own."""
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", mode, "--input", input_path, "--output", output_path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    records, elapsed, peak_kb = output.split()
+    size_mb = os.path.getsize(input_path) / 1024 ** 2
+    print(f"{mode:>7}: {float(elapsed):7.1f}s  {size_mb / float(elapsed):6.1f} MB/s  "
+          f"peak RSS {int(peak_kb) / 1024:8,.0f} MB  {int(records):,} records")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare peak memory of json.load against streaming on a generated input.")
+    parser.add_argument("--size-mb", type=int, default=2048, help="Size of the generated input file.")
+    parser.add_argument("--input", default="benchmark_input.json", help="Input file; generated if it does not exist.")
+    parser.add_argument("--output", default="benchmark_output.json")
+    parser.add_argument("--modes", nargs="+", choices=["load", "stream"], default=["stream", "load"],
+                        help="The load mode needs several times the input size in RAM.")
+    parser.add_argument("--child", choices=["load", "stream"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        start = time.perf_counter()
+        records = (run_load if args.child == "load" else run_stream)(args.input, args.output)
+        elapsed = time.perf_counter() - start
+        print(records, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        return
+
+    if not os.path.exists(args.input):
+        generate(args.input, args.size_mb)
+    for mode in args.modes:
+        measure(mode, args.input, args.output)
+
+if __name__ == "__main__":
+    main()
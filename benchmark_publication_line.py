@@ -0,0 +1,62 @@
+import argparse
+import random
+import re
+import time
+
+from filter_posts import extract_publication_info, extract_sentence
+
+PARAGRAPH = (
+    "<p>Researchers at the university found that the new treatment reduced symptoms in most patients, "
+    "according to <a href=\"https://example.com/{n}\">a report</a> released this week.</p>\n"
+)
+ENDING = (
+    "<p>The study was published in <a href=\"https://doi.org/10.1000/{n}\">The Journal of Examples</a>.</p>\n"
+)
+
+def make_post(size_kb: int, seed: int) -> dict:
+    """Builds a post whose content HTML is about size_kb kilobytes and ends with a publication line."""
+    rng = random.Random(seed)
+    paragraphs = []
+    length = 0
+    while length < size_kb * 1024:
+        paragraph = PARAGRAPH.format(n=rng.randint(1, 10 ** 6))
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    paragraphs.append(ENDING.format(n=seed))
+    return {"html": "".join(paragraphs), "external": [{"href": f"https://doi.org/10.1000/{seed}"}]}
+
+def legacy_extract(content_html, external_links):
+    # The previous approach: every line copied, the whole body joined and split to keep 15 words
+    html_array = []
+    for line in content_html.splitlines():
+        line.split("</p>")
+        html_array.append(line)
+    my_str = ' '.join(html_array)
+    html_array = my_str.split(" ")
+    html_array = html_array[-15:]
+    my_str = ' '.join(html_array)
+    last_external_link = external_links[-1] if external_links else {}
+    clean_text = re.sub(r'<.*?>', '', my_str)
+    return extract_sentence(clean_text, "<p>", "<a href="), last_external_link
+
+def timed(function, posts):
+    start = time.perf_counter()
+    results = [function(post["html"], post["external"]) for post in posts]
+    return time.perf_counter() - start, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full-body and tail-only publication line extraction.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 64, 512], help="Post sizes in kilobytes.")
+    parser.add_argument("--posts", type=int, default=200)
+    args = parser.parse_args()
+
+    for size_kb in args.sizes:
+        posts = [make_post(size_kb, seed) for seed in range(args.posts)]
+        legacy_time, legacy_results = timed(legacy_extract, posts)
+        tail_time, tail_results = timed(extract_publication_info, posts)
+        assert legacy_results == tail_results, "tail-only extraction differs from the full-body extraction"
+        print(f"{size_kb:>5} KB posts: full body {args.posts / legacy_time:10,.0f} posts/s  "
+              f"tail only {args.posts / tail_time:10,.0f} posts/s  ({legacy_time / tail_time:,.0f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import json
+import time
+
+import serialization
+from mock_servers import make_wordpress_post
+
+def make_full_post(post_id: int, body_size: int) -> dict:
+    """A post with the fields a WordPress REST response carries besides the ones we export."""
+    post = make_wordpress_post(post_id, body_size)
+    return {
+        **post,
+        "date": post["date_gmt"], "modified": post["modified_gmt"], "slug": f"post-{post_id}", "status": "publish",
+        "type": "post", "guid": {"rendered": f"https://blog.example.com/?p={post_id}"}, "author": post_id % 17,
+        "featured_media": post_id * 3, "comment_status": "open", "ping_status": "closed", "sticky": False,
+        "template": "", "format": "standard", "meta": {"footnotes": ""}, "categories": [post_id % 9, 12],
+        "tags": [post_id % 40, post_id % 41, 7], "class_list": [f"post-{post_id}", "type-post", "status-publish"],
+        "yoast_head": "<meta name=\"robots\" content=\"index, follow\" />" * 40,
+        "_links": {name: [{"href": f"https://blog.example.com/wp-json/wp/v2/{name}/{post_id}"}]
+                   for name in ("self", "collection", "about", "author", "replies", "version-history", "wp:attachment")},
+    }
+
+def best_of(repeat: int, function, *args) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def stdlib_decode(pages):
+    # The decoding the scraper did before: bytes to str, then json.loads
+    for page in pages:
+        json.loads(page.decode("utf-8"))
+
+def decode(pages):
+    for page in pages:
+        serialization.loads(page)
+
+def decode_posts(pages):
+    for page in pages:
+        serialization.loads_posts(page)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON backends on pages of WordPress posts as the REST API returns them.")
+    parser.add_argument("--pages", type=int, default=50, help="Pages of posts decoded and encoded.")
+    parser.add_argument("--per-page", type=int, default=100)
+    parser.add_argument("--body-size", type=int, default=6000, help="Approximate bytes of HTML content per post.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the fastest is reported.")
+    args = parser.parse_args()
+
+    pages = [
+        json.dumps([make_full_post(page * args.per_page + i, args.body_size) for i in range(args.per_page)]).encode("utf-8")
+        for page in range(args.pages)
+    ]
+    size_mb = sum(len(page) for page in pages) / 1024 ** 2
+    posts = [post for page in pages for post in json.loads(page)]
+    print(f"{args.pages} pages of {args.per_page} posts, {size_mb:.1f} MB; installed backends: {', '.join(serialization.available_backends())}")
+
+    seconds = best_of(args.repeat, stdlib_decode, pages)
+    print(f"{'decode':>14} {'stdlib before':>15}: {seconds:6.3f}s {size_mb / seconds:7.1f} MB/s")
+    for name in serialization.available_backends():
+        serialization.set_backend(name)
+        seconds = best_of(args.repeat, decode, pages)
+        print(f"{'decode':>14} {name:>15}: {seconds:6.3f}s {size_mb / seconds:7.1f} MB/s")
+    if serialization.msgspec is not None:
+        # loads_posts always uses msgspec's typed decoder when it is installed
+        seconds = best_of(args.repeat, decode_posts, pages)
+        print(f"{'decode posts':>14} {'msgspec typed':>15}: {seconds:6.3f}s {size_mb / seconds:7.1f} MB/s")
+
+    seconds = best_of(args.repeat, lambda: json.dumps(posts, indent=4))
+    before = len(json.dumps(posts, indent=4).encode("utf-8"))
+    print(f"{'encode':>14} {'indent=4 before':>15}: {seconds:6.3f}s, {before / 1024 ** 2:6.1f} MB")
+    for name in serialization.available_backends():
+        serialization.set_backend(name)
+        # indent=4 is the default output; orjson only writes it through the stdlib encoder
+        for label, indent in (("encode", 4), ("encode indent=2", 2), ("encode compact", None)):
+            seconds = best_of(args.repeat, serialization.dumps, posts, indent)
+            size = len(serialization.dumps(posts, indent).encode("utf-8"))
+            print(f"{label:>14} {name:>15}: {seconds:6.3f}s, {size / 1024 ** 2:6.1f} MB ({size / before - 1:+.0%} size)")
+
+if __name__ == "__main__":
+    main()
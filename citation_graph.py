@@ -0,0 +1,218 @@
+"""Citation graphs in compressed sparse row form, saved in a flat file that loads with mmap, and their expansion from OpenAlex."""
+import asyncio
+import logging
+import mmap
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from metrics import metrics
+from openalex_client import extract_paper_metadata, short_openalex_id
+
+logger = logging.getLogger(__name__)
+
+# File layout: header, offsets (uint64 x nodes + 1), targets (uint32 x edges), newline-separated ids, all little-endian
+MAGIC = b"CITCSR1\0"
+HEADER = struct.Struct("<8sQQQ")  # magic, nodes, edges, bytes of ids
+OFFSET_TYPE = "Q"
+TARGET_TYPE = "I" if array("I").itemsize == 4 else "L"
+
+class CitationGraph:
+    """
+    Works and their citations as integer-indexed CSR: the works node i cites are
+    targets[offsets[i]:offsets[i + 1]], sorted, with work ids kept in `ids`. A million edges take
+    4 MB of targets; a graph loaded with load() reads both arrays straight from the mapped file.
+    """
+
+    def __init__(self, ids: List[str], offsets, targets, mapped: Optional[mmap.mmap] = None):
+        self.ids = ids
+        self.offsets = offsets
+        self.targets = targets
+        self._mapped = mapped
+        self._index: Optional[Dict[str, int]] = None
+        self._reverse: Optional["CitationGraph"] = None
+
+    @classmethod
+    def from_edges(cls, ids: List[str], sources: Iterable[int], targets: Iterable[int]) -> "CitationGraph":
+        """Builds the CSR from parallel lists of edge endpoints; duplicate edges are kept once."""
+        sources = array(TARGET_TYPE, sources)
+        targets = array(TARGET_TYPE, targets)
+        counts = array(OFFSET_TYPE, bytes(8 * (len(ids) + 1)))
+        for source in sources:
+            counts[source + 1] += 1
+        for i in range(len(ids)):
+            counts[i + 1] += counts[i]
+        # Counting sort of the edges by source
+        cursor = array(OFFSET_TYPE, counts[:-1])
+        placed = array(TARGET_TYPE, bytes(targets.itemsize * len(targets)))
+        for source, target in zip(sources, targets):
+            placed[cursor[source]] = target
+            cursor[source] += 1
+        # Sort each row and drop repeats
+        offsets = array(OFFSET_TYPE, [0])
+        unique = array(TARGET_TYPE)
+        for i in range(len(ids)):
+            unique.extend(sorted(set(placed[counts[i]:counts[i + 1]])))
+            offsets.append(len(unique))
+        return cls(list(ids), offsets, unique)
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.targets)
+
+    def index(self, work_id: str) -> Optional[int]:
+        """Node number of a work, given as a short id or an OpenAlex URL."""
+        if self._index is None:
+            self._index = {work: i for i, work in enumerate(self.ids)}
+        return self._index.get(short_openalex_id(work_id))
+
+    def neighbors(self, node: int):
+        """Node numbers node cites."""
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def references(self, work_id: str) -> List[str]:
+        """Ids of the works in the graph that work_id cites."""
+        node = self.index(work_id)
+        return [] if node is None else [self.ids[i] for i in self.neighbors(node)]
+
+    def cited_by(self, work_id: str) -> List[str]:
+        """Ids of the works in the graph citing work_id, from the transposed graph built on first use."""
+        node = self.index(work_id)
+        return [] if node is None else [self.ids[i] for i in self.reverse().neighbors(node)]
+
+    def reverse(self) -> "CitationGraph":
+        """The same graph with every edge turned around (cited -> citing)."""
+        if self._reverse is None:
+            sources = array(TARGET_TYPE)
+            for node in range(self.num_nodes):
+                sources.extend([node] * (self.offsets[node + 1] - self.offsets[node]))
+            self._reverse = CitationGraph.from_edges(self.ids, self.targets, sources)
+        return self._reverse
+
+    def save(self, path: str):
+        ids = "\n".join(self.ids).encode("utf-8")
+        offsets, targets = array(OFFSET_TYPE, self.offsets), array(TARGET_TYPE, self.targets)
+        if sys.byteorder == "big":
+            offsets.byteswap()
+            targets.byteswap()
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, self.num_nodes, self.num_edges, len(ids)))
+            offsets.tofile(file)
+            targets.tofile(file)
+            file.write(ids)
+
+    @classmethod
+    def load(cls, path: str) -> "CitationGraph":
+        """Maps a saved graph into memory; offsets and targets are views of the file, not copies."""
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, nodes, edges, ids_size = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} is not a saved citation graph")
+        view = memoryview(mapped)
+        start = HEADER.size
+        offsets = view[start:start + 8 * (nodes + 1)].cast(OFFSET_TYPE)
+        start += 8 * (nodes + 1)
+        targets = view[start:start + 4 * edges].cast(TARGET_TYPE)
+        start += 4 * edges
+        ids = bytes(view[start:start + ids_size]).decode("utf-8").split("\n") if nodes else []
+        if sys.byteorder == "big":
+            offsets, targets = array(OFFSET_TYPE, offsets), array(TARGET_TYPE, targets)
+            offsets.byteswap()
+            targets.byteswap()
+        return cls(ids, offsets, targets, mapped)
+
+    def close(self):
+        """Releases the mapped file of a loaded graph."""
+        if self._mapped is not None:
+            if isinstance(self.offsets, memoryview):
+                self.offsets.release()
+                self.targets.release()
+            self._mapped.close()
+            self._mapped = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+async def expand_citations(client, seeds: Iterable[dict], depth: int = 1, max_works: int = 10000,
+                           batch_size: int = 50, citing_per_batch: Optional[int] = 200,
+                           display_progress: bool = True) -> Tuple[CitationGraph, Dict[str, dict]]:
+    """
+    Breadth-first expansion of the citation neighborhood of resolved papers, up to depth levels.
+    At each level the referenced works of the frontier are fetched by id and the works citing it
+    are fetched with cites: filters, all batches running concurrently through the client. Works
+    are deduplicated by OpenAlex id and expansion stops adding works at max_works; at most
+    citing_per_batch citing works are taken per batch of batch_size frontier works.
+    Returns the graph of citations among the collected works and their metadata by short id.
+    """
+    works: Dict[str, dict] = {}
+    ids: List[str] = []
+    seen: Dict[str, int] = {}
+
+    def discover(work_id: str) -> bool:
+        if not work_id or work_id in seen or len(ids) >= max_works:
+            return False
+        seen[work_id] = len(ids)
+        ids.append(work_id)
+        return True
+
+    frontier = []
+    for paper in seeds:
+        work_id = short_openalex_id(paper.get("openalex_id") or "")
+        if discover(work_id):
+            works[work_id] = paper
+            frontier.append(work_id)
+
+    with tqdm(total=depth, desc="Expanding citations", disable=not display_progress) as pbar:
+        for level in range(depth):
+            if not frontier:
+                break
+            referenced = []
+            for work_id in frontier:
+                for reference in works.get(work_id, {}).get("referenced_works", []):
+                    reference = short_openalex_id(reference)
+                    if discover(reference):
+                        referenced.append(reference)
+            citing: List[str] = []
+
+            async def fetch_citing(batch: List[str]):
+                for work in await client.get_citing_works(batch, citing_per_batch) or []:
+                    work_id = short_openalex_id(work.get("id", ""))
+                    if discover(work_id):
+                        works[work_id] = extract_paper_metadata(work)
+                        citing.append(work_id)
+
+            batches = [frontier[i:i + batch_size] for i in range(0, len(frontier), batch_size)]
+            with metrics.span("expand citations", level=level + 1, frontier=len(frontier)):
+                (found, failed), *_ = await asyncio.gather(
+                    client.get_works_by_ids(referenced, batch_size), *(fetch_citing(batch) for batch in batches)
+                )
+            for work_id, work in found.items():
+                works[work_id] = extract_paper_metadata(work)
+            if failed:
+                logger.warning(f"Could not fetch {len(failed)} referenced works at level {level + 1}")
+            frontier = referenced + citing
+            pbar.update(1)
+            logger.info(f"Level {level + 1}: {len(referenced)} referenced and {len(citing)} citing works added, {len(ids)} in total")
+
+    # Every citation among the collected works, read from the reference lists
+    sources, targets = array(TARGET_TYPE), array(TARGET_TYPE)
+    for work_id, paper in works.items():
+        source = seen[work_id]
+        for reference in paper.get("referenced_works", []):
+            target = seen.get(short_openalex_id(reference))
+            if target is not None:
+                sources.append(source)
+                targets.append(target)
+    return CitationGraph.from_edges(ids, sources, targets), works
@@ -0,0 +1,424 @@
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import serialization
+from crawl_state import site_key
+from html_extract import extract_post_html
+from identifiers import extract_identifiers_batch, normalize_doi
+from json_stream import iter_records
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for Parquet export
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    site TEXT NOT NULL DEFAULT '',
+    post_id INTEGER,
+    post_index INTEGER,
+    title TEXT,
+    date_gmt TEXT,
+    modified_gmt TEXT,
+    publication_line TEXT,
+    publication_url TEXT,
+    content TEXT
+);
+CREATE INDEX IF NOT EXISTS posts_site_post_id ON posts (site, post_id);
+CREATE INDEX IF NOT EXISTS posts_date_gmt ON posts (date_gmt);
+
+CREATE TABLE IF NOT EXISTS links (
+    post INTEGER NOT NULL REFERENCES posts (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    href TEXT NOT NULL,
+    PRIMARY KEY (post, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS links_href ON links (href);
+
+CREATE TABLE IF NOT EXISTS identifiers (
+    post INTEGER NOT NULL REFERENCES posts (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (post, kind, value)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS identifiers_value ON identifiers (kind, value);
+
+CREATE TABLE IF NOT EXISTS papers (
+    doi TEXT PRIMARY KEY,
+    openalex_id TEXT,
+    title TEXT,
+    first_author TEXT,
+    authors TEXT,
+    year INTEGER,
+    journal TEXT,
+    referenced_works_count INTEGER,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS papers_year ON papers (year);
+"""
+
+# Full-text index of post titles and cleaned text. It reads the text from the posts table (external
+# content), and the triggers keep it in step, re-indexing a post only when its title or text changed.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+    title, content, content = 'posts', content_rowid = 'id', tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+    INSERT INTO posts_fts (posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, content ON posts
+WHEN old.title IS NOT new.title OR old.content IS NOT new.content BEGIN
+    INSERT INTO posts_fts (posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    INSERT INTO posts_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+END;
+"""
+# bm25 weights of the title and content columns: a match in the title counts more
+FTS_WEIGHTS = (5.0, 1.0)
+
+POST_COLUMNS = ("url", "site", "post_id", "post_index", "title", "date_gmt", "modified_gmt",
+                "publication_line", "publication_url", "content")
+PAPER_COLUMNS = ("doi", "openalex_id", "title", "first_author", "authors", "year", "journal",
+                 "referenced_works_count", "record")
+
+def post_links(record: dict) -> List[str]:
+    """Returns the external link hrefs of a post record from the scraper or from filter_posts/the pipeline."""
+    external = record.get("external_links")
+    if isinstance(external, list):
+        return [link["href"] for link in external if isinstance(link, dict) and isinstance(link.get("href"), str)]
+    links = record.get("links")
+    # The scraper exports links as [unique external links, last external link]
+    if isinstance(links, list) and links and isinstance(links[0], list):
+        return [href for href in links[0] if isinstance(href, str)]
+    return []
+
+def has_links(record: dict) -> bool:
+    """Whether a record lists its links at all (the scraper sets links to None when they were not exported)."""
+    return isinstance(record.get("external_links"), list) or isinstance(record.get("links"), list)
+
+def post_text(record: dict) -> Optional[str]:
+    """Returns a record's cleaned text; raw HTML content (content.rendered or content.html) is cleaned first."""
+    content = record.get("content")
+    if isinstance(content, dict):
+        html_content = content.get("rendered") or content.get("html")
+        return extract_post_html(html_content, None).text if isinstance(html_content, str) else None
+    return content if isinstance(content, str) else None
+
+def fts_query(text: str) -> str:
+    """Quotes every word of a plain query, so all must match and punctuation is not read as FTS5 syntax.
+
+    A trailing * on a word keeps it as a prefix search.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+def _paper_year(value: Any) -> Optional[int]:
+    return value if isinstance(value, int) else None
+
+class CorpusStore:
+    """
+    SQLite store of scraped posts, their external links and identifiers, and OpenAlex paper
+    metadata, indexed on post id, link, identifier and publication year, with an FTS5 full-text
+    index of the post titles and text (see search).
+    Writes go through add_posts/add_papers, one transaction per call, so callers should pass
+    whole pages or batches rather than single records.
+    """
+
+    def __init__(self, path: str = "corpus.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(SCHEMA)
+        has_fts = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'").fetchone() is not None
+        self.conn.executescript(FTS_SCHEMA)
+        if not has_fts:
+            # A store created before the full-text index gets its existing posts indexed once
+            self.conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def add_posts(self, records: Iterable[dict], site: str = "") -> int:
+        """
+        Insert or update posts with their links and identifiers in one transaction. A post is
+        identified by its URL. Storing it again keeps the columns the new record leaves empty, as
+        scraper records have no publication line and pipeline records no content, and replaces
+        its links and identifiers only when the new record lists links.
+        Returns the number of posts written.
+        """
+        # A batch listing a post twice stores its last record
+        records = list({record.get("url") or record.get("link"): record
+                        for record in records if record.get("url") or record.get("link")}.values())
+        if not records:
+            return 0
+        rows = []
+        for record in records:
+            title = record.get("title")
+            if isinstance(title, dict):
+                title = title.get("rendered") or title.get("text")
+            rows.append((
+                record.get("url") or record.get("link"), site, record.get("id"), record.get("index"), title,
+                record.get("date_gmt"), record.get("modified_gmt"), record.get("publication_line"),
+                record.get("publication_url"), post_text(record),
+            ))
+
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO posts ({', '.join(POST_COLUMNS)}) VALUES ({', '.join('?' * len(POST_COLUMNS))}) "
+                f"ON CONFLICT (url) DO UPDATE SET site = COALESCE(NULLIF(excluded.site, ''), posts.site), "
+                f"{', '.join(f'{column} = COALESCE(excluded.{column}, posts.{column})' for column in POST_COLUMNS[2:])}",
+                rows,
+            )
+            keys = self._post_keys([row[0] for row in rows])
+            linked = [(keys[row[0]], record) for row, record in zip(rows, records) if has_links(record)]
+            self._delete_children([key for key, _ in linked])
+
+            link_rows = []
+            hrefs = []
+            for key, record in linked:
+                links = post_links(record)
+                link_rows.extend((key, position, href) for position, href in enumerate(links))
+                hrefs.extend((key, href) for href in links)
+                if isinstance(record.get("publication_url"), str):
+                    hrefs.append((key, record["publication_url"]))
+            self.conn.executemany("INSERT INTO links (post, position, href) VALUES (?, ?, ?)", link_rows)
+
+            identifier_rows = set()
+            for (key, _), found in zip(hrefs, extract_identifiers_batch(href for _, href in hrefs)):
+                identifier_rows.update((key, kind, value) for kind, value in found.items())
+            self.conn.executemany("INSERT INTO identifiers (post, kind, value) VALUES (?, ?, ?)", identifier_rows)
+        return len(rows)
+
+    def add_posts_from(self, file_path: str, site: str = "", batch_size: int = 1000) -> int:
+        """
+        Stores the posts of an export (wordpress_posts.json, wordpress_filtered.json, NDJSON...)
+        batch_size per transaction. Posts already stored are updated in place, and only those
+        whose title or text changed are re-indexed, so re-crawled exports can be added again.
+        """
+        written = 0
+        records = iter_records(file_path)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            written += self.add_posts(batch, site)
+        return written
+
+    def _post_keys(self, urls: List[str]) -> Dict[str, int]:
+        keys = {}
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i + 500]
+            rows = self.conn.execute(f"SELECT url, id FROM posts WHERE url IN ({','.join('?' * len(chunk))})", chunk)
+            keys.update((url, key) for url, key in rows)
+        return keys
+
+    def _delete_children(self, post_keys: List[int]):
+        for i in range(0, len(post_keys), 500):
+            chunk = post_keys[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            self.conn.execute(f"DELETE FROM links WHERE post IN ({placeholders})", chunk)
+            self.conn.execute(f"DELETE FROM identifiers WHERE post IN ({placeholders})", chunk)
+
+    def add_papers(self, papers: Iterable[dict]) -> int:
+        """
+        Insert or replace OpenAlex paper metadata (as produced by extract_paper_metadata) in one
+        transaction, keyed by normalized DOI. Returns the number of papers written.
+        """
+        rows = []
+        for paper in papers:
+            if not paper.get("doi"):
+                continue
+            stored = {key: value for key, value in paper.items() if key != "queried_indexes"}
+            rows.append((
+                normalize_doi(paper["doi"]), paper.get("openalex_id"), paper.get("title"), paper.get("first_author"),
+                paper.get("authors"), _paper_year(paper.get("year")), paper.get("journal"),
+                paper.get("referenced_works_count"), serialization.dumps(stored),
+            ))
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO papers ({', '.join(PAPER_COLUMNS)}) VALUES ({', '.join('?' * len(PAPER_COLUMNS))})",
+                rows,
+            )
+        return len(rows)
+
+    def posts_citing(self, value: str, kind: str = "doi") -> List[dict]:
+        """Posts linking to an identifier, e.g. posts_citing('10.1038/xyz') or posts_citing('12345', 'pmid')."""
+        if kind == "doi":
+            value = normalize_doi(value)
+        rows = self.conn.execute(
+            "SELECT posts.* FROM identifiers JOIN posts ON posts.id = identifiers.post "
+            "WHERE identifiers.kind = ? AND identifiers.value = ? ORDER BY posts.date_gmt",
+            (kind, value),
+        )
+        return [dict(row) for row in rows]
+
+    def search(self, query: str, limit: Optional[int] = 20, raw: bool = False) -> List[dict]:
+        """
+        Posts whose title or text match a query, best matches (bm25) first, each with a snippet
+        of the matching text. Rare words come back in milliseconds; the time grows with the number
+        of matching posts, as every match is scored. All words of a plain query must match; raw=True passes FTS5 query
+        syntax (OR, NOT, NEAR, "phrases", title: column filters) through unchanged.
+        """
+        match = query if raw else fts_query(query)
+        if not match:
+            return []
+        # Rank on the index alone first, so posts rows and snippets are only read for the results
+        ranked = self.conn.execute(
+            f"SELECT rowid, bm25(posts_fts, {', '.join(map(str, FTS_WEIGHTS))}) FROM posts_fts "
+            "WHERE posts_fts MATCH ? ORDER BY 2 LIMIT ?",
+            (match, -1 if limit is None else limit),
+        ).fetchall()
+        results = {}
+        for i in range(0, len(ranked), 500):
+            chunk = [key for key, _ in ranked[i:i + 500]]
+            rows = self.conn.execute(
+                "SELECT posts.id, posts.url, posts.site, posts.post_id, posts.title, posts.date_gmt, "
+                "snippet(posts_fts, 1, '[', ']', '...', 16) AS snippet "
+                "FROM posts_fts JOIN posts ON posts.id = posts_fts.rowid "
+                f"WHERE posts_fts MATCH ? AND posts_fts.rowid IN ({','.join('?' * len(chunk))})",
+                (match, *chunk),
+            )
+            results.update((row["id"], dict(row)) for row in rows)
+        return [dict(results[key], score=score) for key, score in ranked if key in results]
+
+    def optimize_index(self):
+        """Merges the full-text index into one b-tree; worth it after large imports."""
+        with self.conn:
+            self.conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('optimize')")
+
+    def papers_from_year(self, year: int) -> List[dict]:
+        """Papers published in a year, with their full stored metadata."""
+        rows = self.conn.execute("SELECT record FROM papers WHERE year = ? ORDER BY doi", (year,))
+        return [serialization.loads(record) for (record,) in rows]
+
+    def papers_cited_by(self, url: str) -> List[dict]:
+        """Papers the post at url links to, for the DOIs we have metadata for."""
+        rows = self.conn.execute(
+            "SELECT papers.record FROM posts JOIN identifiers ON identifiers.post = posts.id AND identifiers.kind = 'doi' "
+            "JOIN papers ON papers.doi = identifiers.value WHERE posts.url = ?",
+            (url,),
+        )
+        return [serialization.loads(record) for (record,) in rows]
+
+    def post(self, post_id: int, site: str = "") -> Optional[dict]:
+        """A post by its WordPress id."""
+        row = self.conn.execute("SELECT * FROM posts WHERE site = ? AND post_id = ?", (site, post_id)).fetchone()
+        return dict(row) if row is not None else None
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("posts", "links", "identifiers", "papers")
+        }
+
+    def iter_table(self, table: str, batch_size: int = 10_000) -> Iterator[Tuple[List[str], List[tuple]]]:
+        """Yields (column names, rows) batches of a whole table."""
+        cursor = self.conn.execute(f"SELECT * FROM {table}")
+        columns = [description[0] for description in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield columns, [tuple(row) for row in rows]
+
+    def export_parquet(self, directory: str, batch_size: int = 10_000) -> List[str]:
+        """
+        Write every table to <directory>/<table>.parquet, streaming batch_size rows at a time.
+        Requires pyarrow.
+        """
+        if pq is None:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for table in ("posts", "links", "identifiers", "papers"):
+            path = os.path.join(directory, f"{table}.parquet")
+            writer = None
+            try:
+                for columns, rows in self.iter_table(table, batch_size):
+                    batch = pa.Table.from_pydict({column: list(values) for column, values in zip(columns, zip(*rows))})
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, batch.schema)
+                    writer.write_table(batch.cast(writer.schema))
+            finally:
+                if writer is not None:
+                    writer.close()
+            if writer is not None:
+                paths.append(path)
+        logger.info(f"Exported {', '.join(paths) or 'nothing'} from {self.path}")
+        return paths
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Query or export the corpus store.")
+    parser.add_argument("--db", default="corpus.db", help="Corpus store to open.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    citing = commands.add_parser("citing", help="Posts linking to an identifier.")
+    citing.add_argument("value")
+    citing.add_argument("--kind", default="doi", choices=["doi", "pmid", "pmcid", "arxiv"])
+    year = commands.add_parser("year", help="Papers published in a year.")
+    year.add_argument("year", type=int)
+    cited = commands.add_parser("cited-by", help="Papers a post links to.")
+    cited.add_argument("url")
+    search = commands.add_parser("search", help="Posts whose title or text match the words of a query.")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=20)
+    search.add_argument("--raw", action="store_true", help="Read the query as FTS5 syntax (OR, NOT, NEAR, \"phrases\", title:word).")
+    index = commands.add_parser("index", help="Add or update the posts of JSON/NDJSON exports and their full-text index.")
+    index.add_argument("files", nargs="+")
+    index.add_argument("--site", default="", help="Base URL of the site the posts come from.")
+    export = commands.add_parser("export", help="Export every table to Parquet.")
+    export.add_argument("directory")
+    commands.add_parser("counts", help="Row counts per table.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    with CorpusStore(args.db) as store:
+        start = time.perf_counter()
+        if args.command == "citing":
+            results = store.posts_citing(args.value, args.kind)
+        elif args.command == "year":
+            results = store.papers_from_year(args.year)
+        elif args.command == "cited-by":
+            results = store.papers_cited_by(args.url)
+        elif args.command == "search":
+            results = store.search(args.query, args.limit, args.raw)
+        elif args.command == "index":
+            site = site_key(args.site) if args.site else ""
+            results = {file_path: store.add_posts_from(file_path, site) for file_path in args.files}
+            store.optimize_index()
+        elif args.command == "export":
+            results = store.export_parquet(args.directory)
+        else:
+            results = store.counts()
+        elapsed = time.perf_counter() - start
+    print(serialization.dumps(results, indent=4))
+    logger.info(f"{args.command} took {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
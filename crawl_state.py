@@ -0,0 +1,139 @@
+import logging
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+import aiofiles
+
+import serialization
+
+def site_key(base_url: str) -> str:
+    """Normalizes a site's base URL so http/https and trailing slashes map to the same state."""
+    parts = urlsplit(base_url if "//" in base_url else f"//{base_url}")
+    return f"{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+class CrawlState:
+    """Local SQLite store of the newest modified_gmt seen for every post of every site."""
+
+    def __init__(self, path: str = "crawl_state.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS post_state (
+                site TEXT NOT NULL,
+                post_id INTEGER NOT NULL,
+                modified_gmt TEXT NOT NULL,
+                PRIMARY KEY (site, post_id)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def latest_modified(self, base_url: str) -> Optional[str]:
+        """Returns the newest modified_gmt recorded for a site, or None if it was never crawled."""
+        row = self.conn.execute(
+            "SELECT MAX(modified_gmt) FROM post_state WHERE site = ?", (site_key(base_url),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def known_posts(self, base_url: str) -> Dict[int, str]:
+        """Returns post id -> modified_gmt for every post recorded for a site."""
+        rows = self.conn.execute(
+            "SELECT post_id, modified_gmt FROM post_state WHERE site = ?", (site_key(base_url),)
+        )
+        return dict(rows)
+
+    def record(self, base_url: str, posts: Iterable[Any]) -> int:
+        """Records the modified_gmt of crawled posts, keeping the newest value per post."""
+        site = site_key(base_url)
+        rows = [
+            (site, post["id"], post["modified_gmt"])
+            for post in posts
+            if isinstance(post, dict) and post.get("id") is not None and post.get("modified_gmt")
+        ]
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO post_state (site, post_id, modified_gmt) VALUES (?, ?, ?)
+                ON CONFLICT (site, post_id) DO UPDATE SET modified_gmt = excluded.modified_gmt
+                WHERE excluded.modified_gmt > post_state.modified_gmt
+                """,
+                rows,
+            )
+        return len(rows)
+
+class CrawlJournal:
+    """Checkpoint of a crawl on disk: one NDJSON file per completed page plus an append-only journal.
+
+    The journal line for a page is only written after its page file is in place, so a page listed
+    in the journal is always complete and an interrupted crawl can pick up where it stopped.
+    """
+
+    def __init__(self, directory: str, base_url: str, per_page: int, resume: bool = False):
+        self.directory = directory
+        self.base_url = base_url
+        self.per_page = per_page
+        self.journal_path = os.path.join(directory, "journal.ndjson")
+        self.completed: Dict[int, List[Any]] = {}
+
+        os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(self.journal_path):
+            self._load()
+        else:
+            self._reset()
+
+    def _reset(self):
+        for name in os.listdir(self.directory):
+            if name.startswith("page_") or name == "journal.ndjson":
+                os.remove(os.path.join(self.directory, name))
+        with open(self.journal_path, "w", encoding="utf-8") as file:
+            file.write(serialization.dumps({"meta": {"site": site_key(self.base_url), "per_page": self.per_page}}) + "\n")
+
+    def _load(self):
+        with open(self.journal_path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = serialization.loads(line)
+                except serialization.DecodeError:
+                    # A torn last line from a crash; the page it described is fetched again
+                    continue
+                if "meta" in entry:
+                    meta = entry["meta"]
+                    if meta.get("site") != site_key(self.base_url) or meta.get("per_page") != self.per_page:
+                        raise ValueError(f"Checkpoint in {self.directory} belongs to a different crawl: {meta}")
+                elif os.path.exists(self.page_path(entry["page"])):
+                    self.completed[entry["page"]] = entry["ids"]
+        logging.info(f"Resuming crawl with {len(self.completed)} pages already saved in {self.directory}")
+
+    def page_path(self, page: int) -> str:
+        return os.path.join(self.directory, f"page_{page:06d}.ndjson")
+
+    async def save_page(self, page: int, records: List[dict]):
+        """Writes a page's records, then marks the page as completed in the journal."""
+        tmp_path = self.page_path(page) + ".tmp"
+        async with aiofiles.open(tmp_path, mode="w", encoding="utf-8") as file:
+            await file.write("".join(serialization.dumps(record) + "\n" for record in records))
+        os.replace(tmp_path, self.page_path(page))
+
+        ids = [record.get("id") for record in records]
+        async with aiofiles.open(self.journal_path, mode="a", encoding="utf-8") as file:
+            await file.write(serialization.dumps({"page": page, "ids": ids}) + "\n")
+        self.completed[page] = ids
+
+    def iter_records(self) -> Iterator[dict]:
+        """Yields the saved records of every completed page, in page order."""
+        for page in sorted(self.completed):
+            with open(self.page_path(page), "r", encoding="utf-8") as file:
+                for line in file:
+                    yield serialization.loads(line)
@@ -0,0 +1,119 @@
+import logging
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+
+import serialization
+from identifiers import normalize_doi
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class MetadataStore:
+    """
+    Persistent store of paper metadata keyed by normalized DOI.
+    Found records live for `ttl` seconds (None = forever) and misses (404s) for `miss_ttl`
+    seconds. Once more than `max_entries` DOIs are stored, the least recently used are evicted.
+    """
+
+    def __init__(self, path: str = "openalex_metadata.db", ttl: Optional[float] = None,
+                 miss_ttl: float = 7 * 24 * 3600, max_entries: Optional[int] = 1_000_000):
+        self.path = path
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0}
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS papers (
+                doi TEXT PRIMARY KEY,
+                record TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS papers_accessed_at ON papers (accessed_at);
+            """
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def _is_fresh(self, record: Optional[str], fetched_at: float, now: float) -> bool:
+        ttl = self.ttl if record is not None else self.miss_ttl
+        return ttl is None or now - fetched_at < ttl
+
+    def get_many(self, dois: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """
+        Look up many DOIs at once. The result maps each requested DOI string with a fresh entry to
+        its record, or to None for a cached miss; DOIs that are unknown or expired are left out.
+        """
+        requested: Dict[str, List[str]] = {}
+        for doi in dois:
+            requested.setdefault(normalize_doi(doi), []).append(doi)
+
+        now = time.time()
+        results: Dict[str, Optional[dict]] = {}
+        keys = list(requested)
+        touched = []
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT doi, record, fetched_at FROM papers WHERE doi IN ({','.join('?' * len(chunk))})", chunk
+            )
+            for doi, record, fetched_at in rows:
+                if not self._is_fresh(record, fetched_at, now):
+                    continue
+                touched.append((now, doi))
+                for original in requested[doi]:
+                    results[original] = dict(serialization.loads(record), queried_indexes=[]) if record is not None else None
+
+        with self.conn:
+            self.conn.executemany("UPDATE papers SET accessed_at = ? WHERE doi = ?", touched)
+
+        hits = sum(1 for record in results.values() if record is not None)
+        self.stats["hits"] += hits
+        self.stats["negative_hits"] += len(results) - hits
+        misses = sum(len(originals) for originals in requested.values()) - len(results)
+        self.stats["misses"] += misses
+        # Cached misses count as hits in the run metrics: they save a request just the same
+        metrics.inc("cache_lookups_total", len(results), cache="metadata_store", result="hit")
+        metrics.inc("cache_lookups_total", misses, cache="metadata_store", result="miss")
+        return results
+
+    def put_many(self, found: Dict[str, dict], not_found: Iterable[str] = ()):
+        """
+        Store fetched records and DOIs the API does not know. Only pass real misses (404s or
+        absent from a successful filter query) as not_found, never failed requests.
+        """
+        now = time.time()
+        rows = []
+        for doi, record in found.items():
+            stored = {key: value for key, value in record.items() if key != "queried_indexes"}
+            rows.append((normalize_doi(doi), serialization.dumps(stored), now, now))
+        rows.extend((normalize_doi(doi), None, now, now) for doi in not_found if doi not in found)
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO papers (doi, record, fetched_at, accessed_at) VALUES (?, ?, ?, ?)", rows
+            )
+        self._evict()
+
+    def _evict(self):
+        if self.max_entries is None:
+            return
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM papers").fetchone()
+        if count > self.max_entries:
+            with self.conn:
+                self.conn.execute(
+                    "DELETE FROM papers WHERE doi IN (SELECT doi FROM papers ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            logger.info(f"Evicted {count - self.max_entries} least recently used DOIs from {self.path}")
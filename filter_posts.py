@@ -1,48 +1,32 @@
-import json
 import re
+from identifiers import extract_identifiers
+from json_stream import RecordWriter, iter_records
+
+TAG_PATTERN = re.compile(r'<.*?>')
 
 
 
 def load_and_extract(json_file_path):
-    # Open the large JSON file and process it
-    with open(json_file_path, 'r', encoding='utf-8') as file:
-        data = json.load(file)
+    # Collect every extracted entry; use iter_extracted to process large files in constant memory
+    return list(iter_extracted(json_file_path))
+
 
-    # Initialize the extracted data list
-    extracted_data = []
+def iter_extracted(json_file_path):
+    # Stream the posts from the JSON file one at a time
     counter = 1
-    # Regex pattern to capture lines mentioning publication names or journals
-    publication_pattern = re.compile(r"(published in|published)\s+([A-Za-z\s]+)", re.IGNORECASE)
 
     # Iterate through each entry in the JSON list
-    for entry in data:
+    for entry in iter_records(json_file_path):
         # Extract the required fields
         date_gmt = entry.get("date_gmt", "")
         modified_gmt = entry.get("modified_gmt", "")
         link = entry.get("link", "")
         titles = entry.get("title", {})
         text_title = titles.get("text", "")
-        # Extract the content HTML and look for the last relevant publication line
+        # Look only at the end of the content HTML for the last relevant publication line
         content_html = entry.get("content", {}).get("html", "")
-        last_publication_line = ""
-        html_array = []
-        # Search for lines in the HTML that mention "published in"
-        for line in content_html.splitlines():
-            line.split("</p>")
-            html_array.append(line)
-
-
-
-            external_links = entry.get("links", {}).get("external", [])
-        my_str = ' '.join(html_array)
-        html_array = my_str.split(" ")
-        html_array = html_array[-15:]
-        my_str = ' '.join(html_array)
-
-        last_external_link = external_links[-1] if external_links else {}
-        clean_text = re.sub(r'<.*?>', '', my_str)
-        title = entry.get("title", {}).get("rendered", "")
-        last_publication_line = extract_sentence(clean_text,"<p>","<a href=")
+        external_links = entry.get("links", {}).get("external", [])
+        last_publication_line, last_external_link = extract_publication_info(content_html, external_links)
         if modified_gmt == date_gmt:
             modified_gmt = "not modified"
         else :
@@ -60,31 +44,29 @@ def load_and_extract(json_file_path):
             "external_links": external_links,
         }
 
-        # Add the result to the extracted data list
-        extracted_data.append(result)
+        yield result
         counter += 1
-    return extracted_data
-
-import json
-import re
 
-# Load JSON data from file
-with open('posts.json', 'r') as file:
-    data = json.load(file)
 
-# Define a regular expression pattern to match DOIs
-doi_pattern = r"10\.\d{4,9}/[-._;()/:A-Z0-9]+"
+def tail_words(html, count=15, window=256):
+    # The last `count` space-separated words of the HTML with its line breaks read as spaces,
+    # found by scanning backward from the end in a window that doubles until it holds them all
+    while window < len(html):
+        joined = ' '.join(html[-window:].splitlines())
+        parts = joined.rsplit(" ", count)
+        # The first character of the window may be half of a cut "\r\n", so the split
+        # before the words we keep must lie after it
+        if len(parts) > count and parts[0]:
+            return ' '.join(parts[1:])
+        window *= 2
+    return ' '.join(' '.join(html.splitlines()).split(" ")[-count:])
 
-# Extract DOIs
-dois = []
-for entry in data:
-    if "publication_url" in entry:
-        match = re.search(doi_pattern, entry["publication_url"], re.IGNORECASE)
-        if match:
-            dois.append(match.group())
 
-# Print the extracted DOIs
-print(dois)
+def extract_publication_info(content_html, external_links):
+    # Returns the publication line from the last 15 words of the post and its last external link
+    clean_text = TAG_PATTERN.sub('', tail_words(content_html))
+    last_external_link = external_links[-1] if external_links else {}
+    return extract_sentence(clean_text, "<p>", "<a href="), last_external_link
 
 
 def extract_sentence(text, start_str, end_str):
@@ -98,14 +80,24 @@ def extract_sentence(text, start_str, end_str):
 
     return publish_sentence
 
-# Save the extracted information to a file
-
-ouput_file = "urls_with_info.json"
-# Example usage
-json_file_path = "posts.json"
-extracted_info = load_and_extract(json_file_path)
-with open("urls_with_info.json", "w", encoding="utf-8") as output_file:
-    json.dump(extracted_info, output_file, indent=4)
-# Process or display the extracted information as needed
-for info in extracted_info:
-    print(info)
+if __name__ == "__main__":
+    # Extract DOIs with the same extractor as utils_httpx
+    dois = []
+    for entry in iter_records('posts.json'):
+        if "publication_url" in entry:
+            doi = extract_identifiers(entry["publication_url"]).get("doi")
+            if doi:
+                dois.append(doi)
+
+    # Print the extracted DOIs
+    print(dois)
+
+    # Save the extracted information to a file, one entry at a time
+    output_path = "urls_with_info.json"
+    # Example usage
+    json_file_path = "posts.json"
+    with RecordWriter(output_path) as output_file:
+        for info in iter_extracted(json_file_path):
+            output_file.write(info)
+            # Process or display the extracted information as needed
+            print(info)
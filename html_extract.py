@@ -0,0 +1,169 @@
+"""Single-pass extraction of cleaned text and external links from WordPress post HTML."""
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+from metrics import metrics
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # selectolax is optional
+    LexborHTMLParser = None
+
+try:
+    import lxml  # noqa: F401  (only needed as a BeautifulSoup tree builder)
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# Links containing any of these are not treated as external references
+EXCLUDED_LINK_PARTS = (
+    "facebook", "sciencealert", "twitter", "instagram", "pinterest", "linkedin",
+    ".jpeg", ".jpg", ".png", ".gif",
+)
+
+class PostExtraction(NamedTuple):
+    """Everything the exporters need from a post's HTML, produced by one parse."""
+    text: str
+    links: List[str]
+    last_link: str
+
+def available_backends() -> List[str]:
+    """Returns the installed parser backends, fastest first."""
+    backends = []
+    if LexborHTMLParser is not None:
+        backends.append("selectolax")
+    if HAS_LXML:
+        backends.append("lxml")
+    backends.append("html.parser")
+    return backends
+
+DEFAULT_BACKEND = available_backends()[0]
+
+def is_external_link(href: str, base_url: Optional[str]) -> bool:
+    """Checks whether a link points to an outside https resource we want to keep."""
+    if not href.startswith("https://"):
+        return False
+    if base_url and href.startswith(base_url):
+        return False
+    return not any(part in href for part in EXCLUDED_LINK_PARTS)
+
+def _parse_with_soup(html_content: str, parser: str):
+    soup = BeautifulSoup(html_content, parser)
+
+    # Remove ad divs, script and style tags, and other unwanted elements
+    for ad_div in soup.find_all("div", class_="ad-slot--container"):
+        ad_div.decompose()
+    for script in soup.find_all(["script", "style"]):
+        script.decompose()
+
+    hrefs = [a["href"] for a in soup.find_all("a", href=True)]
+    return soup.get_text(separator=" ", strip=True), hrefs
+
+def _parse_with_selectolax(html_content: str):
+    tree = LexborHTMLParser(html_content)
+    for node in tree.css("div.ad-slot--container, script, style"):
+        node.decompose()
+
+    hrefs = [a.attributes.get("href") or "" for a in tree.css("a[href]")]
+    root = tree.body or tree.root
+    if root is None:
+        return "", hrefs
+    # Join on a control character so empty text nodes can be dropped, matching BeautifulSoup's strip=True
+    pieces = root.text(separator="\x1f", strip=True).split("\x1f")
+    return " ".join(piece for piece in pieces if piece), hrefs
+
+def extract_post_html(html_content: str, base_url: Optional[str], backend: Optional[str] = None) -> PostExtraction:
+    """Parses post HTML once and returns its cleaned text, unique external links and last external link."""
+    backend = backend or DEFAULT_BACKEND
+    if not html_content:
+        return PostExtraction("", [], "")
+    start = time.perf_counter()
+    if backend == "selectolax":
+        text, hrefs = _parse_with_selectolax(html_content)
+    elif backend in ("lxml", "html.parser"):
+        text, hrefs = _parse_with_soup(html_content, backend)
+    else:
+        raise ValueError(f"Unknown HTML parser backend: {backend}")
+
+    external = [href for href in hrefs if is_external_link(href, base_url)]
+    # Keep the first occurrence of each link, in document order
+    links = list(dict.fromkeys(external))
+    metrics.observe("html_parse_seconds", time.perf_counter() - start, backend=backend)
+    return PostExtraction(text, links, external[-1] if external else "")
+
+_extraction_cache: Dict[Any, PostExtraction] = {}
+
+def extract_post(post: dict, backend: Optional[str] = None, use_cache: bool = True) -> PostExtraction:
+    """Extracts a raw WordPress post's content, reusing the cached result for its id."""
+    post_id = post.get("id")
+    if use_cache and post_id is not None and post_id in _extraction_cache:
+        return _extraction_cache[post_id]
+
+    extraction = extract_post_html(post.get("content", {}).get("rendered", ""), post.get("link"), backend)
+    if use_cache and post_id is not None:
+        _extraction_cache[post_id] = extraction
+    return extraction
+
+def clear_extraction_cache():
+    """Drops all cached extractions, e.g. once every exporter has run."""
+    _extraction_cache.clear()
+
+def cache_extractions(posts: List[dict], extractions: List[PostExtraction]):
+    """Stores extractions computed elsewhere (e.g. in worker processes) under their post ids."""
+    for post, extraction in zip(posts, extractions):
+        if post.get("id") is not None:
+            _extraction_cache[post["id"]] = extraction
+
+def extract_batch(items: List[Tuple[str, Optional[str]]], backend: Optional[str] = None) -> List[PostExtraction]:
+    """Extracts a batch of (html, base_url) pairs; runs inside pool worker processes."""
+    return [extract_post_html(html_content, base_url, backend) for html_content, base_url in items]
+
+def _extract_batch_timed(items: List[Tuple[str, Optional[str]]], backend: Optional[str] = None) -> Tuple[List[PostExtraction], List[float]]:
+    # Worker processes have their own metrics, so the parse times travel back with the results
+    extractions = []
+    seconds = []
+    for html_content, base_url in items:
+        start = time.perf_counter()
+        extractions.append(extract_post_html(html_content, base_url, backend))
+        if html_content:
+            seconds.append(time.perf_counter() - start)
+    return extractions, seconds
+
+class ExtractionPool:
+    """Sends batches of post HTML to worker processes so parsing does not stall the event loop."""
+
+    def __init__(self, workers: Optional[int] = None, batch_size: int = 20, backend: Optional[str] = None):
+        self.batch_size = max(1, batch_size)
+        self.backend = backend
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    async def extract(self, posts: List[dict]) -> List[PostExtraction]:
+        """Extracts the given posts in parallel batches; results are in the same order as posts."""
+        loop = asyncio.get_running_loop()
+        items = [(post.get("content", {}).get("rendered", ""), post.get("link")) for post in posts]
+        batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self.executor, _extract_batch_timed, batch, self.backend) for batch in batches)
+        )
+        backend = self.backend or DEFAULT_BACKEND
+        for _, seconds in results:
+            for value in seconds:
+                metrics.observe("html_parse_seconds", value, backend=backend)
+        return [extraction for extractions, _ in results for extraction in extractions]
+
+    async def prime(self, posts: List[dict]):
+        """Extracts posts in the pool and caches the results for extract_post."""
+        cache_extractions(posts, await self.extract(posts))
@@ -0,0 +1,98 @@
+import re
+from bisect import bisect_right
+from typing import Dict, Iterable, List
+from urllib.parse import unquote
+
+# One compiled pattern for every identifier we know, so each link is scanned once.
+# DOIs use Crossref's recommended character set, which keeps slashes inside the suffix.
+# Text is lowercased before matching, which is much cheaper than re.IGNORECASE, and no
+# alternative can cross a newline, so a batch of links can be scanned as one string.
+IDENTIFIER_PATTERN = re.compile(
+    # Cheap first-character check so the alternation is only tried where a match can start
+    r"(?=[1pna?&])(?:"
+    r"(?P<doi>10\.\d{4,9}/[-._;()/:a-z0-9]+)"
+    r"|(?:pubmed\.ncbi\.nlm\.nih\.gov/|ncbi\.nlm\.nih\.gov/pubmed/|[?&]pmid=|\bpmid:?[ \t]*)(?P<pmid>\d{1,9})\b"
+    r"|\b(?P<pmcid>pmc\d{3,9})\b"
+    r"|arxiv\.org/(?:abs|pdf)/(?P<arxiv>\d{4}\.\d{4,5}|[a-z][a-z.\-]*/\d{7})(?:v\d+)?"
+    r")"
+)
+# Every identifier contains one of these, so text without any of them is skipped without a regex scan
+IDENTIFIER_MARKERS = ("10.", "pubmed", "pmid", "pmc", "arxiv")
+
+DOI_PREFIXES = ("https://doi.org/", "http://doi.org/", "https://dx.doi.org/", "http://dx.doi.org/", "doi:")
+# Publisher URLs often put a view name after the DOI; it is not part of the identifier
+DOI_URL_SUFFIXES = ("/abstract", "/full", "/fulltext", "/pdf", "/epdf", "/html")
+TRAILING_PUNCTUATION = ".,;:'\""
+
+def normalize_doi(doi: str) -> str:
+    """Normalizes a DOI: no resolver prefix, lowercase, no trailing punctuation or viewer suffix."""
+    doi = doi.strip()
+    lowered = doi.lower()
+    for prefix in DOI_PREFIXES:
+        if lowered.startswith(prefix):
+            doi = doi[len(prefix):]
+            break
+    doi = doi.lower().rstrip(TRAILING_PUNCTUATION)
+    # Drop a closing parenthesis that is not part of a balanced pair, e.g. "(doi:10.1/x)"
+    while doi.endswith(")") and doi.count("(") < doi.count(")"):
+        doi = doi[:-1].rstrip(TRAILING_PUNCTUATION)
+    for suffix in DOI_URL_SUFFIXES:
+        if doi.endswith(suffix):
+            doi = doi[:-len(suffix)]
+            break
+    return doi
+
+def extract_identifiers(text: str) -> Dict[str, str]:
+    """Finds the first DOI, PMID, PMCID and arXiv id in a link or string, in a single scan.
+
+    Returns a dict with the keys that were found among 'doi', 'pmid', 'pmcid' and 'arxiv', all
+    normalized: DOIs as by normalize_doi, PMCIDs upper-case, arXiv ids without version.
+    """
+    if "%" in text:
+        text = unquote(text)
+    text = text.replace("\n", " ").lower()
+    found: Dict[str, str] = {}
+    if not any(marker in text for marker in IDENTIFIER_MARKERS):
+        return found
+    for match in IDENTIFIER_PATTERN.finditer(text):
+        _add_match(found, match)
+    return found
+
+def _add_match(found: Dict[str, str], match: re.Match):
+    kind = match.lastgroup
+    if kind in found:
+        return
+    value = match.group(kind)
+    if kind == "doi":
+        value = normalize_doi(value)
+        # arXiv's own DOIs carry the arXiv id as well
+        if value.startswith("10.48550/arxiv."):
+            found.setdefault("arxiv", value[len("10.48550/arxiv."):])
+    elif kind == "pmcid":
+        value = value.upper()
+    found[kind] = value
+
+def extract_identifiers_batch(links: Iterable[str]) -> List[Dict[str, str]]:
+    """Runs extract_identifiers over many links; non-string entries give an empty dict.
+
+    The links are joined and scanned as one string, so links without identifiers cost no
+    Python-level work at all.
+    """
+    texts = []
+    for link in links:
+        if not isinstance(link, str):
+            link = ""
+        elif "%" in link:
+            link = unquote(link)
+        texts.append(link.replace("\n", " "))
+
+    starts = []
+    position = 0
+    for text in texts:
+        starts.append(position)
+        position += len(text) + 1
+
+    results: List[Dict[str, str]] = [{} for _ in texts]
+    for match in IDENTIFIER_PATTERN.finditer("\n".join(texts).lower()):
+        _add_match(results[bisect_right(starts, match.start()) - 1], match)
+    return results
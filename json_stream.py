@@ -0,0 +1,138 @@
+import json
+import re
+from typing import Any, Iterator, Optional, TextIO, Union
+
+import serialization
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+
+def iter_records(file_path: str, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """Yields the records of a JSON file one at a time without loading the whole file.
+
+    .ndjson/.jsonl files hold one JSON value per line. Other files are read as a top-level JSON
+    array when their first character is '[' and as NDJSON otherwise. Memory use is bounded by
+    the largest single record.
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        if file_path.endswith(NDJSON_SUFFIXES):
+            yield from iter_ndjson(file)
+            return
+        buffer = file.read(chunk_size)
+        start = WHITESPACE.match(buffer).end()
+        while start == len(buffer):
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            buffer = chunk
+            start = WHITESPACE.match(buffer).end()
+        if buffer[start] == "[":
+            yield from iter_json_array(file, chunk_size, buffer[start + 1:])
+        else:
+            yield from iter_ndjson(file, buffer[start:])
+
+def iter_json_array(file: TextIO, chunk_size: int = 1 << 20, buffer: str = "") -> Iterator[Any]:
+    """Yields the elements of a JSON array from a file positioned just after its opening '['.
+
+    buffer holds text already read past the '['. Each element is decoded with raw_decode as soon
+    as it is complete; the read size doubles while a single element is larger than the buffer.
+    """
+    # The standard library's raw_decode is the only decoder that stops at the end of a value in a
+    # longer buffer, so array elements are decoded with it whatever serialization.backend is
+    decoder = json.JSONDecoder()
+    pos = 0
+    eof = False
+    expect_value = True
+    first = True
+    while True:
+        pos = WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer) or (expect_value and not eof and _may_be_partial(buffer, pos)):
+            if eof:
+                raise ValueError("Unexpected end of JSON array")
+            chunk = file.read(max(chunk_size, len(buffer) - pos))
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+
+        char = buffer[pos]
+        if char == "]":
+            if expect_value and not first:
+                raise ValueError("Trailing comma before ']' in JSON array")
+            return
+        if not expect_value:
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON array, found {char!r}")
+            pos += 1
+            expect_value = True
+            continue
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(max(chunk_size, len(buffer) - pos))
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+        yield record
+        pos = end
+        expect_value = False
+        first = False
+
+def _may_be_partial(buffer: str, pos: int) -> bool:
+    # A bare number or literal at the very end of the buffer may continue in the next chunk
+    return buffer[pos] not in "{[\"" and buffer.find(",", pos) == -1 and buffer.find("]", pos) == -1
+
+def iter_ndjson(file: TextIO, buffer: str = "") -> Iterator[Any]:
+    """Yields one record per non-empty line; buffer holds text already read from the file."""
+    lines = buffer.split("\n")
+    pending = lines.pop()
+    for line in lines:
+        if line.strip():
+            yield serialization.loads(line)
+    for line in file:
+        if pending:
+            line, pending = pending + line, ""
+        if line.strip():
+            yield serialization.loads(line)
+    if pending.strip():
+        yield serialization.loads(pending)
+
+class RecordWriter:
+    """Writes records one at a time as a JSON array, or as NDJSON for .ndjson/.jsonl paths.
+
+    Array output is laid out exactly like serialization.dumps(records, indent), so existing
+    readers of the files see no difference, but no list of all records is ever built. indent
+    "auto" follows serialization.indent, which --compact sets to None.
+    """
+
+    def __init__(self, file_path: str, indent: Union[int, None, str] = "auto"):
+        self.file_path = file_path
+        self.indent = serialization.indent if indent == "auto" else indent
+        self.ndjson = file_path.endswith(NDJSON_SUFFIXES)
+        self.records_written = 0
+        self.file: Optional[TextIO] = None
+
+    def __enter__(self):
+        self.file = open(self.file_path, "w", encoding="utf-8")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.ndjson:
+            if self.records_written == 0:
+                self.file.write("[]")
+            elif self.indent is None:
+                self.file.write("]")
+            else:
+                self.file.write("\n]")
+        self.file.close()
+
+    def write(self, record: Any):
+        if self.ndjson:
+            self.file.write(serialization.dumps(record) + "\n")
+        elif self.indent is None:
+            self.file.write(("[" if self.records_written == 0 else ",") + serialization.dumps(record))
+        else:
+            # Encoding the record inside a list gives its lines the indentation of an array element
+            text = serialization.dumps([record], self.indent)[2:-2]
+            self.file.write(("[\n" if self.records_written == 0 else ",\n") + text)
+        self.records_written += 1
@@ -0,0 +1,239 @@
+"""Run metrics: counters, latency histograms and optional trace spans, reported as text, JSON or Prometheus."""
+import asyncio
+import bisect
+import os
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+import serialization
+
+# Upper bounds in seconds, from HTML parses (sub-millisecond) to slow HTTP requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+class Histogram:
+    """Counts of observations per bucket plus their count and sum, like a Prometheus histogram."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation (the largest bound for +Inf)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + ("+Inf",), self.counts)},
+        }
+
+class Metrics:
+    """
+    Collects the measurements of one run. Counters and histograms are keyed by name and labels.
+    Spans are always summed into the span_duration_seconds histogram; with tracing on, each span is
+    also kept as a trace event that write_trace saves for chrome://tracing or Perfetto.
+    """
+
+    def __init__(self, tracing: bool = False):
+        self.tracing = tracing
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.trace_events: List[dict] = []
+        self.started = time.perf_counter()
+        self._task_ids: Dict[str, int] = {}
+
+    def reset(self, tracing: Optional[bool] = None):
+        """Drops everything recorded so far, e.g. between benchmark rounds."""
+        self.__init__(self.tracing if tracing is None else tracing)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        series = self.counters.setdefault(name, {})
+        key = label_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        series = self.histograms.setdefault(name, {})
+        key = label_key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    def counter(self, name: str, **labels) -> float:
+        return self.counters.get(name, {}).get(label_key(labels), 0)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observes the time spent in the block into the named histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def span(self, name: str, **args):
+        """Times a stage of the run; spans nest within a task and run side by side across tasks."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe("span_duration_seconds", seconds, span=name)
+            if self.tracing:
+                self.trace_events.append({
+                    "name": name, "ph": "X", "pid": os.getpid(), "tid": self._thread_id(),
+                    "ts": (start - self.started) * 1e6, "dur": seconds * 1e6, "args": args,
+                })
+
+    def _thread_id(self) -> int:
+        # Each asyncio task gets its own row in the trace viewer
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        name = task.get_name() if task is not None else "main"
+        return self._task_ids.setdefault(name, len(self._task_ids))
+
+    def record_cache(self, cache: str, hit: bool):
+        self.inc("cache_lookups_total", cache=cache, result="hit" if hit else "miss")
+
+    def trace_config(self, source: str) -> aiohttp.TraceConfig:
+        """
+        aiohttp hooks recording the status, time to response headers and body bytes of every request
+        a session sends over the network. Responses served by a client cache send nothing and are
+        not seen here; they are counted where the response is read (see record_cache).
+        """
+        config = aiohttp.TraceConfig(trace_config_ctx_factory=lambda trace_request_ctx: SimpleNamespace(start=0.0))
+
+        async def on_request_start(session, context, params):
+            context.start = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            self.inc("http_requests_total", source=source, status=params.response.status)
+            self.observe("http_request_duration_seconds", time.perf_counter() - context.start, source=source)
+
+        async def on_request_exception(session, context, params):
+            self.inc("http_requests_total", source=source, status=type(params.exception).__name__)
+
+        async def on_response_chunk_received(session, context, params):
+            self.inc("http_response_bytes_total", len(params.chunk), source=source)
+
+        config.on_request_start.append(on_request_start)
+        config.on_request_end.append(on_request_end)
+        config.on_request_exception.append(on_request_exception)
+        config.on_response_chunk_received.append(on_response_chunk_received)
+        return config
+
+    def to_dict(self) -> dict:
+        return {
+            "counters": {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self.counters.items()
+            },
+            "histograms": {
+                name: [{"labels": dict(key), **histogram.to_dict()} for key, histogram in series.items()]
+                for name, series in self.histograms.items()
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """Renders every series in the Prometheus text exposition format."""
+        def render(labels: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+            return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+        lines = []
+        for name, series in sorted(self.counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f"{name}{render(key)} {value:g}" for key, value in series.items())
+        for name, series in sorted(self.histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{render(key, (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{render(key)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{render(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Saves the metrics as Prometheus text for .prom and .txt paths, and as JSON otherwise."""
+        with open(path, "w", encoding="utf-8") as file:
+            if path.endswith((".prom", ".txt")):
+                file.write(self.to_prometheus())
+            else:
+                file.write(serialization.dumps(self.to_dict(), indent=2))
+
+    def write_trace(self, path: str):
+        """Saves the recorded spans in the Chrome trace event format."""
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(serialization.dumps({"traceEvents": self.trace_events, "displayTimeUnit": "ms"}))
+
+    def summary(self) -> str:
+        """A few lines on where the time went: requests, caches, revalidations, decoding, parsing and stages."""
+        lines = []
+        requests = self.counters.get("http_requests_total", {})
+        sources = sorted({dict(key)["source"] for key in requests})
+        for source in sources:
+            statuses = {dict(key)["status"]: value for key, value in requests.items() if dict(key)["source"] == source}
+            latency = self.histograms.get("http_request_duration_seconds", {}).get(label_key({"source": source}))
+            size = self.counter("http_response_bytes_total", source=source)
+            line = f"HTTP {source}: {sum(statuses.values()):g} requests ({', '.join(f'{status}: {count:g}' for status, count in sorted(statuses.items()))})"
+            if latency is not None and latency.count:
+                line += f", mean {latency.sum / latency.count * 1000:.0f} ms, p95 <= {latency.quantile(0.95) * 1000:g} ms"
+            lines.append(line + f", {size / 1_000_000:.2f} MB")
+
+        lookups = self.counters.get("cache_lookups_total", {})
+        for cache in sorted({dict(key)["cache"] for key in lookups}):
+            hits = self.counter("cache_lookups_total", cache=cache, result="hit")
+            misses = self.counter("cache_lookups_total", cache=cache, result="miss")
+            lines.append(f"Cache {cache}: {hits:g} hits, {misses:g} misses ({hits / max(1, hits + misses):.0%} hit ratio)")
+
+        revalidations = self.counters.get("http_revalidations_total", {})
+        for source in sorted({dict(key)["source"] for key in revalidations}):
+            unchanged = self.counter("http_revalidations_total", source=source, result="not_modified")
+            changed = self.counter("http_revalidations_total", source=source, result="modified")
+            lines.append(f"Revalidation {source}: {unchanged:g} not modified (304), {changed:g} modified")
+
+        for name, label, title in (("json_decode_seconds", "source", "JSON decode"),
+                                   ("html_parse_seconds", "backend", "HTML parse"),
+                                   ("span_duration_seconds", "span", "Stage")):
+            for key, histogram in sorted(self.histograms.get(name, {}).items()):
+                lines.append(
+                    f"{title} {dict(key)[label]}: {histogram.count} x, {histogram.sum:.3f}s total, "
+                    f"mean {histogram.sum / histogram.count * 1000:.2f} ms, p95 <= {histogram.quantile(0.95) * 1000:g} ms"
+                )
+        return "\n".join(lines) if lines else "nothing recorded"
+
+# Shared by the modules of one run, like the scraper's transfer_stats
+metrics = Metrics()
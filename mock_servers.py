@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+def make_openalex_work(doi: str) -> dict:
+    """Builds a deterministic OpenAlex-like work for a DOI."""
+    doi = doi.lower()
+    return make_openalex_work_by_number(int(hashlib.sha1(doi.encode()).hexdigest()[:8], 16), doi)
+
+def make_openalex_work_by_number(number: int, doi: Optional[str] = None) -> dict:
+    """Builds the work W{number}; it cites W{number + 1} and W{number + 2}, so W{number - 1} and W{number - 2} cite it."""
+    doi = doi or f"10.5555/w{number}"
+    return {
+        "id": f"https://openalex.org/W{number}",
+        "doi": f"https://doi.org/{doi}",
+        "display_name": f"Paper {doi}",
+        "publication_year": 2000 + number % 25,
+        "authorships": [{"author": {"display_name": f"Author {number % 997}"}}],
+        "host_venue": {"display_name": f"Journal {number % 31}"},
+        "biblio": {"first_page": "1", "last_page": "10", "volume": str(number % 50), "issue": str(number % 12)},
+        "referenced_works_count": 2,
+        "referenced_works": [f"https://openalex.org/W{number + 1}", f"https://openalex.org/W{number + 2}"],
+        "cited_by_api_url": f"https://api.openalex.org/works?filter=cites:W{number}",
+        "counts_by_year": [{"year": 2023, "cited_by_count": number % 7}],
+        "updated_date": "2024-01-01T00:00:00",
+        "created_date": "2020-01-01",
+    }
+
+class RequestWindow:
+    """Counts requests over the last second to answer those beyond `rate` per second with a 429."""
+
+    def __init__(self, rate: Optional[float], retry_after: float = 1.0):
+        self.rate = rate
+        self.retry_after = retry_after
+        self._recent = deque()
+
+    def throttle(self) -> Optional[web.Response]:
+        """Returns the 429 to send when over the rate, or None to serve the request."""
+        if self.rate is None:
+            return None
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1.0:
+            self._recent.popleft()
+        if len(self._recent) >= self.rate:
+            return web.Response(status=429, headers={"Retry-After": str(self.retry_after)})
+        self._recent.append(now)
+        return None
+
+class MockOpenAlex:
+    """Stand-in for the OpenAlex API serving /works/doi:{doi} and /works?filter=doi:a|b, openalex:W1|W2
+    or cites:W1|W2, the last with cursor paging.
+
+    DOIs for which `known` returns False answer 404 (or are missing from filter results).
+    With rate_limit set, requests beyond that many per second get a 429 with Retry-After.
+    """
+
+    def __init__(self, known: Optional[Callable[[str], bool]] = None, rate_limit: Optional[float] = None,
+                 retry_after: float = 1.0, latency: float = 0.0):
+        self.known = known or (lambda doi: True)
+        self.window = RequestWindow(rate_limit, retry_after)
+        self.latency = latency
+        self.stats = {"requests": 0, "rate_limited": 0}
+        self.app = web.Application()
+        self.app.router.add_get("/works/doi:{doi:.+}", self.work_by_doi)
+        self.app.router.add_get("/works", self.works)
+        self.app.router.add_get("/stats", self.stats_view)
+
+    async def stats_view(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    def _throttled(self) -> Optional[web.Response]:
+        self.stats["requests"] += 1
+        throttled = self.window.throttle()
+        if throttled is not None:
+            self.stats["rate_limited"] += 1
+        return throttled
+
+    async def work_by_doi(self, request: web.Request) -> web.Response:
+        throttled = self._throttled()
+        if throttled:
+            return throttled
+        await asyncio.sleep(self.latency)
+        doi = request.match_info["doi"]
+        if doi.lower().startswith("https://doi.org/"):
+            doi = doi[len("https://doi.org/"):]
+        if not self.known(doi):
+            return web.json_response({"error": "Not found"}, status=404)
+        return web.json_response(make_openalex_work(doi))
+
+    async def works(self, request: web.Request) -> web.Response:
+        throttled = self._throttled()
+        if throttled:
+            return throttled
+        await asyncio.sleep(self.latency)
+        filter_value = request.query.get("filter", "")
+        per_page = int(request.query.get("per-page", 25))
+        name, _, values = filter_value.partition(":")
+        values = [value for value in values.split("|") if value]
+        if name == "doi":
+            dois = [doi for doi in values if self.known(doi)]
+            results = [make_openalex_work(doi) for doi in dois[:per_page]]
+            return web.json_response({"meta": {"count": len(dois), "per_page": per_page}, "results": results})
+        if name == "openalex":
+            results = [make_openalex_work_by_number(int(value.upper().lstrip("W"))) for value in values[:per_page]]
+            return web.json_response({"meta": {"count": len(values), "per_page": per_page}, "results": results})
+        if name == "cites":
+            cited = {int(value.upper().lstrip("W")) for value in values}
+            citing = sorted({number - step for number in cited for step in (1, 2)})
+            start = int(request.query.get("cursor", "*").replace("*", "0"))
+            page = citing[start:start + per_page]
+            next_cursor = str(start + per_page) if start + per_page < len(citing) else None
+            return web.json_response({
+                "meta": {"count": len(citing), "per_page": per_page, "next_cursor": next_cursor},
+                "results": [make_openalex_work_by_number(number) for number in page],
+            })
+        return web.json_response({"error": f"Unsupported filter {filter_value}"}, status=400)
+
+class MockIdConverter:
+    """Stand-in for the NCBI ID Converter API serving /?ids=a,b&idtype=pmid&format=json at the server root.
+
+    PMID n and PMCn are the same article, with the DOI 10.5555/pmid.n; ids for which `known`
+    returns False, and ids that are not numbers, get error records. More than 200 ids, or ids
+    of another type than idtype (or of mixed types without one), answer 400.
+    """
+
+    def __init__(self, known: Optional[Callable[[str], bool]] = None, rate_limit: Optional[float] = None,
+                 retry_after: float = 1.0, latency: float = 0.0):
+        self.known = known or (lambda article_id: True)
+        self.window = RequestWindow(rate_limit, retry_after)
+        self.latency = latency
+        self.stats = {"requests": 0, "rate_limited": 0, "ids": 0, "mixed_idtypes": 0}
+        self.app = web.Application()
+        self.app.router.add_get("/", self.articles)
+        self.app.router.add_get("/stats", self.stats_view)
+
+    async def stats_view(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    def _record(self, requested: str) -> dict:
+        number = requested.upper()[3:] if requested.upper().startswith("PMC") else requested
+        if not number.isdigit() or not self.known(requested):
+            return {"requested-id": requested, "status": "error", "errmsg": "invalid article id"}
+        number = str(int(number))
+        return {"requested-id": requested, "pmcid": f"PMC{number}", "pmid": number, "doi": f"10.5555/pmid.{number}"}
+
+    async def articles(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        throttled = self.window.throttle()
+        if throttled is not None:
+            self.stats["rate_limited"] += 1
+            return throttled
+        await asyncio.sleep(self.latency)
+        ids = [value.strip() for value in request.query.get("ids", "").split(",") if value.strip()]
+        if not ids or len(ids) > 200:
+            return web.json_response({"status": "error", "message": "Between 1 and 200 ids are required"}, status=400)
+        idtypes = {"pmcid" if value.upper().startswith("PMC") else "pmid" for value in ids}
+        idtype = request.query.get("idtype")
+        if len(idtypes) > 1 or (idtype and idtypes != {idtype}):
+            self.stats["mixed_idtypes"] += 1
+            return web.json_response({"status": "error", "message": "All ids must be of the same idtype"}, status=400)
+        self.stats["ids"] += len(ids)
+        return web.json_response({"status": "ok", "records": [self._record(value) for value in ids]})
+
+# Filler paragraph for padding post bodies, with a link that is not a paper
+FILLER = (
+    "<p>Scientists have long debated the question, and the new data add to a growing body of "
+    "evidence <a href=\"https://www.example.org/background\">reviewed earlier</a>.</p>"
+)
+
+def make_wordpress_post(post_id: int, body_size: int = 0) -> dict:
+    """Builds a deterministic WordPress REST API post, padded with filler to about body_size bytes of content."""
+    padding = FILLER * max(0, -(-(body_size - 200) // len(FILLER)))
+    # Every fifth post cites its study by PubMed id only, to be converted to a DOI
+    citation = f"https://pubmed.ncbi.nlm.nih.gov/{post_id}/" if post_id % 5 == 0 else f"https://doi.org/10.1000/{post_id}"
+    return {
+        "id": post_id,
+        "link": f"https://blog.example.com/{post_id}/",
+        "date_gmt": f"2023-{post_id % 12 + 1:02d}-01T00:00:00",
+        "modified_gmt": f"2024-{post_id % 12 + 1:02d}-01T00:00:00",
+        "title": {"rendered": f"Post {post_id}"},
+        "content": {"rendered": (
+            f"<p>Researchers report finding {post_id}.</p>{padding}"
+            f"<p>The study was published in <a href=\"{citation}\">a journal</a>.</p>"
+        )},
+        "excerpt": {"rendered": f"<p>Finding {post_id}</p>"},
+    }
+
+def make_wordpress_comment(comment_id: int, comments_per_post: int) -> dict:
+    """Builds a deterministic comment; every third one replies to the comment before it on the same post."""
+    position = (comment_id - 1) % comments_per_post
+    return {
+        "id": comment_id,
+        "post": (comment_id - 1) // comments_per_post + 1,
+        "parent": comment_id - 1 if position and position % 3 == 0 else 0,
+        "author_name": f"Reader {comment_id % 89}",
+        "date_gmt": f"2024-01-01T00:{position // 60 % 60:02d}:{position % 60:02d}",
+        "content": {"rendered": f"<p>Comment {comment_id} on the study.</p>"},
+    }
+
+def make_wordpress_item(kind: str, item_id: int) -> dict:
+    """Builds a minimal page, media item, category, tag or user."""
+    return {"id": item_id, "name": f"{kind} {item_id}", "link": f"https://blog.example.com/{kind}/{item_id}/"}
+
+class MockWordPress:
+    """Stand-in for a WordPress site serving /wp-json/ and the wp/v2 collections with paging headers.
+
+    Posts are served with comments_per_post comments each, and pages, media, categories, tags
+    and users with `items` entries each.
+
+    At most `capacity` requests are served at a time; more concurrent requests are answered with
+    `overload_status` (503 or 429) straight away, with a Retry-After header when retry_after is
+    set. Latency grows as the server fills up. capacity can be changed while the server runs.
+    With rate_limit set, requests beyond that many per second get a 429 with Retry-After.
+    Post content is padded to about body_size bytes. With etag on, list pages carry an ETag and a
+    matching If-None-Match is answered with 304 Not Modified.
+    """
+
+    def __init__(self, posts: int = 1000, capacity: Optional[int] = None, latency: float = 0.02,
+                 overload_status: int = 503, retry_after: Optional[float] = None,
+                 rate_limit: Optional[float] = None, body_size: int = 0, comments_per_post: int = 0, items: int = 0,
+                 etag: bool = True):
+        self.posts = posts
+        self.etag = etag
+        self.comments_per_post = comments_per_post
+        self.items = items
+        self.capacity = capacity
+        self.latency = latency
+        self.overload_status = overload_status
+        self.retry_after = retry_after
+        self.window = RequestWindow(rate_limit, retry_after if retry_after is not None else 1.0)
+        self.body_size = body_size
+        self.in_flight = 0
+        self.stats = {"requests": 0, "overloaded": 0, "rate_limited": 0, "max_in_flight": 0, "not_modified": 0}
+        self.app = web.Application()
+        self.app.router.add_get("/wp-json", self.index)
+        self.app.router.add_get("/wp-json/", self.index)
+        for kind in ("posts", "comments", "pages", "media", "categories", "tags", "users"):
+            self.app.router.add_get(f"/wp-json/wp/v2/{kind}", self.listing(kind))
+        self.app.router.add_get("/stats", self.stats_view)
+
+    async def index(self, request: web.Request) -> web.Response:
+        return web.json_response({"name": "Mock WordPress", "namespaces": ["wp/v2"]})
+
+    async def stats_view(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    def _total(self, kind: str) -> int:
+        if kind == "posts":
+            return self.posts
+        if kind == "comments":
+            return self.posts * self.comments_per_post
+        return self.items
+
+    def _item(self, kind: str, item_id: int) -> dict:
+        if kind == "posts":
+            return make_wordpress_post(item_id, self.body_size)
+        if kind == "comments":
+            return make_wordpress_comment(item_id, self.comments_per_post)
+        return make_wordpress_item(kind, item_id)
+
+    def listing(self, kind: str) -> Callable:
+        async def handler(request: web.Request) -> web.Response:
+            return await self.list_collection(kind, request)
+        return handler
+
+    async def list_collection(self, kind: str, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        throttled = self.window.throttle()
+        if throttled is not None:
+            self.stats["rate_limited"] += 1
+            return throttled
+        if self.capacity is not None and self.in_flight >= self.capacity:
+            self.stats["overloaded"] += 1
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else None
+            return web.json_response({"code": "overloaded"}, status=self.overload_status, headers=headers)
+
+        self.in_flight += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+        try:
+            load = self.in_flight / self.capacity if self.capacity else 0.0
+            await asyncio.sleep(self.latency * (1 + load))
+        finally:
+            self.in_flight -= 1
+
+        page = int(request.query.get("page", 1))
+        per_page = min(int(request.query.get("per_page", 10)), 100)
+        total = self._total(kind)
+        total_pages = max(1, -(-total // per_page))
+        if page > total_pages:
+            return web.json_response({"code": "rest_post_invalid_page_number"}, status=400)
+        # Newest first, like WordPress
+        ids = range(total - (page - 1) * per_page, max(0, total - page * per_page), -1)
+        items = [self._item(kind, item_id) for item_id in ids]
+        if "_fields" in request.query:
+            fields = request.query["_fields"].split(",")
+            items = [{key: value for key, value in item.items() if key in fields} for item in items]
+        headers = {"X-WP-Total": str(total), "X-WP-TotalPages": str(total_pages)}
+        body = json.dumps(items)
+        if self.etag:
+            headers["ETag"] = f'"{hashlib.md5(body.encode()).hexdigest()}"'
+            if request.headers.get("If-None-Match") == headers["ETag"]:
+                self.stats["not_modified"] += 1
+                return web.Response(status=304, headers=headers)
+        return web.Response(text=body, content_type="application/json", headers=headers)
+
+async def start_server(app: web.Application, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+    """Starts an app in the running event loop; port 0 picks a free port (see server_url)."""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+def server_url(runner: web.AppRunner) -> str:
+    """Returns the base URL a started server listens on."""
+    host, port = runner.addresses[0][:2]
+    return f"http://{host}:{port}"
+
+async def serve_forever(app: web.Application, host: str, port: int):
+    runner = await start_server(app, host, port)
+    logger.info(f"Serving on {server_url(runner)}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Run a local stand-in API server.")
+    parser.add_argument("server", choices=["openalex", "idconv", "wordpress"])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second before answering 429.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument("--posts", type=int, default=1000, help="WordPress: number of posts served.")
+    parser.add_argument("--capacity", type=int, default=None, help="WordPress: concurrent requests served before answering 503.")
+    parser.add_argument("--body-size", type=int, default=0, help="WordPress: approximate bytes of content per post.")
+    parser.add_argument("--comments-per-post", type=int, default=0, help="WordPress: comments served per post.")
+    parser.add_argument("--items", type=int, default=0, help="WordPress: pages, media, categories, tags and users served of each.")
+    parser.add_argument("--no-etag", action="store_true", help="WordPress: send no ETag and never answer 304.")
+    args = parser.parse_args()
+    if args.server == "openalex":
+        server = MockOpenAlex(rate_limit=args.rate_limit, latency=args.latency)
+    elif args.server == "idconv":
+        server = MockIdConverter(rate_limit=args.rate_limit, latency=args.latency)
+    else:
+        server = MockWordPress(posts=args.posts, capacity=args.capacity, latency=args.latency,
+                               rate_limit=args.rate_limit, body_size=args.body_size,
+                               comments_per_post=args.comments_per_post, items=args.items, etag=not args.no_etag)
+    asyncio.run(serve_forever(server.app, "127.0.0.1", args.port))
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from api_client import AsyncJSONClient, RequestError
+from identifiers import normalize_doi
+
+logger = logging.getLogger(__name__)
+
+# Base URL of the OpenAlex API, overridable e.g. to point at a local stand-in server
+OPENALEX_API = "https://api.openalex.org"
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:102.0) Gecko/20100101 Firefox/102.0"
+}
+
+def extract_paper_metadata(metadata):
+    """
+    Extract the fields we keep from an OpenAlex work object.
+    """
+    doi = metadata.get("doi", None)
+    if doi:
+        doi = doi[len("https://doi.org/"):]
+
+    # Return metadata, including cited_by_api_url, counts_by_year, updated_date, created_date
+    return {
+        "openalex_id": metadata.get("id","No Id"),
+        "title": metadata.get("display_name", "No Title Available"),
+        "first_author": metadata["authorships"][0]["author"]["display_name"] if metadata.get("authorships") else "No Author",
+        "authors": ", ".join([author["author"]["display_name"] for author in metadata.get("authorships", [])]),
+        "year": metadata.get("publication_year", "Unknown Year"),
+        "doi": doi,
+        "journal": metadata.get("host_venue", {}).get("display_name", "Unknown Journal"),
+        "pages": f"{metadata['biblio'].get('first_page', '')}-{metadata['biblio'].get('last_page', '')}",
+        "volume": metadata["biblio"].get("volume", ""),
+        "number": metadata["biblio"].get("issue", ""),
+        "referenced_works_count": metadata.get("referenced_works_count", 0),  # Get referenced works count
+        "referenced_works": metadata.get("referenced_works", []),  # Get list of referenced works
+        "cited_by_api_url": metadata.get("cited_by_api_url", ""),  # Get cited_by_api_url
+        "counts_by_year": metadata.get("counts_by_year", []),  # Get counts by year
+        "updated_date": metadata.get("updated_date", ""),  # Get updated date
+        "created_date": metadata.get("created_date", ""),  # Get created date
+        "queried_indexes": []  # This will store the indices of articles querying the same DOI or author
+    }
+
+def short_openalex_id(work_id: str) -> str:
+    """
+    Reduce an OpenAlex work id or URL (https://openalex.org/W123) to its short form (W123).
+    """
+    return work_id.rstrip("/").rsplit("/", 1)[-1].upper() if work_id else ""
+
+class AsyncOpenAlexClient(AsyncJSONClient):
+    """
+    Asyncio OpenAlex client: an AsyncJSONClient for the OpenAlex API, resolving DOIs in
+    concurrent filter=doi: batches and following citations by work id.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, requests_per_second: float = 10, concurrency: int = 10,
+                 max_retries: int = 5, backoff: float = 1.0, timeout: float = 30):
+        super().__init__(base_url or OPENALEX_API, requests_per_second=requests_per_second, concurrency=concurrency,
+                         max_retries=max_retries, backoff=backoff, timeout=timeout, source="openalex", headers=HEADERS)
+
+    async def get_paper_metadata(self, doi: str) -> Optional[dict]:
+        """
+        Fetch the metadata of one paper by DOI.
+        """
+        try:
+            metadata = await self.get_json(f"works/doi:{doi.replace('https://doi.org/', '')}")
+        except RequestError as e:
+            logger.error(f"Error fetching metadata for {doi}: {e}")
+            return None
+        return extract_paper_metadata(metadata) if metadata else None
+
+    async def get_papers_metadata_batch(self, dois: List[str], batch_size: int = 50,
+                                        display_progress: bool = True) -> Tuple[Dict[str, dict], List[str], List[str]]:
+        """
+        Fetch metadata for many DOIs with filter=doi:a|b|c, running the batches concurrently.
+        Returns a dict mapping each requested DOI string to its metadata, the DOIs OpenAlex does
+        not know, and the DOIs whose requests failed even after retrying.
+        """
+        found: Dict[str, dict] = {}
+        not_found: List[str] = []
+        failed: List[str] = []
+
+        # Group the requested strings by normalized DOI; different spellings share one lookup
+        requested: Dict[str, List[str]] = {}
+        for doi in dois:
+            requested.setdefault(normalize_doi(doi), []).append(doi)
+
+        # Commas and pipes are filter syntax in OpenAlex, so those DOIs are looked up one by one
+        batchable = [doi for doi in requested if doi and "," not in doi and "|" not in doi]
+        singles = [doi for doi in requested if doi not in batchable]
+        batches = [batchable[i:i + batch_size] for i in range(0, len(batchable), batch_size)]
+
+        with tqdm(total=len(batches) + len(singles), desc="Querying OpenAlex", disable=not display_progress) as pbar:
+            async def resolve_batch(batch: List[str]):
+                try:
+                    data = await self.get_json("works", {"filter": f"doi:{'|'.join(batch)}", "per-page": batch_size})
+                except RequestError as e:
+                    logger.error(f"Error fetching metadata for a batch of {len(batch)} DOIs: {e}")
+                    data = None
+                pbar.update(1)
+                if data is None:
+                    for doi in batch:
+                        failed.extend(requested[doi])
+                    return
+                works = {normalize_doi(work["doi"]): work for work in data.get("results", []) if work.get("doi")}
+                for doi in batch:
+                    if doi in works:
+                        for original in requested[doi]:
+                            found[original] = extract_paper_metadata(works[doi])
+                    else:
+                        not_found.extend(requested[doi])
+
+            async def resolve_single(doi: str):
+                try:
+                    metadata = await self.get_json(f"works/doi:{doi}") if doi else None
+                except RequestError as e:
+                    logger.error(f"Error fetching metadata for {doi}: {e}")
+                    failed.extend(requested[doi])
+                    return
+                finally:
+                    pbar.update(1)
+                for original in requested[doi]:
+                    if metadata:
+                        found[original] = extract_paper_metadata(metadata)
+                    else:
+                        not_found.append(original)
+
+            await asyncio.gather(*(resolve_batch(batch) for batch in batches), *(resolve_single(doi) for doi in singles))
+
+        return found, not_found, failed
+
+    async def get_works_by_ids(self, ids: List[str], batch_size: int = 50) -> Tuple[Dict[str, dict], List[str]]:
+        """
+        Fetch whole work objects by OpenAlex id with filter=openalex:W1|W2, running the batches concurrently.
+        Returns the works keyed by short id (e.g. 'W2741809807') and the ids whose requests failed.
+        """
+        works: Dict[str, dict] = {}
+        failed: List[str] = []
+
+        async def fetch_batch(batch: List[str]):
+            try:
+                data = await self.get_json("works", {"filter": f"openalex:{'|'.join(batch)}", "per-page": batch_size})
+            except RequestError as e:
+                logger.error(f"Error fetching a batch of {len(batch)} works: {e}")
+                failed.extend(batch)
+                return
+            for work in (data or {}).get("results", []):
+                works[short_openalex_id(work.get("id", ""))] = work
+
+        batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+        await asyncio.gather(*(fetch_batch(batch) for batch in batches))
+        return works, failed
+
+    async def get_citing_works(self, ids: List[str], max_results: Optional[int] = 200, per_page: int = 200) -> Optional[List[dict]]:
+        """
+        Fetch the works citing any of ids with filter=cites:W1|W2, following cursor pages until
+        max_results works (None = all). Returns None if a request failed.
+        """
+        results: List[dict] = []
+        cursor = "*"
+        while cursor and (max_results is None or len(results) < max_results):
+            try:
+                data = await self.get_json("works", {"filter": f"cites:{'|'.join(ids)}", "per-page": per_page, "cursor": cursor})
+            except RequestError as e:
+                logger.error(f"Error fetching the works citing a batch of {len(ids)} works: {e}")
+                return None
+            if not data or not data.get("results"):
+                break
+            results.extend(data["results"])
+            cursor = data.get("meta", {}).get("next_cursor")
+        return results if max_results is None else results[:max_results]
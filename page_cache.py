@@ -0,0 +1,138 @@
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, NamedTuple, Optional
+
+from multidict import CIMultiDict
+
+import serialization
+
+# Response headers kept with a page; the paging totals are needed again when it comes back as a 304
+KEPT_HEADERS = ("ETag", "Last-Modified", "Content-Type", "X-WP-Total", "X-WP-TotalPages")
+
+class CachedPage(NamedTuple):
+    """A stored response body with the validators to revalidate it."""
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    body: bytes
+    headers: Dict[str, str]
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since headers that let the server answer 304 when the page is unchanged."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def response_headers(self, not_modified_headers: Optional[Mapping[str, str]] = None) -> CIMultiDict:
+        """The stored headers, updated with any validators the 304 reply carried."""
+        headers = CIMultiDict(self.headers)
+        for name in ("ETag", "Last-Modified"):
+            if not_modified_headers and name in not_modified_headers:
+                headers[name] = not_modified_headers[name]
+        return headers
+
+class PageCache:
+    """
+    Persistent store of REST list pages with their ETag / Last-Modified validators.
+    Unlike an expiring cache, a stored page is kept for `max_age` seconds (30 days by default)
+    and revalidated on every use, so a page that did not change costs a 304 instead of a full
+    download. Pages without either validator cannot be revalidated and are not stored. The
+    decoded JSON of the last `memo_size` pages is kept in memory, so an unchanged body seen
+    again in the same run is not decoded twice. Only the body is persisted: on a later run the
+    first 304 for a page still decodes its stored body, saving the download but not the decode.
+    """
+
+    def __init__(self, path: str = "page_cache.db", max_age: Optional[float] = 30 * 24 * 3600, memo_size: int = 256):
+        self.path = path
+        self.max_age = max_age
+        self.memo_size = memo_size
+        self._memo: "OrderedDict[tuple, Any]" = OrderedDict()
+        self.stats = {"not_modified": 0, "modified": 0, "stored": 0, "decodes_skipped": 0}
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                checked_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_checked_at ON pages (checked_at);
+            """
+        )
+        if max_age is not None:
+            with self.conn:
+                self.conn.execute("DELETE FROM pages WHERE checked_at < ?", (time.time() - max_age,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def lookup(self, url: str) -> Optional[CachedPage]:
+        row = self.conn.execute(
+            "SELECT etag, last_modified, body, headers FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, body, headers = row
+        return CachedPage(url, etag, last_modified, body, serialization.loads(headers))
+
+    def store(self, url: str, headers: Mapping[str, str], body: bytes) -> Optional[CachedPage]:
+        """Saves a 200 response; returns None when it has no validator to revalidate it with."""
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return None
+        kept = {name: headers[name] for name in KEPT_HEADERS if name in headers}
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, headers, body, checked_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, serialization.dumps(kept), body, time.time()),
+            )
+        self.stats["stored"] += 1
+        return CachedPage(url, etag, last_modified, body, kept)
+
+    def modified(self):
+        """Records a full answer to a revalidation; store then replaces the page."""
+        self.stats["modified"] += 1
+
+    def not_modified(self, page: CachedPage):
+        """Records a 304 for a stored page, which restarts its max_age."""
+        self.stats["not_modified"] += 1
+        with self.conn:
+            self.conn.execute("UPDATE pages SET checked_at = ? WHERE url = ?", (time.time(), page.url))
+
+    def decoded(self, page: CachedPage) -> Optional[Any]:
+        """Returns the JSON already decoded from this exact body in this process, if any; the memo is not persisted."""
+        key = (page.url, page.etag, page.last_modified)
+        if key not in self._memo:
+            return None
+        self._memo.move_to_end(key)
+        self.stats["decodes_skipped"] += 1
+        return self._memo[key]
+
+    def remember(self, page: CachedPage, value: Any):
+        key = (page.url, page.etag, page.last_modified)
+        self._memo[key] = value
+        self._memo.move_to_end(key)
+        while len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+    def summary(self) -> str:
+        checked = self.stats["not_modified"] + self.stats["modified"]
+        return (
+            f"{self.stats['not_modified']} of {checked} revalidated pages unchanged (304), "
+            f"{self.stats['stored']} pages stored, {self.stats['decodes_skipped']} decodes skipped"
+        )
@@ -0,0 +1,288 @@
+import argparse
+import asyncio
+import logging
+from contextlib import nullcontext
+from itertools import islice
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiohttp_client_cache import CachedSession, SQLiteBackend
+
+import wordpress_site_scraper as scraper
+from corpus_store import CorpusStore
+from crawl_state import site_key
+from doi_cache import MetadataStore
+from filter_posts import extract_publication_info
+from html_extract import ExtractionPool, extract_post
+from json_stream import RecordWriter, iter_records
+from metrics import metrics
+from openalex_client import AsyncOpenAlexClient
+from pmid_resolver import AsyncIdConverter, IdMapStore, PubMedResolver
+from query_doi import process_articles_async
+import serialization
+from utils_httpx import tag_entry
+
+logger = logging.getLogger(__name__)
+
+# Stages in the order records flow through them; a run uses a contiguous range of them
+STAGES = ("crawl", "extract", "identifiers", "enrich")
+
+# A queue carries batches of records (one crawled page at a time) and then None once its producer is done
+Batch = List[dict]
+
+def extract_record(post: dict, index: int, extraction) -> dict:
+    """Builds the filtered entry of one raw WordPress post, shaped like the urls_with_info.json records."""
+    date_gmt = post.get("date_gmt", "")
+    modified_gmt = post.get("modified_gmt", "")
+    external_links = [{"href": href} for href in extraction.links]
+    publication_line, _ = extract_publication_info(post.get("content", {}).get("rendered", ""), external_links)
+    return {
+        "index": index,
+        "id": post.get("id"),
+        "title": post.get("title", {}).get("rendered", ""),
+        "date_gmt": date_gmt,
+        "modified_gmt": "not modified" if modified_gmt == date_gmt else f"the article was modified on {modified_gmt}",
+        "url": post.get("link", ""),
+        "publication_line": publication_line,
+        "publication_url": extraction.last_link,
+        "external_links": external_links,
+    }
+
+class Pipeline:
+    """
+    Runs crawl -> extract -> identifiers -> enrich as concurrent stages joined by bounded queues,
+    so the first posts are being enriched while later pages are still downloading.
+    The crawl, extract and identifiers stages can each write their records to a JSON or NDJSON file
+    (see RecordWriter), and a run can start from such a file instead of crawling. Enrichment fills
+    processed_papers and streams the links OpenAlex does not know to no_match_writer; with a
+    PubMedResolver, links with only a PMID or PMCID are converted to DOIs and enriched too. With a
+    corpus store, extracted posts are written to it one batch per transaction as they pass.
+    """
+
+    def __init__(self, first: str = "crawl", last: str = "enrich", queue_size: int = 4,
+                 outputs: Optional[Dict[str, str]] = None, extraction_pool: Optional[ExtractionPool] = None,
+                 client: Optional[AsyncOpenAlexClient] = None, store: Optional[MetadataStore] = None,
+                 no_match_writer: Optional[RecordWriter] = None, corpus: Optional[CorpusStore] = None,
+                 resolver: Optional[PubMedResolver] = None):
+        if STAGES.index(first) > STAGES.index(last):
+            raise ValueError(f"Stage {first} comes after {last}")
+        self.stages = STAGES[STAGES.index(first):STAGES.index(last) + 1]
+        self.queue_size = queue_size
+        self.outputs = outputs or {}
+        self.extraction_pool = extraction_pool
+        self.client = client
+        self.store = store
+        self.resolver = resolver
+        self.processed_papers: Dict[str, dict] = {}
+        self.no_match_writer = no_match_writer
+        self.no_match_count = 0
+        self.corpus = corpus
+        self.site = ""
+        self.counts = {stage: 0 for stage in self.stages}
+        self.crawl_result: Optional[scraper.CrawlResult] = None
+
+    async def extract(self, posts: Batch) -> Batch:
+        if self.extraction_pool is not None:
+            extractions = await self.extraction_pool.extract(posts)
+        else:
+            extractions = [extract_post(post, use_cache=False) for post in posts]
+        return [extract_record(post, post["index"], extraction) for post, extraction in zip(posts, extractions)]
+
+    async def identifiers(self, entries: Batch) -> Batch:
+        return [tag_entry(entry) for entry in entries]
+
+    async def enrich(self, entries: Batch) -> Batch:
+        no_match_articles: List[dict] = []
+        await process_articles_async(
+            self.client, entries, self.processed_papers, no_match_articles,
+            "external_links", "href", "doi", "doi", store=self.store, resolver=self.resolver,
+        )
+        self.no_match_count += len(no_match_articles)
+        if self.no_match_writer is not None:
+            for article in no_match_articles:
+                self.no_match_writer.write(article)
+        return entries
+
+    async def _run_stage(self, stage: str, process: Callable[[Batch], Awaitable[Batch]],
+                         inbox: asyncio.Queue, outbox: Optional[asyncio.Queue], writer: Optional[RecordWriter]):
+        while True:
+            batch = await inbox.get()
+            if batch is None:
+                break
+            # Take whatever else is already waiting, so a stage that fell behind catches up in larger batches
+            while not inbox.empty() and len(batch) < 1000:
+                more = inbox.get_nowait()
+                if more is None:
+                    inbox.put_nowait(None)
+                    break
+                batch = batch + more
+            with metrics.span(stage, records=len(batch)):
+                batch = await process(batch)
+            self.counts[stage] += len(batch)
+            if stage == "extract" and self.corpus is not None:
+                self.corpus.add_posts(batch, self.site)
+            if writer is not None:
+                for record in batch:
+                    writer.write(record)
+            if outbox is not None:
+                await outbox.put(batch)
+        if outbox is not None:
+            await outbox.put(None)
+
+    async def _feed_crawl(self, session, base_url: str, outbox: Optional[asyncio.Queue], writer: Optional[RecordWriter],
+                          per_page: int, concurrency: int):
+        async def on_page(page: int, posts: List[Any]):
+            posts = [dict(post, index=(page - 1) * per_page + i + 1) for i, post in enumerate(posts)]
+            self.counts["crawl"] += len(posts)
+            if writer is not None:
+                for post in posts:
+                    writer.write(post)
+            # Waits while the next stage is behind, which holds back further page downloads
+            if outbox is not None:
+                await outbox.put(posts)
+
+        try:
+            with metrics.span("crawl"):
+                self.crawl_result = await scraper.crawl_all_pages(
+                    session, base_url, "wp/v2/posts", per_page=per_page, concurrency=concurrency,
+                    on_page=on_page, keep_entries=False, params=scraper.post_params(),
+                )
+        finally:
+            if outbox is not None:
+                await outbox.put(None)
+
+    async def _feed_file(self, input_path: str, outbox: asyncio.Queue, batch_size: int = 100):
+        # Records read from a file keep their own index; unnumbered ones are numbered in file order
+        records = iter_records(input_path)
+        index = 0
+        try:
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                for record in batch:
+                    index += 1
+                    record.setdefault("index", index)
+                # Records that were extracted in an earlier run go to the corpus as they are read
+                if self.corpus is not None and self.stages[0] != "extract":
+                    self.corpus.add_posts(batch, self.site)
+                await outbox.put(batch)
+        finally:
+            await outbox.put(None)
+
+    async def run(self, session=None, base_url: Optional[str] = None, input_path: Optional[str] = None,
+                  per_page: int = 100, concurrency: int = 10):
+        """
+        Runs the pipeline from a crawl of base_url (when the first stage is crawl) or from the
+        records in input_path, and waits until the last stage has handled every record.
+        """
+        self.site = site_key(base_url) if base_url else ""
+        processing = [stage for stage in self.stages if stage != "crawl"]
+        # queues[i] feeds processing[i]; the last stage has no outbox
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in processing]
+        writers = {stage: RecordWriter(path) for stage, path in self.outputs.items() if stage in self.stages}
+        for writer in writers.values():
+            writer.__enter__()
+        try:
+            first_queue = queues[0] if queues else None
+            if self.stages[0] == "crawl":
+                feed = self._feed_crawl(session, base_url, first_queue, writers.get("crawl"), per_page, concurrency)
+            else:
+                feed = self._feed_file(input_path, first_queue)
+            tasks = [asyncio.create_task(feed)]
+            for position, stage in enumerate(processing):
+                outbox = queues[position + 1] if position + 1 < len(queues) else None
+                tasks.append(asyncio.create_task(
+                    self._run_stage(stage, getattr(self, stage), queues[position], outbox, writers.get(stage))
+                ))
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+        finally:
+            for writer in writers.values():
+                writer.__exit__(None, None, None)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parses the stage range, per-stage outputs and tuning options of a pipeline run."""
+    parser = argparse.ArgumentParser(
+        description="Crawl a WordPress site, extract links, tag identifiers and enrich them with OpenAlex in one streaming run."
+    )
+    parser.add_argument("base_url", nargs="?", help="WordPress site to crawl (needed when starting with the crawl stage).")
+    parser.add_argument("--from", dest="first", choices=STAGES, default="crawl", help="First stage to run.")
+    parser.add_argument("--to", dest="last", choices=STAGES, default="enrich", help="Last stage to run.")
+    parser.add_argument("--input", help="Records to start from when the first stage is not crawl.")
+    for stage in STAGES[:-1]:
+        parser.add_argument(f"--{stage}-out", metavar="PATH", help=f"Write the records produced by the {stage} stage here.")
+    parser.add_argument("--papers-out", default="processed_papers.json", help="Enriched paper metadata, written at the end.")
+    parser.add_argument("--no-match-out", default="no_match_articles.json", help="Links OpenAlex could not match.")
+    parser.add_argument("--queue-size", type=int, default=4, help="Batches buffered between two stages.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Pages fetched at the same time.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for HTML extraction (0 parses on the event loop).")
+    parser.add_argument("--rps", type=float, default=10, help="Maximum OpenAlex requests per second.")
+    parser.add_argument("--store", default="openalex_metadata.db", help="Persistent DOI metadata store.")
+    parser.add_argument("--no-pubmed", action="store_true", help="Do not convert PMIDs and PMCIDs of links without a DOI to DOIs.")
+    parser.add_argument("--idconv-url", help="ID converter API to use instead of NCBI's, e.g. a local stand-in.")
+    parser.add_argument("--corpus", metavar="PATH", help="Also store posts, links, identifiers and papers in this indexed SQLite corpus.")
+    parser.add_argument("--compact", action="store_true", help="Write the JSON outputs without indentation.")
+    parser.add_argument("--metrics", metavar="PATH", help="Write request, cache and parsing metrics here (Prometheus text for .prom/.txt, JSON otherwise).")
+    parser.add_argument("--trace", metavar="PATH", help="Record a trace span per stage batch and write them here for chrome://tracing or Perfetto.")
+    args = parser.parse_args(argv)
+    if STAGES.index(args.first) > STAGES.index(args.last):
+        parser.error(f"--from {args.first} comes after --to {args.last}")
+    if args.first == "crawl" and not args.base_url:
+        parser.error("base_url is required when starting with the crawl stage")
+    if args.first != "crawl" and not args.input:
+        parser.error("--input is required when not starting with the crawl stage")
+    return args
+
+async def main(args: argparse.Namespace):
+    """Runs the selected stages and saves the enriched papers once every record has been through them."""
+    logging.basicConfig(level=logging.INFO)
+    metrics.tracing = bool(args.trace)
+    if args.compact:
+        serialization.indent = None
+    stages = STAGES[STAGES.index(args.first):STAGES.index(args.last) + 1]
+    outputs = {stage: getattr(args, f"{stage}_out") for stage in STAGES[:-1] if getattr(args, f"{stage}_out")}
+
+    extraction_pool = ExtractionPool(workers=args.workers) if "extract" in stages and args.workers != 0 else None
+    try:
+        async with CachedSession(cache=SQLiteBackend(), expire_after=180,
+                                 trace_configs=[metrics.trace_config("wordpress")]) as session, \
+                AsyncOpenAlexClient(requests_per_second=args.rps, concurrency=args.concurrency) as client, \
+                AsyncIdConverter(base_url=args.idconv_url) as converter:
+            with MetadataStore(args.store) as store, IdMapStore(args.store) as id_map, RecordWriter(args.no_match_out) as no_match_writer, \
+                    (CorpusStore(args.corpus) if args.corpus else nullcontext()) as corpus:
+                pipeline = Pipeline(args.first, args.last, queue_size=args.queue_size, outputs=outputs,
+                                    extraction_pool=extraction_pool, client=client, store=store,
+                                    no_match_writer=no_match_writer if "enrich" in stages else None, corpus=corpus,
+                                    resolver=None if args.no_pubmed else PubMedResolver(converter, id_map))
+                await pipeline.run(session, args.base_url, args.input, concurrency=args.concurrency)
+                logger.info(f"Records per stage: {pipeline.counts}")
+                if "enrich" in stages:
+                    with RecordWriter(args.papers_out) as writer:
+                        for paper in pipeline.processed_papers.values():
+                            writer.write(paper)
+                    if corpus is not None:
+                        corpus.add_papers(pipeline.processed_papers.values())
+                    logger.info(f"Saved {len(pipeline.processed_papers)} papers to {args.papers_out}, "
+                                f"{pipeline.no_match_count} unmatched links to {args.no_match_out}")
+                    logger.info(f"Metadata store: {store.stats}; OpenAlex requests: {client.stats}")
+                    if not args.no_pubmed:
+                        logger.info(f"PubMed id map: {id_map.stats}; ID converter requests: {converter.stats}")
+                if pipeline.crawl_result is not None and pipeline.crawl_result.failed_pages:
+                    logger.warning(f"Failed to retrieve pages: {pipeline.crawl_result.failed_pages}")
+    finally:
+        if extraction_pool:
+            extraction_pool.shutdown()
+        if "crawl" in stages:
+            print(f"Transfer: {scraper.transfer_stats.summary()}")
+        print(f"Metrics:\n{metrics.summary()}")
+        if args.metrics:
+            metrics.write(args.metrics)
+        if args.trace:
+            metrics.write_trace(args.trace)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+
+from api_client import AsyncJSONClient, RequestError
+from identifiers import normalize_doi
+from metrics import metrics
+from utils_httpx import LINK_KEYS
+
+logger = logging.getLogger(__name__)
+
+# NCBI's PMC ID Converter API, overridable e.g. to point at a local stand-in server
+IDCONV_API = "https://pmc.ncbi.nlm.nih.gov/tools/idconv/api/v1/articles"
+# The converter accepts up to 200 ids per request
+IDCONV_BATCH_SIZE = 200
+# NCBI asks callers to identify themselves with a tool name (and ideally an email address)
+IDCONV_TOOL = "wordpress_site_scraper"
+
+# Link keys of the PubMed identifiers tag_entry adds, by kind
+PUBMED_LINK_KEYS = {"pmid": LINK_KEYS["pmid"], "pmcid": LINK_KEYS["pmcid"]}
+
+def normalize_pubmed_id(value: str) -> str:
+    """PMIDs as bare digits, PMCIDs upper-case with their PMC prefix."""
+    value = str(value).strip()
+    return value.upper() if value.lower().startswith("pmc") else value.lstrip("0") or value
+
+def pubmed_id_type(key: str) -> str:
+    """The converter's idtype of a normalized id: 'pmcid' or 'pmid'."""
+    return "pmcid" if key.startswith("PMC") else "pmid"
+
+class IdMapStore:
+    """
+    Persistent map of PMIDs and PMCIDs to DOIs, kept next to the paper metadata.
+    Conversions live for `ttl` seconds (None = forever) and ids the converter knows no DOI for
+    for `miss_ttl` seconds, as records gain DOIs over time.
+    """
+
+    def __init__(self, path: str = "openalex_metadata.db", ttl: Optional[float] = None, miss_ttl: float = 30 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0}
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pubmed_dois (
+                id TEXT PRIMARY KEY,
+                doi TEXT,
+                fetched_at REAL NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Maps each normalized id with a fresh entry to its DOI, or to None for a cached miss;
+        unknown and expired ids are left out.
+        """
+        keys = list(dict.fromkeys(ids))
+        now = time.time()
+        results: Dict[str, Optional[str]] = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT id, doi, fetched_at FROM pubmed_dois WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            )
+            for key, doi, fetched_at in rows:
+                ttl = self.ttl if doi is not None else self.miss_ttl
+                if ttl is None or now - fetched_at < ttl:
+                    results[key] = doi
+
+        hits = sum(1 for doi in results.values() if doi is not None)
+        self.stats["hits"] += hits
+        self.stats["negative_hits"] += len(results) - hits
+        self.stats["misses"] += len(keys) - len(results)
+        metrics.inc("cache_lookups_total", len(results), cache="pubmed_dois", result="hit")
+        metrics.inc("cache_lookups_total", len(keys) - len(results), cache="pubmed_dois", result="miss")
+        return results
+
+    def put_many(self, conversions: Dict[str, Optional[str]]):
+        """Stores converted ids; None records an id the converter answered for without a DOI."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO pubmed_dois (id, doi, fetched_at) VALUES (?, ?, ?)",
+                [(key, doi, now) for key, doi in conversions.items()],
+            )
+
+class AsyncIdConverter(AsyncJSONClient):
+    """
+    Client of the NCBI ID Converter, converting up to 200 PMIDs or PMCIDs to DOIs per request,
+    all of one idtype. NCBI allows 3 requests per second without an API key.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, requests_per_second: float = 3, concurrency: int = 3,
+                 email: Optional[str] = None, **kwargs):
+        super().__init__(base_url or IDCONV_API, requests_per_second=requests_per_second,
+                         concurrency=concurrency, source="idconv", **kwargs)
+        self.email = email
+
+    async def convert_batch(self, ids: List[str], idtype: str) -> Dict[str, Optional[str]]:
+        """
+        Converts one batch of normalized ids of one idtype ('pmid' or 'pmcid'). Returns the DOI of
+        every id the converter answered for (None when it has no DOI for it); ids of a failed
+        request are left out.
+        """
+        params = {"ids": ",".join(ids), "idtype": idtype, "format": "json", "tool": IDCONV_TOOL}
+        if self.email:
+            params["email"] = self.email
+        try:
+            data = await self.get_json("", params)
+        except RequestError as e:
+            logger.error(f"Error converting a batch of {len(ids)} PubMed ids: {e}")
+            return {}
+        requested = set(ids)
+        conversions: Dict[str, Optional[str]] = {}
+        for record in (data or {}).get("records", []):
+            doi = normalize_doi(record["doi"]) if record.get("doi") and record.get("status") != "error" else None
+            # Records name the id they answer as requested-id, with the article's other ids beside it
+            for field in ("requested-id", "pmid", "pmcid"):
+                key = normalize_pubmed_id(record[field]) if record.get(field) else None
+                if key in requested and conversions.get(key) is None:
+                    conversions[key] = doi
+        return conversions
+
+class PubMedResolver:
+    """
+    Resolves PMIDs and PMCIDs to DOIs through an IdMapStore and, for the ids it does not hold,
+    concurrent batches of up to IDCONV_BATCH_SIZE ids of one type sent to an AsyncIdConverter.
+    """
+
+    def __init__(self, converter: AsyncIdConverter, store: Optional[IdMapStore] = None,
+                 batch_size: int = IDCONV_BATCH_SIZE):
+        self.converter = converter
+        self.store = store
+        self.batch_size = min(batch_size, IDCONV_BATCH_SIZE)
+
+    async def resolve(self, ids: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Maps each given id string to its DOI, or None when no DOI is known or the conversion
+        failed; failed conversions are not cached and are tried again on the next run.
+        """
+        originals: Dict[str, List[str]] = {}
+        for value in ids:
+            originals.setdefault(normalize_pubmed_id(value), []).append(value)
+        converted = self.store.get_many(originals) if self.store is not None else {}
+        to_convert: Dict[str, List[str]] = {}
+        for key in originals:
+            if key not in converted:
+                to_convert.setdefault(pubmed_id_type(key), []).append(key)
+        # The converter takes one idtype per request
+        batches = [(keys[i:i + self.batch_size], idtype)
+                   for idtype, keys in to_convert.items() for i in range(0, len(keys), self.batch_size)]
+        if batches:
+            logger.info(f"Converting {sum(map(len, to_convert.values()))} PubMed ids to DOIs in {len(batches)} requests")
+            fetched: Dict[str, Optional[str]] = {}
+            for conversions in await asyncio.gather(*(self.converter.convert_batch(*batch) for batch in batches)):
+                fetched.update(conversions)
+            if self.store is not None:
+                self.store.put_many(fetched)
+            converted.update(fetched)
+        return {value: converted.get(key) for key, values in originals.items() for value in values}
@@ -1,87 +1,30 @@
-import json
+import argparse
+import asyncio
 import logging
-import requests_cache
-from tqdm import tqdm
+import os
+from itertools import islice
+
+from citation_graph import expand_citations
+from corpus_store import CorpusStore
+from doi_cache import MetadataStore
+from json_stream import RecordWriter, iter_records
+from metrics import metrics
+from openalex_client import AsyncOpenAlexClient
+from pmid_resolver import PUBMED_LINK_KEYS, AsyncIdConverter, IdMapStore, PubMedResolver
+import serialization
 
 # Set up logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-# Initialize cache
-requests_cache.install_cache('openalex_cache', expire_after=3600)  # Cache expires after 1 hour
-
-def get_paper_metadata(client, doi=None, url=None):
-    """
-    Fetch metadata of a paper from OpenAlex API using DOI or URL.
-    It handles retries if a 429 error is encountered and caches responses to avoid redundant API calls.
-    """
-    if not any([doi, url]):
-        raise ValueError("At least one of 'doi' or 'url' must be provided.")
-    
-    # Build the API URL
-    if doi:
-        doi = doi.replace("https://doi.org/", "")
-        api_url = f"https://api.openalex.org/works/doi:{doi}"
-    elif url:
-        api_url = f"https://api.openalex.org/works/doi:{url}"
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:102.0) Gecko/20100101 Firefox/102.0"
-    }
-    logger.info(api_url)
-    
-    try:
-        response = client.get(api_url, headers=headers)
-        # Check if the response was retrieved from cache
-        if response.from_cache:
-            logger.info("Response retrieved from cache.")
-        else:
-            logger.info("Response retrieved from the API.")
-        
-        if response.status_code == 200:
-            metadata = response.json()
-            doi = metadata.get("doi", None)
-            if doi:
-                doi = doi[len("https://doi.org/"):]
-            
-            # Return metadata, including cited_by_api_url, counts_by_year, updated_date, created_date
-            return {
-                "openalex_id": metadata.get("id","No Id"),
-                "title": metadata.get("display_name", "No Title Available"),
-                "first_author": metadata["authorships"][0]["author"]["display_name"] if metadata.get("authorships") else "No Author",
-                "authors": ", ".join([author["author"]["display_name"] for author in metadata.get("authorships", [])]),
-                "year": metadata.get("publication_year", "Unknown Year"),
-                "doi": doi,
-                "journal": metadata.get("host_venue", {}).get("display_name", "Unknown Journal"),
-                "pages": f"{metadata['biblio'].get('first_page', '')}-{metadata['biblio'].get('last_page', '')}",
-                "volume": metadata["biblio"].get("volume", ""),
-                "number": metadata["biblio"].get("issue", ""),
-                "referenced_works_count": metadata.get("referenced_works_count", 0),  # Get referenced works count
-                "referenced_works": metadata.get("referenced_works", []),  # Get list of referenced works
-                "cited_by_api_url": metadata.get("cited_by_api_url", ""),  # Get cited_by_api_url
-                "counts_by_year": metadata.get("counts_by_year", []),  # Get counts by year
-                "updated_date": metadata.get("updated_date", ""),  # Get updated date
-                "created_date": metadata.get("created_date", ""),  # Get created date
-                "queried_indexes": []  # This will store the indices of articles querying the same DOI or author
-            }
-        elif response.status_code == 429:
-            logger.warning(f"Rate limit exceeded for {doi or url}. Retrying after a brief delay...")
-            return None
-        else:
-            logger.error(f"Error: Received status code {response.status_code} for {doi or url}")
-            logger.info(response)
-            return None
-    except Exception as e:
-        logger.error(f"Error fetching metadata for {doi or url}: {str(e)}")
-        return None
-
-def process_article_batch(client, article_batch, processed_papers, no_match_articles, key, subkey, doi_key, doi_subkey):
+def collect_article_lookups(article_batch, key, doi_key, doi_subkey, pubmed=False):
     """
-    Process a batch of articles and fetch metadata for each paperlink.
-    If a paper is already processed, we don't add it again but append the index to 'queried_indexes'.
+    List the (index, value, field) lookups a batch of articles asks for, in article order.
+    field is 'url' for values found under key and 'doi' for values found under doi_key.
+    With pubmed, links under key without a DOI but with a PMID or PMCID are listed too,
+    with field 'pmid' or 'pmcid', to be converted to DOIs (see resolve_pubmed_lookups).
     """
-    first_response_printed = False
-
+    lookups = []
     for article in article_batch:
         try:
             index = article.get('index')  # Get the index from the input JSON
@@ -95,105 +38,213 @@ def process_article_batch(client, article_batch, processed_papers, no_match_arti
                 # Process each element in the list
                 for element in data_value:
                     if isinstance(element, dict) and doi_subkey in element:
-                        doi_key_or_url = element[doi_subkey]
-                        
-                        # Check if the paper is already in processed_papers
-                        if doi_key_or_url in processed_papers:
-                            # Append the index to 'queried_indexes' if already exists
-                            processed_papers[doi_key_or_url]['queried_indexes'].append(index)
-                        else:
-                            paper_data = get_paper_metadata(client, url=doi_key_or_url)
-                            if paper_data:
-                                if not first_response_printed:
-                                    logger.info("First response:")
-                                    logger.info(paper_data)
-                                    first_response_printed = True
-                                
-                                # Add paper metadata and the index
-                                processed_papers[doi_key_or_url] = paper_data
-                                processed_papers[doi_key_or_url].setdefault('queried_indexes', []).append(index)
-                            else:
-                                no_match_articles.append({'index': index, 'url': doi_key_or_url})
+                        lookups.append((index, element[doi_subkey], 'url'))
+                    elif isinstance(element, dict) and pubmed:
+                        for field, link_key in PUBMED_LINK_KEYS.items():
+                            if link_key in element:
+                                lookups.append((index, element[link_key], field))
+                                break
             else:
                 # If the key points to a dict, process it
                 doi = article.get(doi_key)
                 if isinstance(doi, dict) and doi_subkey in doi:
-                    doi_key_or_url = doi[doi_subkey]
-                    
-                    # Check if the paper is already in processed_papers
-                    if doi_key_or_url in processed_papers:
-                        # Append the index to 'queried_indexes' if already exists
-                        processed_papers[doi_key_or_url]['queried_indexes'].append(index)
-                    else:
-                        paper_data = get_paper_metadata(client, doi=doi_key_or_url)
-                        if paper_data:
-                            if not first_response_printed:
-                                logger.info("First response:")
-                                logger.info(paper_data)
-                                first_response_printed = True
-                            
-                            # Add paper metadata and the index
-                            processed_papers[doi_key_or_url] = paper_data
-                            processed_papers[doi_key_or_url].setdefault('queried_indexes', []).append(index)
-                        else:
-                            no_match_articles.append({'index': index, 'doi': doi_key_or_url})
+                    lookups.append((index, doi[doi_subkey], 'doi'))
         except Exception as e:
             logger.error(f"Error processing article with index {article.get('index')}: {e}")
+    return lookups
 
+def apply_lookup_results(lookups, resolved, processed_papers, no_match_articles):
+    """
+    Fill processed_papers and no_match_articles from resolved lookups, in the order the articles asked for them.
+    If a paper is already processed, we don't add it again but append the index to 'queried_indexes'.
+    """
+    first_response_printed = False
+    for index, doi_key_or_url, field in lookups:
+        # Check if the paper is already in processed_papers
+        if doi_key_or_url in processed_papers:
+            # Append the index to 'queried_indexes' if already exists
+            processed_papers[doi_key_or_url]['queried_indexes'].append(index)
+        elif doi_key_or_url in resolved:
+            paper_data = resolved[doi_key_or_url]
+            if not first_response_printed:
+                logger.info("First response:")
+                logger.info(paper_data)
+                first_response_printed = True
+
+            # Add paper metadata and the index
+            processed_papers[doi_key_or_url] = paper_data
+            processed_papers[doi_key_or_url].setdefault('queried_indexes', []).append(index)
+        else:
+            no_match_articles.append({'index': index, field: doi_key_or_url})
 
-def run_openalex_process():
+async def resolve_pubmed_lookups(resolver, lookups):
+    """
+    Convert the PMID and PMCID lookups to DOI lookups with one PubMedResolver call, so they are
+    enriched like the links carrying a DOI. Ids without a DOI keep their field and become no-matches.
+    """
+    pubmed_ids = [value for _, value, field in lookups if field in PUBMED_LINK_KEYS]
+    if not pubmed_ids:
+        return lookups
+    dois = await resolver.resolve(pubmed_ids)
+    return [
+        (index, dois[value], 'url') if field in PUBMED_LINK_KEYS and dois.get(value) else (index, value, field)
+        for index, value, field in lookups
+    ]
+
+def split_cached(store, lookups, processed_papers):
+    """
+    Split the values the lookups ask for into records already in the metadata store and values
+    that still have to be fetched. Cached misses are neither: they stay no-matches without a request.
+    """
+    pending = list(dict.fromkeys(
+        value for _, value, field in lookups if value not in processed_papers and field not in PUBMED_LINK_KEYS
+    ))
+    cached = store.get_many(pending) if store is not None and pending else {}
+    resolved = {value: record for value, record in cached.items() if record is not None}
+    return resolved, [value for value in pending if value not in cached]
+
+async def process_articles_async(client, articles, processed_papers, no_match_articles, key, subkey, doi_key, doi_subkey, store=None, resolver=None):
+    """
+    Process the articles and fetch metadata for each paperlink. DOIs found in the optional
+    MetadataStore are not requested again; every other DOI is resolved concurrently through an
+    AsyncOpenAlexClient and saved to the store, then the results are applied in article order.
+    With a PubMedResolver, links with only a PMID or PMCID are converted to DOIs first.
+    """
+    lookups = collect_article_lookups(articles, key, doi_key, doi_subkey, pubmed=resolver is not None)
+    if resolver is not None:
+        lookups = await resolve_pubmed_lookups(resolver, lookups)
+    resolved, to_fetch = split_cached(store, lookups, processed_papers)
+    if to_fetch:
+        found, not_found, _ = await client.get_papers_metadata_batch(to_fetch)
+        if store is not None:
+            store.put_many(found, not_found)
+        resolved.update(found)
+    apply_lookup_results(lookups, resolved, processed_papers, no_match_articles)
+
+
+def run_openalex_process(requests_per_second=10, concurrency=10, store_path="openalex_metadata.db", chunk_size=1000, corpus_path=None, metrics_path=None,
+                         articleinfos_path=None, output_path=None, key=None, subkey=None, doi_key=None, doi_subkey=None, num_articles=None,
+                         no_match_path="no_match_articles.json", base_url=None, graph_path=None, graph_depth=1, graph_max_works=10000,
+                         graph_works_path=None, resolve_pubmed=True, idconv_url=None):
     """
     Process the articles from a JSON file, fetch metadata, and save results.
+    Requests go through an AsyncOpenAlexClient limited to requests_per_second and concurrency,
+    and DOIs already in the metadata store at store_path are not requested again.
+    Articles are streamed from the input chunk_size at a time, so only the unique papers are kept in memory.
+    With corpus_path the papers are also stored in that indexed corpus store, and with metrics_path
+    the request and cache metrics of the run are written there.
+    The file names, keys and num_articles (a number or 'all') are asked for unless given, and
+    base_url points the client at another OpenAlex server, e.g. a local stand-in.
+    A chunk that fails does not stop the run: its articles go to no_match_path with an 'error' field.
+    With graph_path the citation neighborhood of the resolved papers is expanded graph_depth levels
+    (up to graph_max_works works) and saved there as a CitationGraph, with the works' metadata in
+    graph_works_path (by default next to the graph).
+    With resolve_pubmed, links with only a PMID or PMCID are converted to DOIs through the NCBI ID
+    converter (or the server at idconv_url), 200 ids a request, and the conversions are kept in the store.
     """
-    articleinfos_path = input("Enter the input JSON file name (e.g., 'updated_urls_with_dois_and_pmids.json'): ") or "updated_urls_with_dois_and_pmids.json"
-    output_path = input("Enter the output JSON file name (e.g., 'processed_papers.json'): ") or "updated_urls_with_dois_and_pmids_metadata.json"
-    key = input("Enter the key to look for (e.g., 'external_links'): ") or "external_links"
-    subkey = input("Enter the subkey to look for (e.g., 'href'): ") or "href"
-    doi_key = input("Enter the DOI key to look for (e.g., 'doi'): ") or "doi"
-    doi_subkey = input("Enter the DOI subkey to look for (e.g., 'doi'): ") or "doi"
+    if articleinfos_path is None:
+        articleinfos_path = input("Enter the input JSON file name (e.g., 'updated_urls_with_dois_and_pmids.json'): ") or "updated_urls_with_dois_and_pmids.json"
+    if output_path is None:
+        output_path = input("Enter the output JSON file name (e.g., 'processed_papers.json'): ") or "updated_urls_with_dois_and_pmids_metadata.json"
+    if key is None:
+        key = input("Enter the key to look for (e.g., 'external_links'): ") or "external_links"
+    if subkey is None:
+        subkey = input("Enter the subkey to look for (e.g., 'href'): ") or "href"
+    if doi_key is None:
+        doi_key = input("Enter the DOI key to look for (e.g., 'doi'): ") or "doi"
+    if doi_subkey is None:
+        doi_subkey = input("Enter the DOI subkey to look for (e.g., 'doi'): ") or "doi"
     
     # Ask how many articles to scrape
-    num_articles = input("How many articles would you like to scrape? (Enter a number or 'all' for all articles): ").strip()
-    
-    with open(articleinfos_path, 'r') as f:
-        articles = json.load(f)
+    if num_articles is None:
+        num_articles = input("How many articles would you like to scrape? (Enter a number or 'all' for all articles): ")
+    num_articles = str(num_articles).strip()
     
+    limit = None
     if num_articles.lower() != 'all':
         try:
-            num_articles = int(num_articles)
-            articles = articles[:num_articles]  # Slice the list to the number of articles requested
+            limit = int(num_articles)  # Only read the number of articles requested
         except ValueError:
             print("Invalid input. Please enter a valid number or 'all'.")
             return
     
     processed_papers = {}  # Initialize dict to store processed papers
-    no_match_articles = []  # List to store articles with no match
 
-    batch_size = 50  # Process 50 articles per batch
-    
-    # Use tqdm to show progress
-    with requests_cache.CachedSession() as client:  # Use a CachedSession
-        i = 0
-        for i in tqdm(range(0, len(articles), batch_size), desc="Processing batches"):
-            article_batch = articles[i:i + batch_size]
-            logger.info(f"Processing batch {i + 1} to {i + batch_size}")
-
-            try:
-                process_article_batch(client, article_batch, processed_papers, no_match_articles, key, subkey, doi_key, doi_subkey)
-            except Exception as e:
-                logger.error(f"Error processing batch: {e}")
+    async def enrich():
+        articles = islice(iter_records(articleinfos_path), limit)
+        async with AsyncOpenAlexClient(base_url=base_url, requests_per_second=requests_per_second, concurrency=concurrency) as client, \
+                AsyncIdConverter(base_url=idconv_url) as converter:
+            # Save the no match articles to a separate file as each chunk is resolved
+            with MetadataStore(store_path) as store, IdMapStore(store_path) as id_map, RecordWriter(no_match_path) as no_match_file:
+                resolver = PubMedResolver(converter, id_map) if resolve_pubmed else None
+                failed_chunks = 0
+                while True:
+                    article_chunk = list(islice(articles, chunk_size))
+                    if not article_chunk:
+                        break
+                    no_match_articles = []  # List to store articles with no match
+                    try:
+                        with metrics.span("enrich chunk", articles=len(article_chunk)):
+                            await process_articles_async(client, article_chunk, processed_papers, no_match_articles, key, subkey, doi_key, doi_subkey, store=store, resolver=resolver)
+                    except Exception as e:
+                        # Keep going with the next chunk; this one's articles are listed as failed with the error
+                        logger.error(f"Error processing {len(article_chunk)} articles: {e!r}")
+                        failed_chunks += 1
+                        metrics.inc("enrich_failed_articles_total", len(article_chunk))
+                        no_match_articles = [{'index': article.get('index'), 'error': repr(e)} for article in article_chunk]
+                    for article in no_match_articles:
+                        no_match_file.write(article)
+                if failed_chunks:
+                    logger.warning(f"{failed_chunks} chunks failed; their articles are in {no_match_path} with an 'error' field")
+                logger.info(f"Metadata store: {store.stats}")
+                if resolver is not None:
+                    logger.info(f"PubMed id map: {id_map.stats}, ID converter requests: {converter.stats}")
+            if graph_path:
+                with metrics.span("citation graph"):
+                    graph, works = await expand_citations(client, processed_papers.values(), depth=graph_depth, max_works=graph_max_works)
+                graph.save(graph_path)
+                with RecordWriter(graph_works_path or os.path.splitext(graph_path)[0] + "_works.json") as works_file:
+                    for work_id in graph.ids:
+                        if work_id in works:
+                            works_file.write(works[work_id])
+                logger.info(f"Citation graph of {graph.num_nodes} works and {graph.num_edges} citations saved to {graph_path}")
+            logger.info(f"OpenAlex requests: {client.stats}")
+
+    asyncio.run(enrich())
 
     # Save the final processed papers to the output file
-    with open(output_path, 'w') as f:
-        json.dump(list(processed_papers.values()), f, indent=4)
-
-    # Save the no match articles to a separate file
-    with open('no_match_articles.json', 'w') as f:
-        json.dump(no_match_articles, f, indent=4)
+    with RecordWriter(output_path) as f:
+        for paper in processed_papers.values():
+            f.write(paper)
+    if corpus_path:
+        with CorpusStore(corpus_path) as corpus:
+            corpus.add_papers(processed_papers.values())
 
     logger.info(f"Paper metadata saved to {output_path}")
-    logger.info(f"No match articles saved to no_match_articles.json")
+    logger.info(f"No match articles saved to {no_match_path}")
+    logger.info(f"Metrics:\n{metrics.summary()}")
+    if metrics_path:
+        metrics.write(metrics_path)
 
 
 if __name__ == "__main__":
-    run_openalex_process()
+    parser = argparse.ArgumentParser(description="Enrich scraped links with OpenAlex paper metadata.")
+    parser.add_argument("--rps", type=float, default=10, help="Maximum OpenAlex requests per second.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Maximum OpenAlex requests in flight.")
+    parser.add_argument("--store", default="openalex_metadata.db", help="Persistent DOI metadata store.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Articles read and resolved at a time.")
+    parser.add_argument("--corpus", help="Also store the papers in this indexed SQLite corpus.")
+    parser.add_argument("--metrics", help="Write request and cache metrics here (Prometheus text for .prom/.txt, JSON otherwise).")
+    parser.add_argument("--compact", action="store_true", help="Write the JSON outputs without indentation.")
+    parser.add_argument("--graph", help="Expand the citation neighborhood of the resolved papers and save the graph here.")
+    parser.add_argument("--graph-depth", type=int, default=1, help="Levels of references and citing works to follow.")
+    parser.add_argument("--graph-max-works", type=int, default=10000, help="Stop adding works to the graph at this many.")
+    parser.add_argument("--graph-works", help="Metadata of the graph's works (default: next to --graph, ending in _works.json).")
+    parser.add_argument("--no-pubmed", action="store_true", help="Do not convert PMIDs and PMCIDs of links without a DOI to DOIs.")
+    parser.add_argument("--idconv-url", help="ID converter API to use instead of NCBI's, e.g. a local stand-in.")
+    args = parser.parse_args()
+    if args.compact:
+        serialization.indent = None
+    run_openalex_process(requests_per_second=args.rps, concurrency=args.concurrency, store_path=args.store, chunk_size=args.chunk_size, corpus_path=args.corpus, metrics_path=args.metrics,
+                         graph_path=args.graph, graph_depth=args.graph_depth, graph_max_works=args.graph_max_works, graph_works_path=args.graph_works,
+                         resolve_pubmed=not args.no_pubmed, idconv_url=args.idconv_url)
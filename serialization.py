@@ -0,0 +1,96 @@
+"""JSON decoding and encoding through the fastest installed backend: orjson, msgspec or the standard library."""
+import json
+from typing import Any, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # msgspec is optional
+    msgspec = None
+
+UTF8_BOM = b"\xef\xbb\xbf"
+
+# What loads raises on malformed input, whichever backend decodes (orjson's error subclasses json's)
+DecodeError = (json.JSONDecodeError, msgspec.DecodeError) if msgspec is not None else json.JSONDecodeError
+
+# Indentation of the JSON files written, or None for compact files (set by the --compact options).
+# orjson only indents by 2, so other indentations are written by the standard library encoder.
+indent: Optional[int] = 4
+
+def available_backends() -> List[str]:
+    """Returns the installed JSON backends, fastest first."""
+    backends = []
+    if orjson is not None:
+        backends.append("orjson")
+    if msgspec is not None:
+        backends.append("msgspec")
+    backends.append("json")
+    return backends
+
+DEFAULT_BACKEND = available_backends()[0]
+backend = DEFAULT_BACKEND
+
+def set_backend(name: str):
+    """Switches every later loads/dumps to another installed backend, e.g. to compare them."""
+    global backend
+    if name not in available_backends():
+        raise ValueError(f"JSON backend {name} is not installed")
+    backend = name
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decodes JSON from bytes (UTF-8, with or without a BOM) or str, without an intermediate str for bytes."""
+    if isinstance(data, bytes) and data[:3] == UTF8_BOM:
+        data = data[3:]
+    if backend == "orjson":
+        return orjson.loads(data)
+    if backend == "msgspec":
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+def dumps(obj: Any, indent: Optional[int] = None) -> str:
+    """Encodes obj as JSON text, compact unless indent is given."""
+    if backend == "orjson" and indent in (None, 0, 2):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    if backend == "msgspec":
+        encoded = msgspec.json.encode(obj)
+        return (msgspec.json.format(encoded, indent=indent) if indent else encoded).decode("utf-8")
+    return json.dumps(obj, indent=indent, ensure_ascii=False, separators=None if indent else (",", ":"))
+
+def dumps_output(obj: Any) -> str:
+    """Encodes a file's content with the configured output indentation (see indent)."""
+    return dumps(obj, indent)
+
+if msgspec is not None:
+    class _Rendered(msgspec.Struct, omit_defaults=True):
+        rendered: str = ""
+
+    class _Post(msgspec.Struct, omit_defaults=True):
+        """The post fields the exporters read; every other field of the response is skipped while decoding."""
+        id: Any = None
+        link: Optional[str] = None
+        date_gmt: Optional[str] = None
+        modified_gmt: Optional[str] = None
+        title: Optional[_Rendered] = None
+        content: Optional[_Rendered] = None
+
+    _posts_decoder = msgspec.json.Decoder(List[_Post])
+
+def loads_posts(data: bytes) -> Any:
+    """
+    Decodes a page of WordPress posts. With msgspec installed only the fields the exporters use
+    are decoded (into plain dicts, absent fields left out); otherwise the whole page is decoded.
+    Anything that is not a list of post objects, e.g. an error body, is decoded as plain JSON.
+    """
+    if msgspec is None:
+        return loads(data)
+    if data[:3] == UTF8_BOM:
+        data = data[3:]
+    try:
+        return msgspec.to_builtins(_posts_decoder.decode(data))
+    except msgspec.ValidationError:
+        return loads(data)
@@ -1,57 +1,42 @@
-import json
-import re
+from identifiers import extract_identifiers, extract_identifiers_batch
+from json_stream import RecordWriter, iter_records
 
-# Load JSON data from file
-with open('updated_urls_with_dois.json', 'r') as file:
-    data = json.load(file)
-
-# Define regular expression patterns to match DOIs and PMIDs
-doi_pattern = r"10\.\d{4,9}/[^/]+"
-pmid_pattern = r"pmid=(\d+)"
-pubmed_url_pattern = r"pubmed\.ncbi\.nlm\.nih\.gov/(\d+)/"
+# Link-level keys for each identifier kind; PMIDs keep their historical 'pubmedID' name
+LINK_KEYS = {"doi": "doi", "pmid": "pubmedID", "pmcid": "pmcid", "arxiv": "arxiv"}
 
 
 # Function to extract DOI or PMID from a URL
 def extract_doi_or_pmid(url):
-    doi_match = re.search(doi_pattern, url, re.IGNORECASE)
-    pmid_match = re.search(pmid_pattern, url, re.IGNORECASE)
-    pubmed_match = re.search(pubmed_url_pattern, url, re.IGNORECASE)
-
-    if doi_match:
-        return {'doi': doi_match.group()}
-    elif pmid_match:
-        return {'pubmedID': pmid_match.group(1)}
-    elif pubmed_match:
-        return {'pubmedID': pubmed_match.group(1)}
-    return None
+    identifiers = extract_identifiers(url)
+    if not identifiers:
+        return None
+    return {LINK_KEYS[kind]: value for kind, value in identifiers.items()}
 
 
-# Iterate over each entry in the data
-for entry in data:
+def tag_entry(entry):
     # Extract DOI and PMID from 'publication_url'
     publication_url = entry.get("publication_url")
     if publication_url and isinstance(publication_url, str):
-        doi_match = re.search(doi_pattern, publication_url, re.IGNORECASE)
-        if doi_match:
-            entry['doi'] = doi_match.group()
-        pmid_match = re.search(pmid_pattern, publication_url, re.IGNORECASE)
-        if pmid_match:
-            entry['pmid:'] = pmid_match.group(1)
-
-    # Iterate over external links to extract DOI or PMID from 'href' field
-    external_links = entry.get("external_links", [])
-    for link in external_links:
-        href = link.get("href")
-        if href and isinstance(href, str):
-            extracted_info = extract_doi_or_pmid(href)
-            if extracted_info:
-                # Add the extracted DOI or PMID under the link dictionary
-                link.update(extracted_info)
-
-# Write the updated JSON data back to a file
-with open('wordpress_filtered.json', 'w') as outfile:
-    json.dump(data, outfile, indent=4)
-
-# Optionally, print the updated data to check the results
-for entry in data:
-    print(entry)
+        identifiers = extract_identifiers(publication_url)
+        if "doi" in identifiers:
+            entry['doi'] = identifiers["doi"]
+        if "pmid" in identifiers:
+            entry['pmid'] = identifiers["pmid"]
+
+    # Scan the 'href' of every external link in one batch
+    external_links = [link for link in entry.get("external_links", []) if isinstance(link, dict)]
+    hrefs = [link.get("href") for link in external_links]
+    for link, identifiers in zip(external_links, extract_identifiers_batch(hrefs)):
+        # Add the extracted identifiers under the link dictionary
+        link.update({LINK_KEYS[kind]: value for kind, value in identifiers.items()})
+    return entry
+
+
+if __name__ == "__main__":
+    # Tag the entries one at a time, writing each to the output as soon as it is done
+    with RecordWriter('wordpress_filtered.json') as outfile:
+        for entry in iter_records('updated_urls_with_dois.json'):
+            tag_entry(entry)
+            outfile.write(entry)
+            # Optionally, print the updated data to check the results
+            print(entry)
@@ -1,28 +1,88 @@
 import aiohttp
 import asyncio
 import logging
-from typing import Any, List, Optional, Tuple, Union,Set
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union,Set
 from tqdm import tqdm
-import json
-from urllib.parse import urlsplit, urlunsplit
-import math
+import argparse
+from dataclasses import asdict, dataclass, field
+from urllib.parse import urlencode, urlsplit, urlunsplit
+import os
+import time
 import aiofiles
-from bs4 import BeautifulSoup
 import csv
+from itertools import islice
+from datetime import datetime, timedelta
 from aiohttp_client_cache import CachedSession, SQLiteBackend
+from adaptive_concurrency import AdaptiveLimiter
+from api_client import parse_retry_after
+from corpus_store import CorpusStore
+from crawl_state import CrawlJournal, CrawlState, site_key
+from html_extract import ExtractionPool, PostExtraction, clear_extraction_cache, extract_post, extract_post_html
+from json_stream import iter_records
+from metrics import metrics
+from page_cache import CachedPage, PageCache
+import serialization
+
+# Output selection, overridden by the prompts in main
+include_title = True
+include_date = True
+include_content = True
+include_links = True
+# Ask WordPress for only the fields we export; disabled with --no-fields
+use_fields_projection = True
+# Revalidated store of list pages, set by --page-cache
+page_cache: Optional[PageCache] = None
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+
+@dataclass
+class TransferStats:
+    """Bytes received and time spent decoding JSON responses during a run.
+
+    bytes_received is what came over the network, i.e. the compressed size when the server gzips:
+    aiohttp's raw stream size, else the Content-Length, else the body size. bytes_decoded is the
+    size of the decompressed bodies that were parsed. Pages the server answered 304 for are
+    counted apart, in not_modified and bytes_reused, as their bodies come from the page cache.
+    """
+    responses: int = 0
+    bytes_received: int = 0
+    bytes_decoded: int = 0
+    not_modified: int = 0
+    bytes_reused: int = 0
+    decode_seconds: float = 0.0
+
+    def record(self, response_obj, content: bytes):
+        raw_size = getattr(getattr(response_obj, "content", None), "total_raw_bytes", None)  # aiohttp >= 3.12
+        content_length = response_obj.headers.get("Content-Length", "")
+        if not isinstance(raw_size, int):
+            raw_size = int(content_length) if content_length.isdigit() else len(content)
+        self.responses += 1
+        self.bytes_received += raw_size
+        self.bytes_decoded += len(content)
+
+    def summary(self) -> str:
+        revalidated = (
+            f", {self.not_modified} not modified ({self.bytes_reused / 1_000_000:.2f} MB reused from the page cache)"
+            if self.not_modified else ""
+        )
+        return (
+            f"{self.responses} responses, {self.bytes_received / 1_000_000:.2f} MB received "
+            f"({self.bytes_decoded / 1_000_000:.2f} MB decompressed){revalidated}, {self.decode_seconds:.3f}s decoding JSON"
+        )
+
+transfer_stats = TransferStats()
+
+@dataclass
+class CrawlResult:
+    """Entries collected by a full-site crawl, in page order, plus the pages that could not be fetched."""
+    entries: List[Any] = field(default_factory=list)
+    total_entries: int = 0
+    total_pages: int = 0
+    failed_pages: List[int] = field(default_factory=list)
 
 # Utility functions
-async def get_total_pages(session, base_url):
-    """Get total pages available from WordPress API."""
-    url = url_path_join(base_url, "wp-json/wp/v2/posts?_embed&per_page=100&page=1")
-    async with session.get(url) as response:
-        if response.status != 200:
-            logging.error(f"Failed to retrieve the total number of pages: {response.status}")
-            return 0
-
-        total_pages = response.headers.get('X-WP-TotalPages')
-        return int(total_pages) if total_pages else 0
-
 def url_path_join(*parts: str) -> str:
     """Joins URL path components intelligently."""
     schemes, netlocs, paths, queries, fragments = zip(*(urlsplit(part) for part in parts))
@@ -37,45 +97,52 @@ def first(sequence: Union[List[str], Tuple[str]], default: str = "") -> str:
     """Returns the first non-empty item in a sequence or a default value if none is found."""
     return next((x for x in sequence if x), default)
 
-async def get_content_as_json(response_obj) -> Any:
-    """Parses the response content as JSON."""
+async def get_content_as_json(response_obj, posts: bool = False) -> Any:
+    """Parses the response content as JSON, recording cache use and decode time in the run metrics."""
     content = await response_obj.read()
-    if content[:3] == b"\xef\xbb\xbf":  # UTF-8 BOM
-        content = content.decode("utf-8-sig")
-    else:
-        content = content.decode("utf-8")
-    return json.loads(content)
+    from_cache = getattr(response_obj, "from_cache", None)  # Only set by aiohttp_client_cache sessions
+    if from_cache is not None:
+        metrics.record_cache("wordpress", from_cache)
+    if not from_cache:
+        transfer_stats.record(response_obj, content)
+    return decode_json_content(content, posts)
+
+def decode_json_content(content: bytes, posts: bool = False) -> Any:
+    """Decodes a JSON response body, counting the decode time in the transfer stats.
+
+    posts=True decodes a page of posts with serialization.loads_posts, keeping only the fields we use.
+    """
+    start = time.perf_counter()
+    decoded = serialization.loads_posts(content) if posts else serialization.loads(content)
+    seconds = time.perf_counter() - start
+    transfer_stats.decode_seconds += seconds
+    metrics.observe("json_decode_seconds", seconds, source="wordpress")
+    return decoded
+
+def build_fields_projection() -> Optional[str]:
+    """Builds the _fields projection for the selected outputs, or None when projection is disabled."""
+    if not use_fields_projection:
+        return None
+    fields = ["id", "link", "date_gmt", "modified_gmt"]
+    if include_title:
+        fields.append("title")
+    if include_content or include_links:
+        fields.append("content")
+    return ",".join(fields)
+
+def post_params(params: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Adds the _fields projection to the query parameters of a posts request."""
+    projection = build_fields_projection()
+    return {**(params or {}), **({"_fields": projection} if projection else {})}
 
 def clean_html_content(html_content: str) -> str:
     """Cleans the HTML content by removing ads, scripts, and unnecessary tags."""
-    soup = BeautifulSoup(html_content, "html.parser")
+    return extract_post_html(html_content, None).text
 
-    # Remove ad divs, script tags, and other unwanted elements
-    for ad_div in soup.find_all("div", class_="ad-slot--container"):
-        ad_div.decompose()
-    for script in soup.find_all("script"):
-        script.decompose()
-
-    # Return cleaned text
-    return soup.get_text(separator=" ", strip=True)
-
-def extract_links(html_content: str, base_url: str) -> List[str]:
+def extract_links(html_content: str, base_url: str) -> Tuple[List[str], str]:
     """Extracts all external links from the HTML content, ignoring Facebook and non-https links."""
-    soup = BeautifulSoup(html_content, "html.parser")
-    links = set
-    links_arr = []
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        if href.startswith("https://") and "facebook" not in href and not href.startswith(base_url) and "sciencealert" not in href and "twitter" not in href and "instagram" not in href and "pinterest" not in href and "linkedin" not in href and ".jpeg" not in href and ".jpg" not in href and ".png" not in href and ".gif" not in href:
-            links_arr.append(href)
-
-    link = links_arr[-1]
-    links = set(links_arr)
-
-    links_arr = []
-    for link in links:
-        links_arr.append(link)
-    return links_arr,link
+    extraction = extract_post_html(html_content, base_url)
+    return extraction.links, extraction.last_link
 
 # Core functionality
 async def get_basic_info(session, target: str, api_path: str = "wp-json/") -> dict:
@@ -97,61 +164,6 @@ async def get_basic_info(session, target: str, api_path: str = "wp-json/") -> di
         logging.error(f"Error fetching basic info: {e}")
         raise
 
-async def crawl_pages(
-    session,
-    base_url: str,
-    api_path: str,
-    start: Optional[int] = None,
-    num: Optional[int] = None,
-    display_progress: bool = True,
-) -> Tuple[List[Any], int]:
-    """Crawls pages from a given endpoint, retrieving entries."""
-    page = 1
-    total_entries = 0
-    entries: List[Any] = []
-    per_page = 50  # Optimized to scrape 50 posts at a time
-    entries_left = num if num is not None else 1
-
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-    }
-
-    if start is not None:
-        page = math.floor(start / per_page) + 1
-
-    more_entries = True
-
-    with tqdm(total=num if num else float('inf'), desc="Scraping Posts", unit="post") as pbar:
-        while more_entries and entries_left > 0:
-            rest_url = url_path_join(base_url, f"wp-json/{api_path}?page={page}&per_page={per_page}")
-
-            try:
-                async with session.get(rest_url, headers=headers) as req:
-                    req.raise_for_status()
-
-                    if page == 1 and "X-WP-Total" in req.headers:
-                        total_entries = int(req.headers["X-WP-Total"])
-                        logging.info(f"Total number of entries: {total_entries}")
-                        num = total_entries if num is None else min(num, total_entries)
-                    json_content = await get_content_as_json(req)
-                    if isinstance(json_content, list) and json_content:
-                        entries += json_content
-                        entries_left -= len(json_content)
-                        pbar.update(len(json_content))
-                    else:
-                        more_entries = False
-
-            except aiohttp.ClientResponseError as e:
-                logging.error(f"HTTP error on page {page}: {e}")
-                break
-            except Exception as e:
-                logging.error(f"Error on page {page}: {e}")
-                break
-
-            page += 1
-
-    return entries, total_entries
-
 async def crawl_single_page(session, base_url: str, api_path: str) -> Any:
     """Crawls a single page of the WordPress API."""
     rest_url = url_path_join(base_url, f"wp-json/{api_path}")
@@ -169,67 +181,576 @@ async def crawl_single_page(session, base_url: str, api_path: str) -> Any:
         logging.error(f"Error: {e}")
         return None
 
+async def fetch_page(
+    session, base_url: str, api_path: str, page: int, per_page: int = 100, params: Optional[Dict[str, str]] = None
+) -> Tuple[List[Any], Any]:
+    """Fetches one page of a paginated endpoint and returns its entries and response headers."""
+    query = urlencode({"page": page, "per_page": per_page, **(params or {})})
+    rest_url = url_path_join(base_url, f"wp-json/{api_path}?{query}")
+    posts = api_path == ENDPOINTS["posts"]
+    with metrics.span("fetch page", page=page):
+        cached = page_cache.lookup(rest_url) if page_cache is not None else None
+        headers = {**DEFAULT_HEADERS, **cached.conditional_headers()} if cached is not None else DEFAULT_HEADERS
+        async with session.get(rest_url, headers=headers) as req:
+            if req.status == 304 and cached is not None:
+                json_content = revalidated_content(cached, posts)
+                response_headers = cached.response_headers(req.headers)
+            else:
+                req.raise_for_status()
+                json_content = await get_content_as_json(req, posts)
+                response_headers = req.headers
+                if page_cache is not None and not getattr(req, "from_cache", False):
+                    if cached is not None:
+                        page_cache.modified()
+                        metrics.inc("http_revalidations_total", source="wordpress", result="modified")
+                    stored = page_cache.store(rest_url, req.headers, await req.read())
+                    if stored is not None:
+                        page_cache.remember(stored, json_content)
+            return (json_content if isinstance(json_content, list) else []), response_headers
+
+def revalidated_content(cached: CachedPage, posts: bool = False) -> Any:
+    """
+    The JSON of a page the server answered 304 for, decoded from the stored body at most once per run.
+    Each run decodes the body again on its first 304, as the decoded pages are only kept in memory.
+    """
+    page_cache.not_modified(cached)
+    metrics.inc("http_revalidations_total", source="wordpress", result="not_modified")
+    metrics.record_cache("wordpress", True)
+    transfer_stats.not_modified += 1
+    transfer_stats.bytes_reused += len(cached.body)
+    json_content = page_cache.decoded(cached)
+    if json_content is None:
+        json_content = decode_json_content(cached.body, posts)
+        page_cache.remember(cached, json_content)
+    return json_content
+
+async def fetch_page_with_retry(
+    session, base_url: str, api_path: str, page: int, per_page: int = 100,
+    params: Optional[Dict[str, str]] = None, retries: int = 3, backoff: float = 1.0,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> Tuple[List[Any], Any]:
+    """Fetches a page, retrying failures with exponential backoff before giving up.
+
+    A Retry-After header on the failed response replaces the backoff delay. With a limiter every
+    attempt takes one of its slots, and a Retry-After pauses all requests sharing it.
+    """
+    for attempt in range(retries + 1):
+        try:
+            if limiter is None:
+                return await fetch_page(session, base_url, api_path, page, per_page, params)
+            async with limiter.slot():
+                return await fetch_page(session, base_url, api_path, page, per_page, params)
+        except Exception as e:
+            permanent = isinstance(e, aiohttp.ClientResponseError) and 400 <= e.status < 500 and e.status not in (408, 429)
+            if attempt == retries or permanent:
+                raise
+            delay = backoff * 2 ** attempt
+            retry_after = None
+            if isinstance(e, aiohttp.ClientResponseError) and e.headers:
+                retry_after = parse_retry_after(e.headers.get("Retry-After"))
+            if retry_after is not None:
+                delay = retry_after
+                if limiter is not None:
+                    limiter.pause(retry_after)
+            logging.warning(f"Error on page {page} ({e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+async def crawl_all_pages(
+    session,
+    base_url: str,
+    api_path: str,
+    per_page: int = 100,
+    concurrency: int = 10,
+    display_progress: bool = True,
+    on_page: Optional[Callable[[int, List[Any]], Awaitable[None]]] = None,
+    keep_entries: bool = True,
+    params: Optional[Dict[str, str]] = None,
+    skip_pages: Optional[Set[int]] = None,
+    retries: int = 3,
+    limiter: Optional[AdaptiveLimiter] = None,
+    first_page: int = 1,
+    max_pages: Optional[int] = None,
+) -> CrawlResult:
+    """Crawls every page of an endpoint concurrently, using X-WP-TotalPages from a single probe request.
+
+    Any paginated endpoint works (see ENDPOINTS). first_page and max_pages restrict the crawl to a
+    range of pages; the probe then fetches first_page, and a first_page past the end gives no entries.
+
+    If on_page is given it is awaited with (page, entries) as soon as each page arrives. With
+    keep_entries=False the entries are handed to on_page only and never collected in memory.
+    Pages in skip_pages (e.g. already checkpointed) are not fetched or delivered, and failed
+    pages are retried with backoff before being reported in failed_pages. With a limiter the
+    number of requests in flight adapts to the server, up to limiter.maximum; otherwise it is
+    fixed at concurrency.
+    """
+    result = CrawlResult()
+    seen_ids: Set[Any] = set()
+    skip_pages = skip_pages or set()
+
+    async def deliver(page: int, entries: List[Any]):
+        if page in skip_pages:
+            return
+        if on_page is not None:
+            await on_page(page, drop_seen(entries, seen_ids))
+        if keep_entries:
+            pages[page] = entries
+
+    # Probe the first page to learn how many pages there are
+    try:
+        try:
+            first_entries, headers = await fetch_page_with_retry(
+                session, base_url, api_path, first_page, per_page, params, retries, limiter=limiter,
+            )
+        except aiohttp.ClientResponseError as e:
+            if e.status == 400 and first_page > 1:
+                # WordPress answers 400 for a page past the last one
+                return result
+            if e.status != 400 or not params or "_fields" not in params:
+                raise
+            logging.warning("The site rejected the _fields projection, crawling full objects instead.")
+            params = {key: value for key, value in params.items() if key != "_fields"}
+            first_entries, headers = await fetch_page_with_retry(
+                session, base_url, api_path, first_page, per_page, params, retries, limiter=limiter,
+            )
+    except Exception as e:
+        logging.error(f"Error on page {first_page} of {api_path}: {e}")
+        result.failed_pages.append(first_page)
+        return result
+
+    if params and "_fields" in params and first_entries and isinstance(first_entries[0], dict):
+        if set(first_entries[0]) - set(params["_fields"].split(",")):
+            logging.info("The site ignores _fields, so full objects are downloaded.")
+
+    result.total_pages = int(headers.get("X-WP-TotalPages", 1) or 1)
+    result.total_entries = int(headers.get("X-WP-Total", len(first_entries)) or 0)
+    logging.info(f"Total number of entries in {api_path}: {result.total_entries} across {result.total_pages} pages")
+    last_page = result.total_pages if max_pages is None else min(result.total_pages, first_page + max_pages - 1)
+
+    pages: Dict[int, List[Any]] = {}
+    # The limiter decides how many requests are in flight; the semaphore bounds pages held for delivery
+    semaphore = asyncio.Semaphore(max(1, limiter.maximum if limiter is not None else concurrency))
+
+    with tqdm(total=result.total_entries, desc=f"Scraping {api_path.rsplit('/', 1)[-1].capitalize()}", unit="entry",
+              disable=not display_progress) as pbar:
+        pbar.update(len(first_entries))
+        await deliver(first_page, first_entries)
+
+        async def fetch(page: int):
+            async with semaphore:
+                try:
+                    entries, _ = await fetch_page_with_retry(
+                        session, base_url, api_path, page, per_page, params, retries, limiter=limiter,
+                    )
+                except Exception as e:
+                    logging.error(f"Error on page {page} of {api_path}: {e}")
+                    result.failed_pages.append(page)
+                    return
+                pbar.update(len(entries))
+                await deliver(page, entries)
+
+        await asyncio.gather(*(fetch(page) for page in range(first_page + 1, last_page + 1) if page not in skip_pages))
+
+    # Reassemble in page order; entries can shift between pages while crawling, so drop repeated ids
+    seen_ids.clear()
+    for page in sorted(pages):
+        result.entries.extend(drop_seen(pages[page], seen_ids))
+
+    result.failed_pages.sort()
+    if result.failed_pages:
+        logging.warning(f"Failed to retrieve pages: {result.failed_pages}")
+    return result
+
+def drop_seen(entries: List[Any], seen_ids: Set[Any]) -> List[Any]:
+    """Returns the entries whose id has not been seen yet, recording the new ids."""
+    fresh = []
+    for entry in entries:
+        entry_id = entry.get("id") if isinstance(entry, dict) else None
+        if entry_id is not None:
+            if entry_id in seen_ids:
+                continue
+            seen_ids.add(entry_id)
+        fresh.append(entry)
+    return fresh
+
+# Paginated collections of the WordPress REST API, by the name used on the command line
+ENDPOINTS = {
+    "posts": "wp/v2/posts",
+    "comments": "wp/v2/comments",
+    "pages": "wp/v2/pages",
+    "media": "wp/v2/media",
+    "categories": "wp/v2/categories",
+    "tags": "wp/v2/tags",
+    "users": "wp/v2/users",
+}
+
 # Functions to retrieve different types of entries
-async def get_comments(session, base_url: str, start: Optional[int] = None, num: Optional[int] = None) -> Tuple[List[Any], int]:
+async def get_entries(
+    session, base_url: str, api_path: str, start: Optional[int] = None, num: Optional[int] = None,
+    concurrency: int = 10, limiter: Optional[AdaptiveLimiter] = None, params: Optional[Dict[str, str]] = None,
+    display_progress: bool = True, per_page: int = 100,
+) -> Tuple[List[Any], int]:
+    """Retrieves num entries (all by default) of an endpoint from offset start, fetching their pages concurrently."""
+    start = start or 0
+    max_pages = None if num is None else (start % per_page + num - 1) // per_page + 1
+    if max_pages is not None and max_pages < 1:
+        return [], 0
+    result = await crawl_all_pages(
+        session, base_url, api_path, per_page=per_page, concurrency=concurrency, display_progress=display_progress,
+        params=params, limiter=limiter, first_page=start // per_page + 1, max_pages=max_pages,
+    )
+    entries = result.entries[start % per_page:]
+    return (entries[:num] if num is not None else entries), result.total_entries
+
+async def get_comments(session, base_url: str, start: Optional[int] = None, num: Optional[int] = None,
+                       concurrency: int = 10, limiter: Optional[AdaptiveLimiter] = None) -> Tuple[List[Any], int]:
     """Retrieves all comments from the WordPress API."""
-    return await crawl_pages(session, base_url, "wp/v2/comments", start, num)
+    return await get_entries(session, base_url, ENDPOINTS["comments"], start, num, concurrency, limiter)
 
-async def get_posts(session, base_url: str, start: Optional[int] = None, num: Optional[int] = None) -> Tuple[List[Any], int]:
+async def get_posts(session, base_url: str, start: Optional[int] = None, num: Optional[int] = None, concurrency: int = 10,
+                    limiter: Optional[AdaptiveLimiter] = None) -> Tuple[List[Any], int]:
     """Retrieves all posts from the WordPress API."""
-    queue = asyncio.Queue()
-    posts = []
-    total_posts = 0
-    batch_size = 50  # Set batch size to 50 to scrape incrementally
+    return await get_entries(
+        session, base_url, ENDPOINTS["posts"], start, num, concurrency, limiter, params=post_params(),
+        display_progress=num is None,
+    )
+
+async def crawl_endpoints(
+    session, base_url: str, names: Iterable[str], concurrency: int = 10, limiter: Optional[AdaptiveLimiter] = None,
+) -> Dict[str, CrawlResult]:
+    """Crawls several endpoints of a site at the same time, each with its pages fetched concurrently.
+
+    With a limiter the endpoints share it, so together they adapt to what the server can take.
+    """
+    names = list(dict.fromkeys(names))
+
+    async def crawl(name: str) -> CrawlResult:
+        with metrics.span(f"crawl {name}"):
+            return await crawl_all_pages(
+                session, base_url, ENDPOINTS[name], per_page=100, concurrency=concurrency, display_progress=False,
+                params=post_params() if name == "posts" else None, limiter=limiter,
+            )
+
+    results = await asyncio.gather(*(crawl(name) for name in names))
+    return dict(zip(names, results))
+
+def transform_comment(comment: dict) -> dict:
+    """Keeps the fields of a comment needed to rebuild its thread, with the content as plain text."""
+    return {
+        "id": comment.get("id"),
+        "parent": comment.get("parent", 0),
+        "author_name": comment.get("author_name"),
+        "date_gmt": comment.get("date_gmt"),
+        "content": extract_post_html(comment.get("content", {}).get("rendered", ""), None).text,
+    }
 
-    async def worker():
-        while True:
-            page = await queue.get()
-            if page is None:
-                break
+def index_comments(comments: Iterable[dict]) -> Dict[Any, List[dict]]:
+    """Groups comments by the id of their post, oldest first, so each post finds its thread with one lookup."""
+    by_post: Dict[Any, List[dict]] = {}
+    for comment in comments:
+        by_post.setdefault(comment.get("post"), []).append(transform_comment(comment))
+    for thread in by_post.values():
+        thread.sort(key=lambda comment: (comment["date_gmt"] or "", comment["id"] or 0))
+    return by_post
+
+def transform_post(post: Any, index: int, use_cache: bool = True, extraction: Optional[PostExtraction] = None) -> dict:
+    """Extracts the fields selected for output from a raw WordPress post."""
+    if extraction is None and (include_content or include_links):
+        extraction = extract_post(post, use_cache=use_cache)
+    return {
+        "index": index,
+        "id": post.get("id"),
+        "title": post.get("title", {}).get("rendered") if include_title else None,
+        "url": post.get("link"),
+        "date_gmt": post.get("date_gmt") if include_date else None,
+        "content": extraction.text if include_content else None,
+        "links": [extraction.links, extraction.last_link] if include_links else None
+    }
+
+async def save_posts_to_json(posts: List[Any], file_path: str, comments_by_post: Optional[Dict[Any, List[dict]]] = None):
+    """Saves posts to a JSON file, each with its comment thread when comments_by_post (see index_comments) is given."""
+    with metrics.span("save json"):
+        # Extract only required fields for each post
+        filtered_posts = [transform_post(post, idx + 1) for idx, post in enumerate(posts)]
+        if comments_by_post is not None:
+            for post, record in zip(posts, filtered_posts):
+                record["comments"] = comments_by_post.get(post.get("id"), [])
+
+        async with aiofiles.open(file_path, mode='w', encoding='utf-8') as file:
+            await file.write(serialization.dumps_output(filtered_posts))
+    logging.info(f"Data saved to {file_path}")
+
+async def transform_page(posts: List[Any], offset: int, extraction_pool: Optional[ExtractionPool] = None) -> List[dict]:
+    """Transforms one page of posts, numbering them from offset + 1."""
+    with metrics.span("extract page", posts=len(posts)):
+        if extraction_pool is not None and (include_content or include_links):
+            extractions = await extraction_pool.extract(posts)
+        else:
+            extractions = [None] * len(posts)
+        return [
+            transform_post(post, offset + idx + 1, use_cache=False, extraction=extraction)
+            for idx, (post, extraction) in enumerate(zip(posts, extractions))
+        ]
+
+class NDJSONWriter:
+    """Appends records to an NDJSON file from a background task fed through a bounded queue."""
+
+    def __init__(self, file_path: str, queue_size: int = 8):
+        self.file_path = file_path
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.records_written = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._drain())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.queue.put(None)
+        await self._task
+
+    async def write(self, records: List[dict]):
+        """Queues a batch of records, waiting while the queue is full so memory stays bounded."""
+        if records:
+            await self.queue.put(records)
+
+    async def _drain(self):
+        async with aiofiles.open(self.file_path, mode='w', encoding='utf-8') as file:
+            while True:
+                records = await self.queue.get()
+                if records is None:
+                    break
+                await file.write("".join(serialization.dumps(record) + "\n" for record in records))
+                await file.flush()
+                self.records_written += len(records)
+
+async def stream_posts_to_ndjson(
+    session,
+    base_url: str,
+    file_path: str,
+    per_page: int = 100,
+    concurrency: int = 10,
+    queue_size: int = 8,
+    extraction_pool: Optional[ExtractionPool] = None,
+    display_progress: bool = True,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> CrawlResult:
+    """Crawls all posts and appends each page to an NDJSON file as soon as it arrives.
+
+    Indexes are derived from the page number, so they match a full in-memory crawl even though
+    pages are written in arrival order. With an extraction_pool the HTML of each page is parsed
+    in worker processes while other pages keep downloading.
+    """
+    async with NDJSONWriter(file_path, queue_size=queue_size) as writer:
+        async def on_page(page: int, posts: List[Any]):
+            await writer.write(await transform_page(posts, (page - 1) * per_page, extraction_pool))
+
+        result = await crawl_all_pages(
+            session, base_url, "wp/v2/posts", per_page=per_page, concurrency=concurrency,
+            display_progress=display_progress, on_page=on_page, keep_entries=False, params=post_params(),
+            limiter=limiter,
+        )
+    logging.info(f"Streamed {writer.records_written} posts to {file_path}")
+    return result
+
+@dataclass
+class SiteResult:
+    """Outcome of crawling one site in a multi-site run."""
+    base_url: str
+    file_path: str
+    status: str = "pending"
+    posts: int = 0
+    failed_pages: List[int] = field(default_factory=list)
+    seconds: float = 0.0
+    error: Optional[str] = None
+    concurrency: Optional[int] = None
+
+def read_site_list(file_path: str) -> List[str]:
+    """Reads base URLs one per line, skipping blanks, comments and duplicates."""
+    with open(file_path, encoding='utf-8') as file:
+        lines = (line.split("#", 1)[0].strip() for line in file)
+        return list(dict.fromkeys(line for line in lines if line))
+
+def site_file_name(base_url: str) -> str:
+    """Turns a base URL into a file name that is unique per site."""
+    return "".join(char if char.isalnum() or char in "-." else "_" for char in site_key(base_url))
+
+async def crawl_sites(
+    session,
+    base_urls: List[str],
+    output_dir: str,
+    concurrency_per_site: int = 8,
+    extraction_pool: Optional[ExtractionPool] = None,
+    site_timeout: Optional[float] = None,
+    adaptive: bool = True,
+) -> List[SiteResult]:
+    """Crawls many sites in one event loop, streaming each to <output_dir>/<site>.ndjson.
+
+    Every site runs as its own task: all get_basic_info probes go out at once and each site
+    crawls as soon as its probe answers. The session's connector bounds the connections in
+    total and per host, so a slow site only ties up its own connections. A site that fails,
+    or takes longer than site_timeout seconds, is recorded and does not stop the others.
+    With adaptive each site gets its own AdaptiveLimiter capped at concurrency_per_site.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = [SiteResult(base_url, os.path.join(output_dir, f"{site_file_name(base_url)}.ndjson")) for base_url in base_urls]
+
+    with tqdm(total=len(results), desc="Crawling sites", unit="site") as pbar:
+        async def crawl_site(result: SiteResult):
+            limiter = AdaptiveLimiter(initial=min(4, concurrency_per_site), maximum=concurrency_per_site) if adaptive else None
+
+            async def probe_and_crawl() -> CrawlResult:
+                with metrics.span("crawl site", site=result.base_url):
+                    await get_basic_info(session, result.base_url)
+                    return await stream_posts_to_ndjson(
+                        session, result.base_url, result.file_path, concurrency=concurrency_per_site,
+                        extraction_pool=extraction_pool, display_progress=False, limiter=limiter,
+                    )
+
+            start = time.perf_counter()
             try:
-                batch_posts, total_posts = await crawl_pages(session, base_url, "wp/v2/posts", start=(page - 1) * batch_size, num=batch_size, display_progress=False)
-                posts.extend(batch_posts)
+                crawl = await asyncio.wait_for(probe_and_crawl(), timeout=site_timeout)
+                result.posts = crawl.total_entries
+                result.failed_pages = crawl.failed_pages
+                result.status = "partial" if crawl.failed_pages else "done"
+            except asyncio.TimeoutError:
+                result.status, result.error = "timeout", f"not finished after {site_timeout}s"
             except Exception as e:
-                logging.error(f"Error while scraping page {page}: {e}")
-            finally:
-                queue.task_done()
+                result.status, result.error = "failed", str(e) or type(e).__name__
+            result.seconds = time.perf_counter() - start
+            result.concurrency = int(limiter.limit) if limiter is not None else concurrency_per_site
+            if result.error:
+                logging.warning(f"{result.base_url}: {result.status} ({result.error})")
+            pbar.update(1)
+
+        await asyncio.gather(*(crawl_site(result) for result in results))
 
-    for i in range(start // batch_size + 1 if start is not None else 1, (num // batch_size) + 2 if num else total_posts // batch_size + 2):
-        await queue.put(i)
+    with open(os.path.join(output_dir, "summary.json"), mode='w', encoding='utf-8') as file:
+        file.write(serialization.dumps_output([asdict(result) for result in results]))
+    return results
+
+async def crawl_with_checkpoints(
+    session,
+    base_url: str,
+    journal: CrawlJournal,
+    concurrency: int = 10,
+    extraction_pool: Optional[ExtractionPool] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> Tuple[List[dict], CrawlResult]:
+    """Crawls all posts, saving every completed page to the journal, and rebuilds the output from it.
+
+    Pages already in the journal are not fetched again, so rerunning after a failure only
+    downloads the missing pages.
+    """
+    per_page = journal.per_page
+
+    async def on_page(page: int, posts: List[Any]):
+        await journal.save_page(page, await transform_page(posts, (page - 1) * per_page, extraction_pool))
+
+    result = await crawl_all_pages(
+        session, base_url, "wp/v2/posts", per_page=per_page, concurrency=concurrency,
+        on_page=on_page, keep_entries=False, skip_pages=set(journal.completed), params=post_params(),
+        limiter=limiter,
+    )
+
+    # Rebuild the full output in page order, numbered the same way as an in-memory crawl
+    seen_ids: Set[Any] = set()
+    records = drop_seen(list(journal.iter_records()), seen_ids)
+    for idx, record in enumerate(records):
+        record["index"] = idx + 1
+    return records, result
+
+async def get_changed_posts(
+    session, base_url: str, state: CrawlState, concurrency: int = 10, overlap_hours: int = 24,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> CrawlResult:
+    """Fetches only the posts modified since the newest modified_gmt recorded for the site.
+
+    WordPress compares modified_after against the site's local post_modified column, so the
+    window is widened by overlap_hours to cover sites behind GMT. The overlap is harmless:
+    posts seen again simply replace themselves when merged.
+    """
+    params = {"orderby": "modified", "order": "desc"}
+    since = state.latest_modified(base_url)
+    if since:
+        since_dt = datetime.fromisoformat(since) - timedelta(hours=overlap_hours)
+        params["modified_after"] = since_dt.strftime("%Y-%m-%dT%H:%M:%S")
+        logging.info(f"Fetching posts modified after {params['modified_after']}")
+    else:
+        logging.info("No previous crawl recorded for this site, fetching every post.")
+
+    result = await crawl_all_pages(
+        session, base_url, "wp/v2/posts", per_page=100, concurrency=concurrency, params=post_params(params), limiter=limiter,
+    )
+    if result.failed_pages:
+        # Missing pages could hide changed posts, so keep the old high-water mark for the next run
+        logging.warning("Not updating the crawl state because some pages failed.")
+    else:
+        state.record(base_url, result.entries)
+    return result
 
-    # Start worker tasks
-    workers = [asyncio.create_task(worker()) for _ in range(5)]  # Use 5 workers for concurrency
-    await queue.join()
+async def merge_posts_into_json(posts: List[Any], file_path: str) -> Tuple[int, int]:
+    """Merges re-crawled posts into an existing JSON export, replacing changed posts by id.
 
-    # Stop workers
-    for _ in workers:
-        await queue.put(None)
-    await asyncio.gather(*workers)
+    Posts not yet in the file are put first, as WordPress lists newest posts first, and every
+    record is re-indexed. Returns the number of updated and added posts.
+    """
+    try:
+        async with aiofiles.open(file_path, mode='r', encoding='utf-8') as file:
+            existing = serialization.loads(await file.read())
+    except FileNotFoundError:
+        existing = []
+
+    positions = {record.get("id"): idx for idx, record in enumerate(existing) if record.get("id") is not None}
+    added = []
+    updated = 0
+    for post in posts:
+        record = transform_post(post, 0)
+        position = positions.get(post.get("id"))
+        if position is None:
+            added.append(record)
+        else:
+            existing[position] = record
+            updated += 1
+
+    merged = added + existing
+    for idx, record in enumerate(merged):
+        record["index"] = idx + 1
 
-    return posts[:num] if num else posts, total_posts
+    async with aiofiles.open(file_path, mode='w', encoding='utf-8') as file:
+        await file.write(serialization.dumps_output(merged))
+    logging.info(f"Merged {updated} updated and {len(added)} new posts into {file_path}")
+    return updated, len(added)
+
+def save_records_to_corpus(records: Iterable[dict], db_path: str, base_url: str, batch_size: int = 1000) -> int:
+    """Writes exported post records to the corpus store in transactions of batch_size posts."""
+    written = 0
+    records = iter(records)
+    with metrics.span("store corpus"), CorpusStore(db_path) as store:
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            written += store.add_posts(batch, site=site_key(base_url))
+    logging.info(f"Stored {written} posts in {db_path}")
+    return written
 
-async def save_posts_to_json(posts: List[Any], file_path: str):
-    """Saves posts to a JSON file."""
+async def save_posts_to_csv(posts: List[Any], file_path: str):
+    """Saves posts to a CSV file."""
     # Extract only required fields for each post
     filtered_posts = [
         {
             "index": idx + 1,
             "title": post.get("title", {}).get("rendered") if include_title else None,
-            "url": post.get("link"),
+            "link": post.get("link"),
             "date_gmt": post.get("date_gmt") if include_date else None,
-            "content": clean_html_content(post.get("content", {}).get("rendered", "")) if include_content else None,
-            "links": extract_links(post.get("content", {}).get("rendered", ""), base_url=post.get("link")) if include_links else None
+            "content": extract_post(post).text if include_content else None
         }
         for idx, post in enumerate(posts)
     ]
+    await write_csv_records(filtered_posts, file_path)
 
-    async with aiofiles.open(file_path, mode='w', encoding='utf-8') as file:
-        await file.write(json.dumps(filtered_posts, indent=4))
-    logging.info(f"Data saved to {file_path}")
-
-async def save_posts_to_csv(posts: List[Any], file_path: str):
-    """Saves posts to a CSV file."""
-    # Extract only required fields for each post
+async def write_csv_records(filtered_posts: List[dict], file_path: str):
+    """Writes already filtered post records to a CSV file."""
     fieldnames = ["index"]
     if include_title:
         fieldnames.append("title")
@@ -239,49 +760,210 @@ async def save_posts_to_csv(posts: List[Any], file_path: str):
         fieldnames.append("content")
     fieldnames.append("link")
 
-    filtered_posts = [
-        {
-            "index": idx + 1,
-            "title": post.get("title", {}).get("rendered") if include_title else None,
-            "link": post.get("link"),
-            "date_gmt": post.get("date_gmt") if include_date else None,
-            "content": clean_html_content(post.get("content", {}).get("rendered", "")) if include_content else None
-        }
-        for idx, post in enumerate(posts)
-    ]
-
-    async with aiofiles.open(file_path, mode='w', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        await file.write(",".join(fieldnames) + "\n")
-        for post in filtered_posts:
-            await file.write(",".join(f'"{str(post[field])}"' for field in fieldnames if post[field] is not None) + "\n")
+    with metrics.span("save csv"):
+        async with aiofiles.open(file_path, mode='w', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            await file.write(",".join(fieldnames) + "\n")
+            for post in filtered_posts:
+                await file.write(",".join(f'"{str(post[field])}"' for field in fieldnames if post[field] is not None) + "\n")
     logging.info(f"Data saved to {file_path}")
 
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parses the command line options used to tune a crawl."""
+    parser = argparse.ArgumentParser(description="Scrape posts from a WordPress site through its REST API.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Pages fetched at the same time; the starting point when concurrency adapts.")
+    parser.add_argument("--max-concurrency", type=int, default=64, help="Upper bound for the adaptive concurrency.")
+    parser.add_argument("--no-adaptive", action="store_true", help="Keep concurrency fixed instead of adapting it to 429/503 answers, timeouts and latency.")
+    parser.add_argument("--ndjson", metavar="PATH", help="Stream a full-site crawl to this NDJSON file instead of collecting it in memory.")
+    parser.add_argument("--queue-size", type=int, default=8, help="Number of pages buffered for the NDJSON writer.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for HTML extraction (default: CPU count, 0 parses on the event loop).")
+    parser.add_argument("--batch-size", type=int, default=20, help="Posts sent to an extraction worker at a time.")
+    parser.add_argument("--incremental", action="store_true", help="Fetch only posts changed since the last run and merge them into wordpress_posts.json.")
+    parser.add_argument("--state", default="crawl_state.db", help="State store used by --incremental.")
+    parser.add_argument("--checkpoint", metavar="DIR", help="Save each completed page of a full-site crawl to this directory.")
+    parser.add_argument("--resume", action="store_true", help="Continue the crawl checkpointed in --checkpoint, fetching only missing pages.")
+    parser.add_argument("--no-fields", action="store_true", help="Download whole post objects instead of a _fields projection of the selected outputs.")
+    parser.add_argument("--sites", metavar="FILE", help="Crawl every base URL listed in this file (one per line) in a single run.")
+    parser.add_argument("--output-dir", default="sites", help="Directory for the per-site NDJSON files and summary of --sites.")
+    parser.add_argument("--max-connections", type=int, default=100, help="Connections open at the same time across all sites.")
+    parser.add_argument("--per-host", type=int, default=8, help="Connections open at the same time to any one site.")
+    parser.add_argument("--site-timeout", type=float, default=None, help="Give up on a site of --sites after this many seconds.")
+    parser.add_argument("--corpus", metavar="PATH", help="Also store the exported posts, links and identifiers in this indexed SQLite corpus.")
+    parser.add_argument("--endpoints", nargs="+", choices=[name for name in ENDPOINTS if name != "posts"], default=[],
+                        help="Crawl these endpoints alongside the posts into wordpress_<name>.json; comments are also attached to their posts.")
+    parser.add_argument("--page-cache", metavar="PATH", help="Keep list pages in this store and revalidate them with ETag / If-Modified-Since on later runs.")
+    parser.add_argument("--page-cache-days", type=float, default=30, help="Drop pages of --page-cache not revalidated for this many days.")
+    parser.add_argument("--compact", action="store_true", help="Write the JSON outputs without indentation.")
+    parser.add_argument("--metrics", metavar="PATH", help="Write request, cache and parsing metrics here (Prometheus text for .prom/.txt, JSON otherwise).")
+    parser.add_argument("--trace", metavar="PATH", help="Record trace spans of the crawl stages and write them here for chrome://tracing or Perfetto.")
+    args = parser.parse_args(argv)
+    if args.endpoints:
+        # Only the plain crawl collects the other endpoints and attaches comments to the posts
+        other_modes = [flag for flag, value in (("--sites", args.sites), ("--incremental", args.incremental),
+                                                ("--checkpoint", args.checkpoint), ("--ndjson", args.ndjson)) if value]
+        if other_modes:
+            parser.error(f"--endpoints cannot be combined with {', '.join(other_modes)}")
+    return args
+
 # Example usage of the script
-async def main():
+async def main(args: Optional[argparse.Namespace] = None):
     logging.basicConfig(level=logging.INFO)
-
-    base_url = input("Enter the base URL of the WordPress site: ").strip()
-    if not base_url:
-        print("Base URL cannot be empty.")
-        return
-
-    num_posts = input("Enter the number of posts to scrape (press enter for all): ").strip()
-    num_posts = int(num_posts) if num_posts.isdigit() else None
-
-    global include_title, include_date, include_content, include_links
+    args = args if args is not None else parse_args([])
+    metrics.tracing = bool(args.trace)
+
+    if args.sites:
+        base_urls = read_site_list(args.sites)
+        if not base_urls:
+            print(f"No base URLs found in {args.sites}.")
+            return
+        base_url, num_posts = None, None
+    else:
+        base_url = input("Enter the base URL of the WordPress site: ").strip()
+        if not base_url:
+            print("Base URL cannot be empty.")
+            return
+
+        num_posts = input("Enter the number of posts to scrape (press enter for all): ").strip()
+        num_posts = int(num_posts) if num_posts.isdigit() else None
+
+    global include_title, include_date, include_content, include_links, use_fields_projection, page_cache
+    use_fields_projection = not args.no_fields
+    if args.compact:
+        serialization.indent = None
+    if args.page_cache:
+        page_cache = PageCache(args.page_cache, max_age=args.page_cache_days * 24 * 3600)
     include_title = input("Do you want to scrape the title? (y/n): ").strip().lower() == 'y'
     include_date = input("Do you want to scrape the date? (y/n): ").strip().lower() == 'y'
     include_content = input("Do you want to scrape the content? (y/n): ").strip().lower() == 'y'
     include_links = input("Do you want to scrape the links? (y/n): ").strip().lower() == 'y'
 
-    async with CachedSession(cache=SQLiteBackend(), expire_after=180) as session:
-        posts, total_posts = await get_posts(session, base_url, start=0, num=num_posts)
-        print(f"Retrieved {len(posts)} posts out of {total_posts} available.")
-        # Save posts to a JSON file
-        await save_posts_to_json(posts, "wordpress_posts.json")
-        # Save posts to a CSV file
-        await save_posts_to_csv(posts, "wordpress_posts.csv")
+    # Parse HTML in worker processes unless disabled or nothing needs parsing
+    extraction_pool = None
+    if args.workers != 0 and (include_content or include_links):
+        extraction_pool = ExtractionPool(workers=args.workers, batch_size=args.batch_size)
+
+    # Raise concurrency while the site answers quickly and cut it back on overload
+    limiter = None if args.no_adaptive else AdaptiveLimiter(initial=args.concurrency, maximum=max(args.concurrency, args.max_concurrency))
+
+    try:
+        # One pooled connector for the whole run, with a DNS cache and limits overall and per host
+        connector = aiohttp.TCPConnector(
+            limit=args.max_connections, limit_per_host=args.per_host if args.sites else 0, ttl_dns_cache=300,
+        )
+        async with CachedSession(
+            cache=SQLiteBackend(), expire_after=180, connector=connector, trace_configs=[metrics.trace_config("wordpress")],
+        ) as session:
+            if args.sites:
+                results = await crawl_sites(
+                    session, base_urls, args.output_dir, concurrency_per_site=args.per_host,
+                    extraction_pool=extraction_pool, site_timeout=args.site_timeout, adaptive=not args.no_adaptive,
+                )
+                done = [result for result in results if result.status == "done"]
+                print(f"Crawled {len(done)} of {len(results)} sites, {sum(result.posts for result in results)} posts, into {args.output_dir}.")
+                for result in results:
+                    if result.status != "done":
+                        print(f"{result.base_url}: {result.status} {result.error or result.failed_pages}")
+                if args.corpus:
+                    for result in results:
+                        if result.posts and os.path.exists(result.file_path):
+                            save_records_to_corpus(iter_records(result.file_path), args.corpus, result.base_url)
+                return
+            if args.incremental:
+                with CrawlState(args.state) as state, metrics.span("crawl"):
+                    result = await get_changed_posts(session, base_url, state, concurrency=args.concurrency, limiter=limiter)
+                if extraction_pool:
+                    await extraction_pool.prime(result.entries)
+                updated, added = await merge_posts_into_json(result.entries, "wordpress_posts.json")
+                if args.corpus:
+                    # Merging re-indexes every record, so the whole export is stored again
+                    save_records_to_corpus(iter_records("wordpress_posts.json"), args.corpus, base_url)
+                print(f"{len(result.entries)} posts changed since the last run: {updated} updated, {added} new.")
+                if result.failed_pages:
+                    print(f"Failed to retrieve {len(result.failed_pages)} pages: {result.failed_pages}")
+                return
+            if num_posts is None and args.checkpoint:
+                journal = CrawlJournal(args.checkpoint, base_url, per_page=100, resume=args.resume)
+                with metrics.span("crawl"):
+                    records, result = await crawl_with_checkpoints(
+                        session, base_url, journal, concurrency=args.concurrency, extraction_pool=extraction_pool,
+                        limiter=limiter,
+                    )
+                if result.failed_pages:
+                    print(f"Failed to retrieve {len(result.failed_pages)} pages: {result.failed_pages}")
+                    print(f"Run again with --checkpoint {args.checkpoint} --resume to fetch them.")
+                print(f"Retrieved {len(records)} posts out of {result.total_entries} available.")
+                async with aiofiles.open("wordpress_posts.json", mode='w', encoding='utf-8') as file:
+                    await file.write(serialization.dumps_output(records))
+                await write_csv_records([{**record, "link": record["url"]} for record in records], "wordpress_posts.csv")
+                if args.corpus:
+                    save_records_to_corpus(records, args.corpus, base_url)
+                return
+            if num_posts is None and args.ndjson:
+                with metrics.span("crawl"):
+                    result = await stream_posts_to_ndjson(
+                        session, base_url, args.ndjson, concurrency=args.concurrency,
+                        queue_size=args.queue_size, extraction_pool=extraction_pool, limiter=limiter,
+                    )
+                print(f"Streamed {result.total_entries} posts to {args.ndjson}.")
+                if args.corpus:
+                    save_records_to_corpus(iter_records(args.ndjson), args.corpus, base_url)
+                if result.failed_pages:
+                    print(f"Failed to retrieve {len(result.failed_pages)} pages: {result.failed_pages}")
+                return
+            # The other endpoints download while the posts do, sharing the limiter
+            endpoints_task = asyncio.create_task(
+                crawl_endpoints(session, base_url, args.endpoints, concurrency=args.concurrency, limiter=limiter)
+            ) if args.endpoints else None
+            if num_posts is None:
+                # Extract each page in the pool as it arrives, so parsing overlaps with fetching
+                on_page = (lambda page, entries: extraction_pool.prime(entries)) if extraction_pool else None
+                with metrics.span("crawl"):
+                    result = await crawl_all_pages(
+                        session, base_url, "wp/v2/posts", per_page=100, concurrency=args.concurrency,
+                        on_page=on_page, params=post_params(), limiter=limiter,
+                    )
+                posts, total_posts = result.entries, result.total_entries
+                if result.failed_pages:
+                    print(f"Failed to retrieve {len(result.failed_pages)} pages: {result.failed_pages}")
+            else:
+                with metrics.span("crawl"):
+                    posts, total_posts = await get_posts(session, base_url, start=0, num=num_posts, concurrency=args.concurrency, limiter=limiter)
+                if extraction_pool:
+                    await extraction_pool.prime(posts)
+            print(f"Retrieved {len(posts)} posts out of {total_posts} available.")
+            endpoints = await endpoints_task if endpoints_task else {}
+            for name, endpoint in endpoints.items():
+                print(f"Retrieved {len(endpoint.entries)} {name} out of {endpoint.total_entries} available.")
+                if endpoint.failed_pages:
+                    print(f"Failed to retrieve {len(endpoint.failed_pages)} pages of {name}: {endpoint.failed_pages}")
+                async with aiofiles.open(f"wordpress_{name}.json", mode='w', encoding='utf-8') as file:
+                    await file.write(serialization.dumps_output(endpoint.entries))
+            comments_by_post = index_comments(endpoints["comments"].entries) if "comments" in endpoints else None
+            # Save posts to a JSON file
+            await save_posts_to_json(posts, "wordpress_posts.json", comments_by_post)
+            # Save posts to a CSV file
+            await save_posts_to_csv(posts, "wordpress_posts.csv")
+            if args.corpus:
+                save_records_to_corpus(
+                    (transform_post(post, idx + 1) for idx, post in enumerate(posts)), args.corpus, base_url
+                )
+            clear_extraction_cache()
+    finally:
+        if extraction_pool:
+            extraction_pool.shutdown()
+        projection = build_fields_projection()
+        print(f"Transfer: {transfer_stats.summary()} ({'_fields=' + projection if projection else 'no projection'})")
+        if limiter is not None and not args.sites:
+            print(f"Adaptive {limiter.summary()}")
+        if page_cache is not None:
+            print(f"Page cache: {page_cache.summary()}")
+            page_cache.close()
+            page_cache = None
+        print(f"Metrics:\n{metrics.summary()}")
+        if args.metrics:
+            metrics.write(args.metrics)
+        if args.trace:
+            metrics.write_trace(args.trace)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(parse_args()))
\ No newline at end of file